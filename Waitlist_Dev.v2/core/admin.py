@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Capability, Ban, BanAuditLog
+from .ban_index import sync_user_bans
 
 @admin.register(Capability)
 class CapabilityAdmin(admin.ModelAdmin):
@@ -27,6 +28,21 @@ class BanAdmin(admin.ModelAdmin):
     is_active_display.boolean = True
     is_active_display.short_description = 'Active'
 
+    # Keep the Redis ban index in step with admin edits
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        sync_user_bans([obj.user_id])
+
+    def delete_model(self, request, obj):
+        user_id = obj.user_id
+        super().delete_model(request, obj)
+        sync_user_bans([user_id])
+
+    def delete_queryset(self, request, queryset):
+        user_ids = list(queryset.values_list('user_id', flat=True))
+        super().delete_queryset(request, queryset)
+        sync_user_bans(user_ids)
+
 @admin.register(BanAuditLog)
 class BanAuditLogAdmin(admin.ModelAdmin):
     list_display = ('timestamp', 'action', 'target_user', 'actor', 'short_details')
@@ -0,0 +1,106 @@
+import logging
+from django.db import models
+from django.utils import timezone
+
+from core.models import Ban
+from core.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Redis Hash: user_id -> expiry unix timestamp ("0" = permanent)
+BAN_INDEX_KEY = 'ban_index:active'
+
+# Sentinel field stored inside the hash so "index missing" and
+# "user not banned" can be told apart in a single round trip.
+READY_FIELD = '__ready__'
+
+PERMANENT = 0
+
+def _active_bans_qs():
+    return Ban.objects.filter(
+        models.Q(expires_at__isnull=True) | models.Q(expires_at__gt=timezone.now())
+    )
+
+def _encode_expiry(expires_at):
+    return int(expires_at.timestamp()) if expires_at else PERMANENT
+
+def _collapse(rows):
+    """
+    Reduces (user_id, expires_at) rows to one expiry per user.
+    Permanent bans win over timed ones, otherwise the latest expiry wins.
+    """
+    index = {}
+    for user_id, expires_at in rows:
+        value = _encode_expiry(expires_at)
+        current = index.get(user_id)
+        if current == PERMANENT:
+            continue
+        if current is None or value == PERMANENT or value > current:
+            index[user_id] = value
+    return index
+
+def rebuild_ban_index():
+    """
+    Rebuilds the full index from the database.
+    Called automatically when the index is missing (e.g. Redis flushed).
+    """
+    index = _collapse(_active_bans_qs().values_list('user_id', 'expires_at'))
+
+    r = get_redis_connection()
+    pipe = r.pipeline()
+    pipe.delete(BAN_INDEX_KEY)
+    if index:
+        pipe.hset(BAN_INDEX_KEY, mapping=index)
+    pipe.hset(BAN_INDEX_KEY, READY_FIELD, 1)
+    pipe.execute()
+    return len(index)
+
+def sync_user_bans(user_ids):
+    """
+    Re-evaluates the active ban state for the given users and writes it to the index.
+    Used after ban create/update/remove and by the expiry task.
+    """
+    user_ids = set(user_ids)
+    if not user_ids: return
+
+    index = _collapse(_active_bans_qs().filter(user_id__in=user_ids).values_list('user_id', 'expires_at'))
+    cleared = user_ids - set(index.keys())
+
+    try:
+        r = get_redis_connection()
+        pipe = r.pipeline()
+        if index:
+            pipe.hset(BAN_INDEX_KEY, mapping=index)
+        if cleared:
+            pipe.hdel(BAN_INDEX_KEY, *cleared)
+        pipe.execute()
+    except Exception as e:
+        # Drop the sentinel so the next reader rebuilds from the DB
+        logger.error(f"[BanIndex] Sync failed, forcing rebuild: {e}")
+        try: get_redis_connection().hdel(BAN_INDEX_KEY, READY_FIELD)
+        except Exception: pass
+
+def is_user_banned(user_id):
+    """
+    Single HMGET against the index.
+    Falls back to the database if Redis is unreachable.
+    """
+    try:
+        r = get_redis_connection()
+        value, ready = r.hmget(BAN_INDEX_KEY, [user_id, READY_FIELD])
+        if ready is None:
+            rebuild_ban_index()
+            value = r.hget(BAN_INDEX_KEY, user_id)
+    except Exception as e:
+        logger.warning(f"[BanIndex] Redis unavailable, using DB: {e}")
+        return _active_bans_qs().filter(user_id=user_id).exists()
+
+    if value is None:
+        return False
+
+    expires_ts = int(value)
+    if expires_ts == PERMANENT:
+        return True
+
+    # Expired but not yet swept by check_expired_bans
+    return expires_ts > timezone.now().timestamp()
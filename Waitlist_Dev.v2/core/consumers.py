@@ -1,11 +1,14 @@
-import asyncio
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
-from django.template.loader import render_to_string
 from asgiref.sync import sync_to_async
-from core.utils import get_system_status
+from core.system_monitor import MONITOR_GROUP, collector, get_cached_snapshot
 
 class SystemMonitorConsumer(AsyncWebsocketConsumer):
+    """
+    Staff-only live system monitor.
+    Sockets never query anything themselves: they join the monitor group and
+    receive snapshots pushed by the shared background collector.
+    """
     async def connect(self):
         # Authenticate user
         if self.scope["user"].is_anonymous or not self.scope["user"].is_staff:
@@ -13,48 +16,31 @@ class SystemMonitorConsumer(AsyncWebsocketConsumer):
              await self.close(code=4003)
              return
 
+        await self.channel_layer.group_add(MONITOR_GROUP, self.channel_name)
         await self.accept()
-        
-        # Start the background task
-        self.keep_running = True
-        self.task = asyncio.create_task(self.send_status_updates())
 
-    async def disconnect(self, close_code):
-        self.keep_running = False
-        if hasattr(self, 'task'):
-            self.task.cancel()
-            # FIX: Do not await task here. 
-            # try: await self.task
-            # except asyncio.CancelledError: pass
+        # Send the last snapshot straight away so the page doesn't wait a full interval
+        snapshot = await sync_to_async(get_cached_snapshot, thread_sensitive=False)()
+        if snapshot:
+            await self.send(text_data=json.dumps({
+                'html': snapshot['html'],
+                'timestamp': snapshot['timestamp']
+            }))
+
+        self.is_viewer = True
+        collector.add_viewer()
 
-    async def send_status_updates(self):
-        while self.keep_running:
-            try:
-                # 1. Fetch Data
-                context = await sync_to_async(get_system_status)()
-                
-                # 2. Render HTML Partial
-                html = await sync_to_async(render_to_string)('partials/celery_content.html', context)
-                
-                # 3. Send to Client
-                await self.send(text_data=json.dumps({
-                    'html': html,
-                    'timestamp': context.get('redis_latency', 0)
-                }))
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(MONITOR_GROUP, self.channel_name)
+        if getattr(self, 'is_viewer', False):
+            self.is_viewer = False
+            collector.remove_viewer()
 
-                # Wait 1 second (High speed refresh)
-                await asyncio.sleep(1)
-            
-            except asyncio.CancelledError:
-                # Break the loop immediately if cancelled
-                break
-                
-            except Exception as e:
-                print(f"Monitor Error: {e}")
-                # On error, back off slightly to prevent log spam
-                # Check running state before sleeping to allow faster shutdown
-                if self.keep_running:
-                    await asyncio.sleep(5)
+    async def system_status(self, event):
+        await self.send(text_data=json.dumps({
+            'html': event['html'],
+            'timestamp': event['timestamp']
+        }))
 
 class UserConsumer(AsyncWebsocketConsumer):
     """
@@ -0,0 +1,340 @@
+import asyncio
+import json
+import math
+import random
+import statistics
+import time
+from collections import defaultdict
+
+import aiohttp
+from asgiref.sync import sync_to_async
+
+from waitlist_data.models import WaitlistEntry
+
+# --- LOAD BENCHMARK HARNESS (used by `python manage.py benchmark_load`) ---
+# Every simulated client is a coroutine with its own aiohttp session (session + CSRF cookies),
+# all on one event loop. Scenarios:
+#   browse - pilots loading the dashboard / doctrines / history pages
+#   xup    - bursts of pilots x-ing up at the same moment
+#   fc     - FC polling the overview and approving / denying / inviting pending entries
+#   ws     - dashboard websocket subscribers on /ws/fleet/<id>/
+# Each request is recorded as (scenario, action, latency, ok, status, db queries). The server
+# reports its query count in X-DB-Queries when BENCHMARK_QUERY_HEADERS=True.
+
+REPORT_VERSION = 1
+
+PERCENTILES = (50, 95, 99)
+
+def percentile(sorted_values, pct):
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+class Recorder:
+    """
+    Collects samples for the whole run. Single event loop, so no locking.
+    """
+    def __init__(self):
+        self.samples = defaultdict(list) # (scenario, action) -> [(seconds, ok, status, queries)]
+        self.errors = defaultdict(lambda: defaultdict(int)) # (scenario, action) -> {reason: n}
+        self.xup_submits = defaultdict(list) # character_id -> [monotonic submit times]
+        self.ws_adds = [] # (entry_id, monotonic receive time), first delivery per subscriber
+        self.ws_messages = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    def record(self, scenario, action, seconds, ok, status=None, queries=None, error=None):
+        self.samples[(scenario, action)].append((seconds, ok, status, queries))
+        if not ok:
+            self.errors[(scenario, action)][error or f"HTTP {status}"] += 1
+
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    def add_fanout(self, entry_characters):
+        """
+        Turns websocket 'add' deliveries into x-up -> subscriber latencies.
+        entry_characters: {entry_id: character_id}, looked up after the run.
+        """
+        for entry_id, received in self.ws_adds:
+            char_id = entry_characters.get(entry_id)
+            submits = [t for t in self.xup_submits.get(char_id, []) if t <= received]
+            if submits:
+                self.record('ws', 'fanout x-up -> subscriber', received - max(submits), True)
+
+    def summary(self):
+        elapsed = self.elapsed()
+        scenarios = defaultdict(lambda: {'actions': {}})
+        totals = defaultdict(list)
+        for (scenario, action), samples in sorted(self.samples.items()):
+            scenarios[scenario]['actions'][action] = _summarize(samples, elapsed, self.errors.get((scenario, action)))
+            totals[scenario].extend(samples)
+        for scenario, samples in totals.items():
+            scenarios[scenario]['total'] = _summarize(samples, elapsed)
+        return {'elapsed_s': round(elapsed, 2), 'ws_messages': self.ws_messages, 'scenarios': dict(scenarios)}
+
+def _summarize(samples, elapsed, errors=None):
+    latencies = sorted(s[0] * 1000 for s in samples)
+    failures = sum(1 for s in samples if not s[1])
+    queries = sorted(s[3] for s in samples if s[3] is not None)
+    result = {
+        'count': len(samples),
+        'errors': failures,
+        'error_rate': round(failures / len(samples), 4) if samples else 0,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else 0,
+        'latency_ms': {
+            **{f"p{p}": round(percentile(latencies, p), 1) for p in PERCENTILES},
+            'mean': round(statistics.mean(latencies), 1),
+            'max': round(latencies[-1], 1),
+        },
+        'db_queries': None,
+    }
+    if queries:
+        result['db_queries'] = {
+            'mean': round(statistics.mean(queries), 1),
+            'p95': percentile(queries, 95),
+            'max': queries[-1],
+        }
+    if errors:
+        result['error_breakdown'] = dict(errors)
+    return result
+
+# --- CLIENTS ---
+
+class Client:
+    """
+    One simulated browser: a sim user, their character and an authenticated aiohttp session.
+    """
+    def __init__(self, user, character, session_key, csrf_token, session_cookie_name, timeout):
+        self.user = user
+        self.character = character
+        self.cookie = f"{session_cookie_name}={session_key}; csrftoken={csrf_token}"
+        self.csrf_token = csrf_token
+        self.timeout = timeout
+        self.http = None
+
+    async def open(self):
+        self.http = aiohttp.ClientSession(
+            headers={'Cookie': self.cookie},
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+            cookie_jar=aiohttp.DummyCookieJar() # keep the fixed session, ignore Set-Cookie
+        )
+
+    async def close(self):
+        if self.http:
+            await self.http.close()
+
+async def timed_request(recorder, scenario, action, client, method, url, **kwargs):
+    """
+    Sends one request and records it. Returns (status, parsed JSON or None).
+    A JSON body with "success": false counts as an error.
+    """
+    headers = kwargs.pop('headers', {})
+    if method != 'GET':
+        headers['X-CSRFToken'] = client.csrf_token
+    start = time.monotonic()
+    status, data, queries, error = None, None, None, None
+    try:
+        async with client.http.request(method, url, headers=headers, allow_redirects=False, **kwargs) as resp:
+            body = await resp.read()
+            status = resp.status
+            if resp.headers.get('X-DB-Queries', '').isdigit():
+                queries = int(resp.headers['X-DB-Queries'])
+            if resp.content_type == 'application/json':
+                try: data = json.loads(body)
+                except ValueError: data = None
+    except asyncio.TimeoutError:
+        error = 'timeout'
+    except aiohttp.ClientError as e:
+        error = type(e).__name__
+    seconds = time.monotonic() - start
+
+    ok = status is not None and status < 400
+    if ok and isinstance(data, dict) and data.get('success') is False:
+        ok, error = False, f"app error: {str(data.get('error'))[:60]}"
+    recorder.record(scenario, action, seconds, ok, status, queries, error)
+    return status, data
+
+# --- SCENARIOS ---
+
+class BenchContext:
+    def __init__(self, base_url, fleet, fits, recorder, duration, options):
+        self.base_url = base_url.rstrip('/')
+        self.ws_url = self.base_url.replace('https://', 'wss://').replace('http://', 'ws://')
+        self.fleet = fleet
+        self.fits = fits
+        self.recorder = recorder
+        self.stop_at = time.monotonic() + duration
+        self.options = options
+
+    def running(self):
+        return time.monotonic() < self.stop_at
+
+    async def pause(self, seconds):
+        await asyncio.sleep(max(0, min(seconds, self.stop_at - time.monotonic())))
+
+async def browse_loop(ctx, client):
+    token = ctx.fleet.join_token
+    pages = [
+        ('GET dashboard', f"/fleet/{token}/dashboard/"),
+        ('GET dashboard', f"/fleet/{token}/dashboard/"),
+        ('GET doctrines', "/doctrines/"),
+        ('GET history', f"/fleet/{token}/history/"),
+        ('GET landing', "/"),
+    ]
+    think = ctx.options['think']
+    await ctx.pause(random.uniform(0, ctx.options['ramp']))
+    while ctx.running():
+        action, path = random.choice(pages)
+        await timed_request(ctx.recorder, 'browse', action, client, 'GET', f"{ctx.base_url}{path}")
+        await ctx.pause(random.uniform(0.5, 1.5) * think)
+
+async def xup(ctx, client):
+    fits = random.sample(ctx.fits, min(len(ctx.fits), random.randint(1, 3)))
+    payload = {
+        'character_id': str(client.character.character_id),
+        'eft_paste': "\n\n".join(fit.eft_format for fit in fits)
+    }
+    ctx.recorder.xup_submits[client.character.character_id].append(time.monotonic())
+    await timed_request(
+        ctx.recorder, 'xup', 'POST x-up', client, 'POST',
+        f"{ctx.base_url}/fleet/{ctx.fleet.join_token}/xup/", data=payload
+    )
+
+async def xup_burst_loop(ctx, clients):
+    """
+    Every burst_interval seconds, burst_size pilots x-up at the same instant (fleet form-up).
+    """
+    size = min(ctx.options['burst_size'], len(clients))
+    await ctx.pause(ctx.options['ramp'])
+    while ctx.running():
+        await asyncio.gather(*(xup(ctx, c) for c in random.sample(clients, size)))
+        await ctx.pause(ctx.options['burst_interval'])
+
+@sync_to_async
+def _pending_entries(fleet_id, limit):
+    return list(
+        WaitlistEntry.objects.filter(fleet_id=fleet_id, status__in=['pending', 'approved'])
+        .order_by('created_at').values_list('id', 'status')[:limit]
+    )
+
+async def fc_loop(ctx, client):
+    """
+    An FC working the waitlist: polls the overview, reloads the dashboard now and then,
+    and processes pending entries (approve / deny, invite approved ones when ESI is reachable).
+    """
+    token = ctx.fleet.join_token
+    invite = ctx.options['fc_invites']
+    await ctx.pause(random.uniform(0, ctx.options['ramp']))
+    while ctx.running():
+        await timed_request(ctx.recorder, 'fc', 'GET overview', client, 'GET', f"{ctx.base_url}/fleet/{token}/overview/")
+        if random.random() < 0.2:
+            await timed_request(ctx.recorder, 'fc', 'GET dashboard', client, 'GET', f"{ctx.base_url}/fleet/{token}/dashboard/")
+
+        for entry_id, status in await _pending_entries(ctx.fleet.id, ctx.options['fc_batch']):
+            if not ctx.running():
+                break
+            if status == 'approved':
+                action = 'invite' if invite else 'deny'
+            else:
+                action = 'approve' if random.random() < 0.75 else 'deny'
+            await timed_request(
+                ctx.recorder, 'fc', f"POST {action}", client, 'POST',
+                f"{ctx.base_url}/fleet/action/{entry_id}/{action}/"
+            )
+        await ctx.pause(ctx.options['fc_interval'])
+
+async def ws_subscriber(ctx, client):
+    recorder = ctx.recorder
+    url = f"{ctx.ws_url}/ws/fleet/{ctx.fleet.id}/"
+    await ctx.pause(random.uniform(0, ctx.options['ramp']))
+    start = time.monotonic()
+    try:
+        ws = await client.http.ws_connect(url, heartbeat=30)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        recorder.record('ws', 'connect', time.monotonic() - start, False, error=type(e).__name__)
+        return
+    recorder.record('ws', 'connect', time.monotonic() - start, True, 101)
+
+    seen = set()
+    try:
+        while ctx.running():
+            try:
+                msg = await asyncio.wait_for(ws.receive(), timeout=max(0.1, ctx.stop_at - time.monotonic()))
+            except asyncio.TimeoutError:
+                break
+            if msg.type != aiohttp.WSMsgType.TEXT:
+                if msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.CLOSING, aiohttp.WSMsgType.ERROR):
+                    # Server dropped a subscriber before the end of the run
+                    recorder.record('ws', 'disconnect', 0, False, error=f"closed early ({ws.close_code})")
+                    return
+                continue
+            recorder.ws_messages += 1
+            received = time.monotonic()
+            try:
+                event = json.loads(msg.data)
+            except ValueError:
+                continue
+            updates = event.get('updates', []) if event.get('action') == 'batch' else [event]
+            for update in updates:
+                entry_id = update.get('entry_id')
+                if update.get('action') == 'add' and entry_id not in seen:
+                    seen.add(entry_id)
+                    recorder.ws_adds.append((entry_id, received))
+    finally:
+        await ws.close()
+
+async def run_scenarios(ctx, browsers, xuppers, fcs, subscribers):
+    clients = {id(c): c for c in [*browsers, *xuppers, *fcs, *subscribers]}.values()
+    for client in clients:
+        await client.open()
+    try:
+        tasks = [browse_loop(ctx, c) for c in browsers]
+        if xuppers and ctx.fits:
+            tasks.append(xup_burst_loop(ctx, xuppers))
+        tasks += [fc_loop(ctx, c) for c in fcs]
+        tasks += [ws_subscriber(ctx, c) for c in subscribers]
+        await asyncio.gather(*tasks)
+    finally:
+        ctx.recorder.finished = time.monotonic()
+        for client in clients:
+            await client.close()
+
+def resolve_fanout(recorder):
+    """
+    Post-run: map delivered entry ids to the pilot that x-ed up (needs the DB, so outside the loop).
+    """
+    entry_ids = {entry_id for entry_id, _ in recorder.ws_adds if entry_id}
+    if not entry_ids:
+        return
+    entry_characters = dict(
+        WaitlistEntry.objects.filter(id__in=entry_ids).values_list('id', 'character__character_id')
+    )
+    recorder.add_fanout(entry_characters)
+
+# --- REPORTS ---
+
+def compare_reports(current, baseline, threshold):
+    """
+    Rows of (scenario, action, metric, baseline, current, change %, regressed) for actions in both runs.
+    """
+    rows = []
+    for scenario, data in current['scenarios'].items():
+        base_actions = baseline.get('scenarios', {}).get(scenario, {}).get('actions', {})
+        for action, stats in data['actions'].items():
+            base = base_actions.get(action)
+            if not base:
+                continue
+            for metric, higher_is_worse in (('p95', True), ('p99', True), ('throughput_rps', False), ('error_rate', True)):
+                now = stats['latency_ms'][metric] if metric.startswith('p') else stats[metric]
+                before = base['latency_ms'][metric] if metric.startswith('p') else base[metric]
+                if now is None or before is None:
+                    continue
+                change = ((now - before) / before * 100) if before else (0 if now == before else 100)
+                regressed = change > threshold if higher_is_worse else change < -threshold
+                rows.append((scenario, action, metric, before, now, round(change, 1), regressed))
+    return rows
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import secrets
+import subprocess
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from core.management.commands.simulate_load import Command as SimulateLoadCommand
+from pilot_data.models import EveCharacter
+from waitlist_data.models import Fleet, DoctrineFit
+
+FC_USERNAME = 'sim_user_0' # character 90000000, matches create_session_cookie's id logic
+SIM_FLEET_NAME = 'Load Benchmark Fleet'
+SCENARIOS = ['browse', 'xup', 'fc', 'ws']
+
+class Command(SimulateLoadCommand):
+    help = 'End-to-end load benchmark: async browsers, x-up bursts, FC actions and websocket subscribers against a running server, with a JSON report.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', type=str, default='http://127.0.0.1:8000', help='Base URL of the running server (daphne for websockets)')
+        parser.add_argument('--users', type=int, default=50, help='Simulated pilots (x-up pool, Default: 50)')
+        parser.add_argument('--browsers', type=int, default=20, help='Pilots browsing pages concurrently (Default: 20)')
+        parser.add_argument('--ws', type=int, default=50, help='Websocket subscribers on the fleet dashboard (Default: 50)')
+        parser.add_argument('--fcs', type=int, default=1, help='FCs working the waitlist (Default: 1)')
+        parser.add_argument('--duration', type=int, default=60, help='Seconds to run (Default: 60)')
+        parser.add_argument('--ramp', type=float, default=5.0, help='Seconds over which clients start (Default: 5)')
+        parser.add_argument('--burst-size', type=int, default=20, help='Pilots x-ing up at the same instant (Default: 20)')
+        parser.add_argument('--burst-interval', type=float, default=10.0, help='Seconds between x-up bursts (Default: 10)')
+        parser.add_argument('--think', type=float, default=2.0, help='Mean seconds between page loads per browser (Default: 2)')
+        parser.add_argument('--fc-interval', type=float, default=2.0, help='Seconds between FC passes over the waitlist (Default: 2)')
+        parser.add_argument('--fc-batch', type=int, default=10, help='Entries an FC processes per pass (Default: 10)')
+        parser.add_argument('--fc-invites', action='store_true', help='Invite approved entries (needs ESI, e.g. the server running with ESI_MOCK_URL)')
+        parser.add_argument('--fleet', type=str, default='', help='Join token of an existing active fleet to benchmark against (Default: a temporary sim fleet, deleted afterwards)')
+        parser.add_argument('--scenarios', type=str, default=','.join(SCENARIOS), help=f"Comma-separated scenarios (Default: {','.join(SCENARIOS)})")
+        parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds (Default: 30)')
+        parser.add_argument('--label', type=str, default='', help='Name of this run in the report (e.g. branch or build)')
+        parser.add_argument('--report', type=str, default='', help='Write the JSON report to this file')
+        parser.add_argument('--compare', type=str, default='', help='Baseline JSON report to compare against')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Percent change flagged as a regression (Default: 10)')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the sim users afterwards (cleanup_sim_users)')
+
+    def handle(self, *args, **options):
+        try:
+            from core import loadtest
+        except ImportError:
+            self.stdout.write(self.style.ERROR("benchmark_load needs aiohttp: pip install aiohttp"))
+            return
+
+        scenarios = [s.strip() for s in options['scenarios'].split(',') if s.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            self.stdout.write(self.style.ERROR(f"Unknown scenarios: {', '.join(sorted(unknown))}"))
+            return
+
+        fits = list(DoctrineFit.objects.filter(is_doctrinal=True))
+        if 'xup' in scenarios and not fits:
+            self.stdout.write(self.style.ERROR("No doctrine fits found! Please import some doctrines."))
+            return
+
+        base_url = options['url'].rstrip('/')
+        fc_user, fc_char = self.setup_fc()
+        fleet, temporary_fleet = self.get_fleet(options['fleet'], fc_user)
+        if not fleet:
+            self.stdout.write(self.style.ERROR(f"Fleet {options['fleet']} not found or not active."))
+            return
+
+        pilots = self.setup_users(max(options['users'], options['browsers'], options['ws']))
+        make = lambda user, char: loadtest.Client(
+            user, char, self.create_session_cookie(user), secrets.token_hex(16),
+            settings.SESSION_COOKIE_NAME, options['timeout']
+        )
+        clients = [make(user, char) for user, char in pilots]
+        fc_clients = [make(fc_user, fc_char) for _ in range(options['fcs'])]
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"Load benchmark against {base_url} for {options['duration']}s on fleet '{fleet.name}' "
+            f"(scenarios: {', '.join(scenarios)})"
+        ))
+
+        recorder = loadtest.Recorder()
+        ctx = loadtest.BenchContext(base_url, fleet, fits, recorder, options['duration'], {
+            'ramp': options['ramp'],
+            'think': options['think'],
+            'burst_size': options['burst_size'],
+            'burst_interval': options['burst_interval'],
+            'fc_interval': options['fc_interval'],
+            'fc_batch': options['fc_batch'],
+            'fc_invites': options['fc_invites'],
+        })
+        try:
+            asyncio.run(loadtest.run_scenarios(
+                ctx,
+                browsers=clients[:options['browsers']] if 'browse' in scenarios else [],
+                xuppers=clients[:options['users']] if 'xup' in scenarios else [],
+                fcs=fc_clients if 'fc' in scenarios else [],
+                subscribers=clients[:options['ws']] if 'ws' in scenarios else [],
+            ))
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING("Interrupted, reporting what was collected."))
+        finally:
+            loadtest.resolve_fanout(recorder)
+            if temporary_fleet:
+                fleet.delete()
+            if options['cleanup']:
+                from core.management.commands.cleanup_sim_users import Command as CleanupCommand
+                CleanupCommand(stdout=self.stdout, stderr=self.stderr).handle()
+
+        report = {
+            'version': loadtest.REPORT_VERSION,
+            'meta': {
+                'label': options['label'],
+                'started_at': timezone.now().isoformat(),
+                'url': base_url,
+                'git_commit': self.git_commit(),
+                'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+                'options': {k: options[k] for k in (
+                    'users', 'browsers', 'ws', 'fcs', 'duration', 'burst_size', 'burst_interval',
+                    'think', 'fc_interval', 'fc_batch', 'fc_invites'
+                )},
+                'scenarios': scenarios,
+            },
+            **recorder.summary(),
+        }
+        self.print_report(report)
+
+        if options['report']:
+            with open(options['report'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Report written to {options['report']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.print_comparison(loadtest.compare_reports(report, baseline, options['threshold']), baseline)
+
+    def setup_fc(self):
+        """
+        sim_user_0 doubles as the FC (group membership grants fc_action / overview access).
+        """
+        user, created = User.objects.get_or_create(username=FC_USERNAME)
+        if created:
+            user.set_password('password')
+            user.save()
+        fc_group, _ = Group.objects.get_or_create(name='Fleet Commander')
+        user.groups.add(fc_group)
+        char, _ = EveCharacter.objects.get_or_create(
+            character_id=90000000,
+            defaults={
+                'user': user,
+                'character_name': "Sim FC",
+                'is_main': True,
+                'corporation_name': "Simulation Corp",
+                # Accepted by the mock SSO / ESI (run_mock_esi), ignored otherwise
+                'access_token': 'mock:90000000:0',
+                'refresh_token': 'mock:90000000:0',
+                'token_expires': timezone.now() + timedelta(days=1),
+            }
+        )
+        return user, char
+
+    def get_fleet(self, join_token, fc_user):
+        """
+        Returns (fleet, created). Only a fleet named with --fleet is used; otherwise a temporary
+        sim fleet is created (and deleted afterwards), so a live fleet never gets benchmark traffic.
+        """
+        if join_token:
+            try:
+                return Fleet.objects.filter(join_token=join_token, is_active=True).first(), False
+            except ValidationError:
+                return None, False
+        return Fleet.objects.create(name=SIM_FLEET_NAME, commander=fc_user), True
+
+    def git_commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, timeout=5
+            ).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
+
+    def print_report(self, report):
+        self.stdout.write("")
+        self.stdout.write(f"Elapsed {report['elapsed_s']}s, {report['ws_messages']} websocket messages received")
+        self.stdout.write(
+            f"{'Scenario / action':<38} {'Count':>7} {'Err %':>6} {'Req/s':>7} "
+            f"{'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'Queries':>8}"
+        )
+        for scenario, data in report['scenarios'].items():
+            rows = [(f"{scenario}", data['total'])] + [(f"  {a}", s) for a, s in data['actions'].items()]
+            for name, s in rows:
+                lat = s['latency_ms']
+                queries = s['db_queries']['mean'] if s['db_queries'] else '-'
+                line = (
+                    f"{name:<38} {s['count']:>7} {s['error_rate'] * 100:>6.1f} {s['throughput_rps']:>7} "
+                    f"{lat['p50']:>8} {lat['p95']:>8} {lat['p99']:>8} {queries:>8}"
+                )
+                self.stdout.write(self.style.WARNING(line) if s['errors'] else line)
+                for reason, count in s.get('error_breakdown', {}).items():
+                    self.stdout.write(f"      {count} x {reason}")
+
+        if not any(s['db_queries'] for d in report['scenarios'].values() for s in d['actions'].values()):
+            self.stdout.write("(No query counts: start the server with BENCHMARK_QUERY_HEADERS=True)")
+
+    def print_comparison(self, rows, baseline):
+        meta = baseline.get('meta', {})
+        self.stdout.write("")
+        self.stdout.write(f"Compared to {meta.get('label') or meta.get('git_commit') or 'baseline'}:")
+        regressions = 0
+        for scenario, action, metric, before, now, change, regressed in rows:
+            name = f"{scenario} / {action}"
+            line = f"  {name:<40} {metric:<15} {before:>9} -> {now:<9} ({change:+.1f}%)"
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            elif abs(change) >= 1:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.ERROR(f"{regressions} regression(s) above threshold."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions above threshold."))
@@ -0,0 +1,47 @@
+import logging
+from core.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Redis Hash per namespace: field -> counter. Shared by every worker / Daphne process.
+METRICS_KEY = 'metrics:{namespace}'
+
+def incr(namespace, field, amount=1):
+    """
+    Best-effort counter bump. Metrics must never break the code path they observe.
+    """
+    try:
+        get_redis_connection().hincrby(METRICS_KEY.format(namespace=namespace), field, amount)
+    except Exception as e:
+        logger.debug(f"[Metrics] incr {namespace}.{field} failed: {e}")
+
+def incr_many(namespace, counts):
+    """
+    Several counter bumps in one round trip ({field: amount}).
+    """
+    if not counts: return
+    try:
+        pipe = get_redis_connection().pipeline(transaction=False)
+        key = METRICS_KEY.format(namespace=namespace)
+        for field, amount in counts.items():
+            pipe.hincrby(key, field, amount)
+        pipe.execute()
+    except Exception as e:
+        logger.debug(f"[Metrics] incr_many {namespace} failed: {e}")
+
+def get_metrics(namespace):
+    """
+    Returns {field: int} for a namespace (empty dict if Redis is unavailable).
+    """
+    try:
+        raw = get_redis_connection().hgetall(METRICS_KEY.format(namespace=namespace))
+    except Exception as e:
+        logger.debug(f"[Metrics] read {namespace} failed: {e}")
+        return {}
+    return {k.decode(): int(v) for k, v in raw.items()}
+
+def reset_metrics(namespace):
+    try:
+        get_redis_connection().delete(METRICS_KEY.format(namespace=namespace))
+    except Exception as e:
+        logger.debug(f"[Metrics] reset {namespace} failed: {e}")
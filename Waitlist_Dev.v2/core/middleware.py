@@ -0,0 +1,31 @@
+import time
+from django.db import connection
+
+class QueryCountMiddleware:
+    """
+    Benchmark instrumentation (settings.BENCHMARK_QUERY_HEADERS).
+    Adds X-DB-Queries / X-DB-Time-ms / X-Server-Time-ms to every response so
+    benchmark_load can attribute query counts and server time to each request.
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = {'count': 0, 'time': 0.0}
+
+        def counter(execute, sql, params, many, context):
+            start = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                stats['count'] += 1
+                stats['time'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        with connection.execute_wrapper(counter):
+            response = self.get_response(request)
+
+        response['X-DB-Queries'] = str(stats['count'])
+        response['X-DB-Time-ms'] = f"{stats['time'] * 1000:.1f}"
+        response['X-Server-Time-ms'] = f"{(time.perf_counter() - start) * 1000:.1f}"
+        return response
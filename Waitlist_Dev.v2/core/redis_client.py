@@ -0,0 +1,21 @@
+import redis
+from django.conf import settings
+
+_connection = None
+
+def get_redis_connection():
+    """
+    Returns a process-wide Redis client backed by a shared connection pool.
+    We reuse the CELERY_BROKER_URL (same as Channels) to keep config DRY.
+    """
+    global _connection
+    if _connection is None:
+        # Short connect timeout, no retries: when Redis is down the callers' fallbacks
+        # (ban checks, breaker state, locks) should kick in right away
+        _connection = redis.from_url(
+            settings.CELERY_BROKER_URL,
+            socket_timeout=2,
+            socket_connect_timeout=0.5,
+            retry_on_timeout=False
+        )
+    return _connection
@@ -0,0 +1,126 @@
+import logging
+from django.db import connection
+
+from pilot_data.models import ItemType, TypeAttribute, TypeEffect, ItemSlotLayout
+
+logger = logging.getLogger(__name__)
+
+# Dogma attributes holding slot counts (hulls, and the slots a T3 subsystem adds)
+SLOT_ATTRIBUTES = {14: 'high_slots', 13: 'mid_slots', 12: 'low_slots', 1137: 'rig_slots'}
+
+# Fitting effects, checked in this order (first match wins)
+SLOT_EFFECTS = [(12, 'high'), (13, 'mid'), (11, 'low'), (2663, 'rig')]
+
+# Category fallbacks for items without a fitting effect
+CATEGORY_SLOTS = {32: 'subsystem', 18: 'drone', 87: 'drone', 8: 'cargo'}
+
+T3_CRUISER_GROUP = 963
+T3_SUBSYSTEM_SLOTS = 5
+
+LAYOUT_FIELDS = ('slot_kind', 'high_slots', 'mid_slots', 'low_slots', 'rig_slots')
+LAYOUT_BATCH = 5000
+
+def slot_kind_for(effect_ids, category_id):
+    for effect_id, kind in SLOT_EFFECTS:
+        if effect_id in effect_ids:
+            return kind
+    return CATEGORY_SLOTS.get(category_id, 'cargo')
+
+def rebuild_slot_layouts(type_ids=None, models=None):
+    """
+    Recomputes ItemSlotLayout rows from the SDE tables with three set-based reads,
+    then writes only the rows that changed. `type_ids` limits it to some items,
+    `models` lets migrations pass their historical (type, attribute, effect, layout) models.
+    Returns the number of rows written.
+    """
+    item_type, type_attribute, type_effect, layout = models or (ItemType, TypeAttribute, TypeEffect, ItemSlotLayout)
+
+    types = item_type.objects.all()
+    attributes = type_attribute.objects.filter(attribute_id__in=SLOT_ATTRIBUTES)
+    effects = type_effect.objects.filter(effect_id__in=[e for e, _ in SLOT_EFFECTS])
+    existing_qs = layout.objects.all()
+    if type_ids is not None:
+        type_ids = list(type_ids)
+        types = types.filter(type_id__in=type_ids)
+        attributes = attributes.filter(item_id__in=type_ids)
+        effects = effects.filter(item_id__in=type_ids)
+        existing_qs = existing_qs.filter(item_id__in=type_ids)
+
+    counts = {}
+    for item_id, attr_id, value in attributes.values_list('item_id', 'attribute_id', 'value').iterator(chunk_size=LAYOUT_BATCH):
+        counts.setdefault(item_id, {})[SLOT_ATTRIBUTES[attr_id]] = int(value)
+
+    fitting_effects = {}
+    for item_id, effect_id in effects.values_list('item_id', 'effect_id').iterator(chunk_size=LAYOUT_BATCH):
+        fitting_effects.setdefault(item_id, set()).add(effect_id)
+
+    existing = {row[0]: tuple(row[1:]) for row in existing_qs.values_list('item_id', *LAYOUT_FIELDS).iterator(chunk_size=LAYOUT_BATCH)}
+
+    changed = []
+    for type_id, category_id in types.values_list('type_id', 'group__category_id').iterator(chunk_size=LAYOUT_BATCH):
+        slots = counts.get(type_id, {})
+        values = (
+            slot_kind_for(fitting_effects.get(type_id, ()), category_id),
+            slots.get('high_slots', 0), slots.get('mid_slots', 0), slots.get('low_slots', 0), slots.get('rig_slots', 0),
+        )
+        if existing.get(type_id) != values:
+            changed.append(layout(item_id=type_id, **dict(zip(LAYOUT_FIELDS, values))))
+
+    if changed:
+        kwargs = {'update_conflicts': True, 'update_fields': list(LAYOUT_FIELDS)}
+        if connection.features.supports_update_conflicts_with_target:
+            kwargs['unique_fields'] = ['item']
+        layout.objects.bulk_create(changed, batch_size=LAYOUT_BATCH, **kwargs)
+    return len(changed)
+
+def get_layouts(type_ids):
+    """
+    {type_id: ItemSlotLayout} in one query. Items without a row yet (added outside
+    the SDE import) are computed on the spot.
+    """
+    type_ids = {t for t in type_ids if t}
+    layouts = ItemSlotLayout.objects.in_bulk(type_ids)
+    missing = type_ids - set(layouts)
+    if missing:
+        try:
+            rebuild_slot_layouts(type_ids=missing)
+            layouts.update(ItemSlotLayout.objects.in_bulk(missing))
+        except Exception as e:
+            logger.error(f"Slot layout rebuild failed for {len(missing)} items: {e}")
+    return layouts
+
+def get_slot_kinds(type_ids):
+    """
+    {type_id: 'high' | 'mid' | 'low' | 'rig' | 'subsystem' | 'drone' | 'cargo'}
+    """
+    return {type_id: layout.slot_kind for type_id, layout in get_layouts(type_ids).items()}
+
+def fit_slot_totals(hull, module_type_ids, layouts=None):
+    """
+    Slot totals for a hull plus the fitted modules (T3 subsystems add slots).
+    Pass `layouts` from get_layouts() to avoid the query when they're already loaded.
+    """
+    totals = {'high': 0, 'mid': 0, 'low': 0, 'rig': 0, 'subsystem': 0}
+    if not hull:
+        return totals
+
+    is_t3 = hull.group_id == T3_CRUISER_GROUP
+    if layouts is None:
+        layouts = get_layouts([hull.type_id] + (list(module_type_ids) if is_t3 else []))
+
+    def add(layout):
+        totals['high'] += layout.high_slots
+        totals['mid'] += layout.mid_slots
+        totals['low'] += layout.low_slots
+
+    hull_layout = layouts.get(hull.type_id)
+    if hull_layout:
+        add(hull_layout)
+        totals['rig'] = hull_layout.rig_slots
+
+    if is_t3:
+        totals['subsystem'] = T3_SUBSYSTEM_SLOTS
+        for type_id in module_type_ids:
+            if type_id in layouts:
+                add(layouts[type_id])
+    return totals
@@ -0,0 +1,116 @@
+import logging
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from django.db import transaction
+from django.db.models import Sum, Count, Q, Value
+from django.db.models.functions import TruncDate, Coalesce
+
+from pilot_data.models import CorpWalletJournal, SRPDailyRollup, SRPPayerDailyRollup
+
+logger = logging.getLogger(__name__)
+
+# Journal rows only count towards the payer charts for this ref_type
+PAYER_REF_TYPE = 'player_donation'
+
+def rollup_day(value):
+    """
+    Rollups are bucketed by UTC day (the journal and ESI are both UTC).
+    """
+    if isinstance(value, datetime):
+        return value.astimezone(dt_timezone.utc).date() if value.tzinfo else value.date()
+    return value
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=dt_timezone.utc)
+
+def rebuild_rollups(config_id=None, first_day=None, last_day=None, models=None):
+    """
+    Recomputes the rollup rows for a day range (inclusive, open ends = everything)
+    straight from the journal with two GROUP BY queries.
+    `models` lets migrations pass their historical (journal, daily, payer) models.
+    Returns the number of day buckets written.
+    """
+    journal, daily, payers = models or (CorpWalletJournal, SRPDailyRollup, SRPPayerDailyRollup)
+
+    raw = journal.objects.all()
+    old_daily = daily.objects.all()
+    old_payers = payers.objects.all()
+    if config_id is not None:
+        raw = raw.filter(config_id=config_id)
+        old_daily = old_daily.filter(config_id=config_id)
+        old_payers = old_payers.filter(config_id=config_id)
+    if first_day:
+        raw = raw.filter(date__gte=_day_start(first_day))
+        old_daily = old_daily.filter(day__gte=first_day)
+        old_payers = old_payers.filter(day__gte=first_day)
+    if last_day:
+        raw = raw.filter(date__lt=_day_start(last_day + timedelta(days=1)))
+        old_daily = old_daily.filter(day__lte=last_day)
+        old_payers = old_payers.filter(day__lte=last_day)
+
+    # order_by() drops the model's default '-date' ordering, which would otherwise leak into the GROUP BY
+    keyed = raw.order_by().annotate(
+        bucket_day=TruncDate('date', tzinfo=dt_timezone.utc),
+        bucket_cat=Coalesce('custom_category', Value(''))
+    )
+    buckets = keyed.values('config_id', 'bucket_day', 'division', 'bucket_cat', 'ref_type').annotate(
+        income=Sum('amount', filter=Q(amount__gt=0)),
+        outcome=Sum('amount', filter=Q(amount__lt=0)),
+        count_in=Count('id', filter=Q(amount__gt=0)),
+        count_out=Count('id', filter=Q(amount__lte=0))
+    )
+    payer_buckets = keyed.filter(ref_type=PAYER_REF_TYPE, amount__gt=0).values(
+        'config_id', 'bucket_day', 'division', 'bucket_cat', 'first_party_name'
+    ).annotate(total=Sum('amount'), count=Count('id'))
+
+    daily_rows = [
+        daily(
+            config_id=b['config_id'],
+            day=b['bucket_day'],
+            division=b['division'],
+            category=b['bucket_cat'],
+            ref_type=b['ref_type'],
+            income=b['income'] or 0,
+            outcome=b['outcome'] or 0,
+            count_in=b['count_in'],
+            count_out=b['count_out']
+        ) for b in buckets
+    ]
+    payer_rows = [
+        payers(
+            config_id=b['config_id'],
+            day=b['bucket_day'],
+            division=b['division'],
+            category=b['bucket_cat'],
+            payer_name=b['first_party_name'] or '',
+            total=b['total'] or 0,
+            count=b['count']
+        ) for b in payer_buckets
+    ]
+
+    with transaction.atomic():
+        old_daily.delete()
+        old_payers.delete()
+        daily.objects.bulk_create(daily_rows, batch_size=1000)
+        payers.objects.bulk_create(payer_rows, batch_size=1000)
+
+    return len(daily_rows)
+
+def refresh_rollup_days(config_id, days):
+    """
+    Incremental maintenance: rebuilds only the given days (dates or datetimes),
+    one range query per run of consecutive days.
+    """
+    days = sorted({rollup_day(d) for d in days if d})
+    if not days: return
+
+    span_start = prev = days[0]
+    for day in days[1:] + [None]:
+        if day is not None and day - prev <= timedelta(days=1):
+            prev = day
+            continue
+        try:
+            rebuild_rollups(config_id, span_start, prev)
+        except Exception as e:
+            # Charts drift until the next rebuild, never block the write that triggered this
+            logger.error(f"[SRP] Rollup refresh {span_start}..{prev} failed: {e}")
+        span_start = prev = day
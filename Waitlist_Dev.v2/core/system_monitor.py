@@ -0,0 +1,114 @@
+import asyncio
+import json
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from channels.layers import get_channel_layer
+from django.template.loader import render_to_string
+
+from core.redis_client import get_redis_connection
+from core.utils import get_system_status
+
+logger = logging.getLogger(__name__)
+
+# Channels group every staff monitor socket joins
+MONITOR_GROUP = 'system_monitor'
+
+# Latest rendered snapshot (shared by all Daphne processes via Redis)
+SNAPSHOT_KEY = 'system_monitor:snapshot'
+SNAPSHOT_TTL = 30
+
+# Only one process collects at a time, the others just relay group messages
+LEADER_LOCK_KEY = 'system_monitor:collector'
+
+COLLECT_INTERVAL = 2
+
+def get_cached_snapshot():
+    """
+    Returns the last {'html', 'timestamp'} snapshot, or None if no collector has run recently.
+    """
+    try:
+        raw = get_redis_connection().get(SNAPSHOT_KEY)
+    except Exception as e:
+        logger.warning(f"[SystemMonitor] Snapshot read failed: {e}")
+        return None
+    return json.loads(raw) if raw else None
+
+def build_snapshot():
+    """
+    Runs the expensive status collection once and renders the partial.
+    """
+    context = get_system_status()
+    snapshot = {
+        'html': render_to_string('partials/celery_content.html', context),
+        'timestamp': context.get('redis_latency', 0),
+        'collected_at': time.time(),
+    }
+    try:
+        get_redis_connection().set(SNAPSHOT_KEY, json.dumps(snapshot), ex=SNAPSHOT_TTL)
+    except Exception as e:
+        logger.warning(f"[SystemMonitor] Snapshot write failed: {e}")
+    return snapshot
+
+class _Collector:
+    """
+    Per-process background loop. Runs while this process has at least one viewer.
+    Across processes a Redis lock elects a single leader, so the snapshot is built
+    once per interval regardless of how many sockets are open.
+    """
+    def __init__(self):
+        self.viewers = 0
+        self.task = None
+
+    def add_viewer(self):
+        self.viewers += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    def remove_viewer(self):
+        self.viewers = max(0, self.viewers - 1)
+        if self.viewers == 0 and self.task:
+            self.task.cancel()
+            self.task = None
+
+    def _get_lock(self):
+        # thread_local=False: acquire/extend happen on different executor threads
+        return get_redis_connection().lock(
+            LEADER_LOCK_KEY, timeout=COLLECT_INTERVAL * 5, thread_local=False
+        )
+
+    async def _run(self):
+        channel_layer = get_channel_layer()
+        lock = None
+        try:
+            while self.viewers > 0:
+                try:
+                    if lock is None:
+                        candidate = self._get_lock()
+                        if await sync_to_async(candidate.acquire, thread_sensitive=False)(blocking=False):
+                            lock = candidate
+                    else:
+                        await sync_to_async(lock.reacquire, thread_sensitive=False)()
+
+                    if lock is not None:
+                        snapshot = await sync_to_async(build_snapshot, thread_sensitive=False)()
+                        await channel_layer.group_send(MONITOR_GROUP, {
+                            'type': 'system_status',
+                            'html': snapshot['html'],
+                            'timestamp': snapshot['timestamp'],
+                        })
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Lost the lock (or Redis hiccup) - go back to follower mode
+                    logger.error(f"[SystemMonitor] Collector error: {e}")
+                    lock = None
+
+                await asyncio.sleep(COLLECT_INTERVAL)
+        finally:
+            if lock is not None:
+                try: lock.release()
+                except Exception: pass
+
+collector = _Collector()
@@ -1,34 +1,42 @@
 from celery import shared_task
+from django.db import transaction
 from django.utils import timezone
 from core.models import Ban, BanAuditLog
-from django.contrib.auth.models import User
+from core.ban_index import sync_user_bans
 
 @shared_task
 def check_expired_bans():
     """
     Checks for bans that have expired and logs them in the audit log.
+    Processes all newly expired bans in bulk (one INSERT, one UPDATE).
     """
     now = timezone.now()
 
     # Find bans that have expired but haven't been logged yet
-    expired_bans = Ban.objects.filter(
+    expired_bans = list(Ban.objects.filter(
         expires_at__lt=now,
         expiration_logged=False
-    )
+    ).values('id', 'user_id', 'expires_at'))
 
-    count = 0
-    system_user = None # Actor is None for system/automatic actions, or we can use a special user if desired.
+    if not expired_bans:
+        return "Processed 0 expired bans."
 
-    for ban in expired_bans:
-        BanAuditLog.objects.create(
-            target_user=ban.user,
-            ban=ban,
-            actor=None, # System action
+    # Actor is None for system/automatic actions
+    logs = [
+        BanAuditLog(
+            target_user_id=ban['user_id'],
+            ban_id=ban['id'],
+            actor=None,
             action='expire',
-            details=f"Ban expired automatically on {ban.expires_at}"
-        )
-        ban.expiration_logged = True
-        ban.save()
-        count += 1
+            details=f"Ban expired automatically on {ban['expires_at']}"
+        ) for ban in expired_bans
+    ]
 
-    return f"Processed {count} expired bans."
+    with transaction.atomic():
+        BanAuditLog.objects.bulk_create(logs)
+        Ban.objects.filter(id__in=[ban['id'] for ban in expired_bans]).update(expiration_logged=True)
+
+    # Drop expired users from the ban index (keeps any other active ban they hold)
+    sync_user_bans(ban['user_id'] for ban in expired_bans)
+
+    return f"Processed {len(expired_bans)} expired bans."
@@ -0,0 +1,272 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, Counter
+from django.core.cache import cache
+
+from core.metrics import incr_many
+from core.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# Two-tier cache: a small per-process LRU in front of the shared Redis cache (settings.CACHES).
+# The local tier only ever holds a value for `local_ttl` seconds, so other processes'
+# writes/invalidations become visible within that window. Coordination keys (locks,
+# throttles, snapshots) should keep using django.core.cache directly.
+
+_MISSING = object()
+
+# Metrics are counted in-process and flushed to Redis ('cache' namespace) at most this often
+METRICS_FLUSH_INTERVAL = 5
+
+# How long a resolved namespace version is trusted locally
+VERSION_TTL = 1.0
+
+# Waiters poll the shared tier this often while another process computes
+WAIT_POLL = 0.05
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+_metrics_flushed = time.monotonic()
+
+def _count(namespace, event, amount=1):
+    global _metrics_flushed
+    with _metrics_lock:
+        _metrics[f"{namespace}.{event}"] += amount
+        if time.monotonic() - _metrics_flushed < METRICS_FLUSH_INTERVAL:
+            return
+        pending = dict(_metrics)
+        _metrics.clear()
+        _metrics_flushed = time.monotonic()
+    incr_many('cache', pending)
+
+class TieredCache:
+    """
+    Namespaced cache with an in-process LRU, versioned keys (invalidate_all bumps the
+    namespace version instead of deleting keys) and single-flight recomputes.
+    Counters per namespace: local_hit, hit, miss, compute, compute_ms, contended,
+    waited, wait_released, wait_timeout, error.
+    """
+    def __init__(self, namespace, ttl, local_ttl=1.0, local_size=256, lock_timeout=30, wait_timeout=10):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local_ttl = min(local_ttl, ttl)
+        self.local_size = local_size
+        self.lock_timeout = lock_timeout
+        self.wait_timeout = wait_timeout
+
+        self._local = OrderedDict()
+        self._local_lock = threading.Lock()
+        self._key_locks = {}
+        self._version = (None, 0.0)
+
+    # --- Keys / versions ---
+
+    def _version_key(self):
+        return f"cache_version:{self.namespace}"
+
+    def version(self):
+        version, checked = self._version
+        if version is not None and time.monotonic() - checked < VERSION_TTL:
+            return version
+        try:
+            version = cache.get(self._version_key())
+            if version is None:
+                cache.add(self._version_key(), 1, timeout=None)
+                version = cache.get(self._version_key(), 1)
+        except Exception as e:
+            logger.debug(f"[Cache] version read for {self.namespace} failed: {e}")
+            _count(self.namespace, 'error')
+            version = version or 1
+        self._version = (version, time.monotonic())
+        return version
+
+    def make_key(self, key):
+        return f"{self.namespace}:v{self.version()}:{key}"
+
+    def invalidate_all(self):
+        """
+        Drops every key in the namespace (all processes) by moving to a new version.
+        """
+        try:
+            try:
+                cache.incr(self._version_key())
+            except ValueError:
+                cache.add(self._version_key(), 2, timeout=None)
+        except Exception as e:
+            logger.warning(f"[Cache] invalidate {self.namespace} failed: {e}")
+        self._version = (None, 0.0)
+        with self._local_lock:
+            self._local.clear()
+
+    # --- Local tier ---
+
+    def _local_get(self, full_key):
+        with self._local_lock:
+            entry = self._local.get(full_key)
+            if entry is None:
+                return _MISSING
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._local[full_key]
+                return _MISSING
+            self._local.move_to_end(full_key)
+            return value
+
+    def _local_set(self, full_key, value):
+        with self._local_lock:
+            self._local[full_key] = (time.monotonic() + self.local_ttl, value)
+            self._local.move_to_end(full_key)
+            while len(self._local) > self.local_size:
+                self._local.popitem(last=False)
+
+    # --- Shared tier ---
+
+    def _shared_get(self, full_key):
+        try:
+            return cache.get(full_key, _MISSING)
+        except Exception as e:
+            logger.debug(f"[Cache] get {full_key} failed: {e}")
+            _count(self.namespace, 'error')
+            return _MISSING
+
+    def _shared_set(self, full_key, value, ttl):
+        try:
+            cache.set(full_key, value, timeout=ttl)
+        except Exception as e:
+            logger.debug(f"[Cache] set {full_key} failed: {e}")
+            _count(self.namespace, 'error')
+
+    # --- Public API ---
+
+    def get(self, key, default=None):
+        full_key = self.make_key(key)
+        value = self._local_get(full_key)
+        if value is not _MISSING:
+            _count(self.namespace, 'local_hit')
+            return value
+        value = self._shared_get(full_key)
+        if value is _MISSING:
+            _count(self.namespace, 'miss')
+            return default
+        _count(self.namespace, 'hit')
+        self._local_set(full_key, value)
+        return value
+
+    def set(self, key, value, ttl=None):
+        full_key = self.make_key(key)
+        self._shared_set(full_key, value, ttl or self.ttl)
+        self._local_set(full_key, value)
+
+    def delete(self, key):
+        """
+        Other processes may still serve their local copy for up to local_ttl seconds.
+        """
+        full_key = self.make_key(key)
+        with self._local_lock:
+            self._local.pop(full_key, None)
+        try:
+            cache.delete(full_key)
+        except Exception as e:
+            logger.debug(f"[Cache] delete {full_key} failed: {e}")
+
+    def _thread_lock(self, full_key):
+        with self._local_lock:
+            lock = self._key_locks.get(full_key)
+            if lock is None:
+                # Bounded: stale per-key locks are simply recreated
+                if len(self._key_locks) > self.local_size * 4:
+                    self._key_locks.clear()
+                lock = self._key_locks[full_key] = threading.Lock()
+            return lock
+
+    def get_or_compute(self, key, compute, ttl=None, cacheable=None):
+        """
+        Returns the cached value or runs compute() exactly once across threads and
+        processes (Redis lock). Waiters poll the shared tier for the leader's result and
+        compute themselves once the leader's lock is gone without a cached value (the
+        result wasn't cacheable) or nothing arrives within wait_timeout.
+        cacheable(value) -> False keeps a result (e.g. an error) out of the cache.
+        """
+        full_key = self.make_key(key)
+        value = self._local_get(full_key)
+        if value is not _MISSING:
+            _count(self.namespace, 'local_hit')
+            return value
+
+        with self._thread_lock(full_key):
+            # A thread ahead of us may have filled it
+            value = self._local_get(full_key)
+            if value is not _MISSING:
+                _count(self.namespace, 'local_hit')
+                return value
+            value = self._shared_get(full_key)
+            if value is not _MISSING:
+                _count(self.namespace, 'hit')
+                self._local_set(full_key, value)
+                return value
+            _count(self.namespace, 'miss')
+
+            lock = None
+            try:
+                redis_conn = get_redis_connection()
+                lock_name = f"{full_key}:lock"
+                lock = redis_conn.lock(lock_name, timeout=self.lock_timeout)
+                if not lock.acquire(blocking=False):
+                    _count(self.namespace, 'contended')
+                    value, released = self._wait_for(full_key, redis_conn, lock_name)
+                    if value is not _MISSING:
+                        _count(self.namespace, 'waited')
+                        self._local_set(full_key, value)
+                        return value
+                    if released:
+                        # Leader finished without caching (e.g. an ESI error): take over, or
+                        # compute unguarded if another waiter got the lock first
+                        _count(self.namespace, 'wait_released')
+                        if not lock.acquire(blocking=False):
+                            lock = None
+                    else:
+                        _count(self.namespace, 'wait_timeout')
+                        lock = None
+            except Exception as e:
+                # Redis down: compute unguarded rather than fail the caller
+                logger.debug(f"[Cache] lock for {full_key} unavailable: {e}")
+                _count(self.namespace, 'error')
+                lock = None
+
+            try:
+                started = time.monotonic()
+                value = compute()
+                _count(self.namespace, 'compute')
+                _count(self.namespace, 'compute_ms', int((time.monotonic() - started) * 1000))
+
+                if cacheable is None or cacheable(value):
+                    self._shared_set(full_key, value, ttl or self.ttl)
+                    self._local_set(full_key, value)
+                return value
+            finally:
+                if lock is not None:
+                    try: lock.release()
+                    except Exception: pass
+
+    def _wait_for(self, full_key, redis_conn, lock_name):
+        """
+        Returns (value, released): the leader's cached value, or _MISSING with released=True
+        as soon as its lock is gone without a value, released=False on wait_timeout.
+        """
+        deadline = time.monotonic() + self.wait_timeout
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_POLL)
+            value = self._shared_get(full_key)
+            if value is not _MISSING:
+                return value, False
+            try:
+                lock_held = redis_conn.exists(lock_name)
+            except Exception as e:
+                logger.debug(f"[Cache] lock check for {full_key} failed: {e}")
+                _count(self.namespace, 'error')
+                return _MISSING, True
+            if not lock_held:
+                # The value is written before the lock is released: one last look
+                return self._shared_get(full_key), True
+        return _MISSING, False
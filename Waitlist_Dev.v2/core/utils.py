@@ -7,6 +7,9 @@ from django.db.models import Count, Q
 from waitlist_project.celery import app as celery_app
 from django.contrib.auth.models import Group
 from django.core.cache import cache
+from core.metrics import get_metrics
+from core.tiered_cache import TieredCache
+from esi_calls import circuit_breaker
 
 from pilot_data.models import EveCharacter, EsiHeaderCache, ItemType, ItemGroup, SkillHistory
 
@@ -222,15 +225,66 @@ def can_manage_role(actor, target_role_name):
 
 # --- SYSTEM STATUS UTILS ---
 
+def _cache_metrics_by_namespace():
+    """
+    'cache' metrics ({'fleet_comp.hit': n, ...}) regrouped per namespace with hit rate
+    (either tier) and average compute time.
+    """
+    grouped = {}
+    for field, value in get_metrics('cache').items():
+        namespace, _, event = field.rpartition('.')
+        grouped.setdefault(namespace, {})[event] = value
+
+    rows = []
+    for namespace, m in sorted(grouped.items()):
+        hits = m.get('local_hit', 0) + m.get('hit', 0) + m.get('waited', 0)
+        lookups = hits + m.get('miss', 0)
+        rows.append({
+            'namespace': namespace,
+            'local_hit': m.get('local_hit', 0),
+            'hit': m.get('hit', 0),
+            'miss': m.get('miss', 0),
+            'contended': m.get('contended', 0),
+            'errors': m.get('error', 0),
+            'hit_rate': int(hits / lookups * 100) if lookups else 0,
+            'avg_compute_ms': int(m.get('compute_ms', 0) / m['compute']) if m.get('compute') else 0,
+        })
+    return rows
+
+def _esi_breaker_rows():
+    """
+    Routes whose circuit is not closed, most recently tripped first.
+    """
+    now = time.time()
+    rows = [
+        {
+            'route': route,
+            'state': 'Open' if info['state'] == circuit_breaker.OPEN else 'Half-Open',
+            'retry_in': max(int(info['retry_at'] - now), 0),
+            'open_count': info['open_count'],
+        }
+        for route, info in circuit_breaker.blocked_routes().items()
+    ]
+    rows.sort(key=lambda r: -r['retry_in'])
+    return rows
+
+# Status collection fans out to Celery inspect + a dozen COUNT queries; computed once per window
+SYSTEM_STATUS = TieredCache('system_status', ttl=2, local_ttl=1)
+
 def get_system_status():
     """
     Fetches Redis connection status, Queue depth, Celery Worker inspection data,
     AND ESI Token Health statistics.
+    Single-flight cached for a couple of seconds across all processes.
     """
+    return SYSTEM_STATUS.get_or_compute('snapshot', _collect_system_status)
+
+def _collect_system_status():
     # 1. Check Redis Connection & Queue Depth
     redis_status = "OFFLINE"
     redis_error = None
     queue_length = 0
+    queue_depths = []
     redis_latency = 0
     
     try:
@@ -238,8 +292,15 @@ def get_system_status():
         start_time = time.time()
         r.ping()
         redis_latency = int((time.time() - start_time) * 1000)
-        q_len = r.llen('celery')
-        queue_length = int(q_len) if q_len is not None else 0
+        # Depth per Celery queue (default + refresh priority tiers)
+        pipe = r.pipeline(transaction=False)
+        for q in settings.CELERY_TASK_QUEUES:
+            pipe.llen(q.name)
+        queue_depths = [
+            {'name': q.name, 'length': int(n or 0)}
+            for q, n in zip(settings.CELERY_TASK_QUEUES, pipe.execute())
+        ]
+        queue_length = sum(q['length'] for q in queue_depths)
         redis_status = "ONLINE"
     except Exception as e:
         redis_error = str(e)
@@ -350,11 +411,24 @@ def get_system_status():
         Q(last_updated__gte=active_30d_threshold)
     ).count()
     
-    invalid_token_count = 0
-    for char in EveCharacter.objects.all().iterator():
-        if not char.refresh_token:
-            invalid_token_count += 1
-            
+    # Indexed token health columns, maintained on SSO login / token refresh (no Fernet decrypts)
+    token_status_breakdown = list(
+        EveCharacter.objects.values('token_status').annotate(count=Count('id')).order_by('-count')
+    )
+    invalid_token_count = sum(
+        row['count'] for row in token_status_breakdown if row['token_status'] in ('missing', 'invalid')
+    )
+    token_lock_metrics = get_metrics('token_lock')
+    cache_metrics = _cache_metrics_by_namespace()
+    esi_breakers = _esi_breaker_rows()
+    esi_breaker_metrics = get_metrics('esi_breaker')
+    token_error_breakdown = list(
+        EveCharacter.objects.exclude(last_refresh_error="")
+        .values('last_refresh_error', 'token_status')
+        .annotate(count=Count('id'))
+        .order_by('-count')[:10]
+    )
+
     if total_characters > 0:
         esi_health_percent = int(((total_characters - stale_count) / total_characters * 100))
     else:
@@ -387,7 +461,7 @@ def get_system_status():
             'pending_count': safety_net_count
         })
 
-    delayed_breakdown = EsiHeaderCache.objects.filter(
+    delayed_breakdown = list(EsiHeaderCache.objects.filter(
         endpoint_name__in=BACKGROUND_ENDPOINTS,
         expires__lte=now
     ).exclude(
@@ -396,7 +470,7 @@ def get_system_status():
         Q(expires__lte=grace_period)
     ).values('endpoint_name').annotate(
         pending_count=Count('id')
-    ).order_by('-pending_count')
+    ).order_by('-pending_count'))
 
     from esi_calls.token_manager import check_esi_status
     esi_status_bool = check_esi_status()
@@ -411,6 +485,7 @@ def get_system_status():
         'redis_error': redis_error,
         'redis_latency': redis_latency,
         'queue_length': queue_length,
+        'queue_depths': queue_depths,
         'redis_url': settings.CELERY_BROKER_URL,
         'workers': worker_data,
         'worker_count': len(worker_data),
@@ -418,6 +493,12 @@ def get_system_status():
         'total_characters': total_characters,
         'stale_count': stale_count,
         'invalid_token_count': invalid_token_count,
+        'token_status_breakdown': token_status_breakdown,
+        'token_error_breakdown': token_error_breakdown,
+        'token_lock_metrics': token_lock_metrics,
+        'cache_metrics': cache_metrics,
+        'esi_breakers': esi_breakers,
+        'esi_breaker_metrics': esi_breaker_metrics,
         'users_online_count': users_online_count,
         'active_30d_count': active_30d_count, 
         'esi_health_percent': esi_health_percent,
@@ -5,7 +5,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.db.models import Count, Sum, Subquery, OuterRef, Q
 from django.db.models.functions import TruncDate
 from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponseBadRequest
+from django.http import JsonResponse, HttpResponse, HttpResponseBadRequest
 from django.utils import timezone
 from datetime import timedelta
 from django.views.decorators.http import require_POST
@@ -27,7 +27,6 @@ from core.permissions import (
 
 # Core Imports - Utils
 from core.utils import (
-    get_system_status, 
     get_character_data, 
     can_manage_role,
     get_role_hierarchy,
@@ -35,10 +34,13 @@ from core.utils import (
 )
 
 from core.models import Capability, RolePriority, Ban, BanAuditLog
+from core.ban_index import sync_user_bans
+from core.system_monitor import get_cached_snapshot, build_snapshot
 
 # Model Imports
 from pilot_data.models import EveCharacter, ItemType, ItemGroup, TypeAttribute
 from waitlist_data.models import Fleet, WaitlistEntry
+from waitlist_data.stats import close_fleet_sessions
 
 @login_required
 @user_passes_test(is_management)
@@ -165,7 +167,9 @@ def management_fleets(request):
             fleet_id = request.POST.get('fleet_id')
             fleet = get_object_or_404(Fleet, id=fleet_id)
             fleet.is_active = False
+            fleet.end_time = fleet.end_time or timezone.now()
             fleet.save()
+            close_fleet_sessions(fleet, fleet.end_time)
         elif action == 'delete':
             fleet_id = request.POST.get('fleet_id')
             if is_admin(request.user): Fleet.objects.filter(id=fleet_id).delete()
@@ -218,23 +222,15 @@ def management_sde(request):
 @login_required
 @user_passes_test(is_admin)
 def management_celery(request):
-    context = get_system_status()
-    total_characters = EveCharacter.objects.count()
-    threshold = timezone.now() - timedelta(minutes=60)
-    stale_count = EveCharacter.objects.filter(last_updated__lt=threshold).count()
-    invalid_token_count = 0
-    for char in EveCharacter.objects.all().iterator():
-        if not char.refresh_token: invalid_token_count += 1
-    if total_characters > 0: esi_health_percent = int(((total_characters - stale_count) / total_characters * 100))
-    else: esi_health_percent = 0
-    context.update({
-        'total_characters': total_characters, 'stale_count': stale_count,
-        'invalid_token_count': invalid_token_count, 'esi_health_percent': esi_health_percent,
+    # Reuse the collector's snapshot; only build one if no monitor is running
+    snapshot = get_cached_snapshot() or build_snapshot()
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.GET.get('partial') == 'true':
+        return HttpResponse(snapshot['html'])
+    context = {
+        'snapshot_html': snapshot['html'],
         'base_template': get_template_base(request)
-    })
+    }
     context.update(get_mgmt_context(request.user))
-    if request.headers.get('x-requested-with') == 'XMLHttpRequest' and request.GET.get('partial') == 'true':
-        return render(request, 'partials/celery_content.html', context)
     return render(request, 'management/celery_status.html', context)
 
 # --- PERMISSIONS & GROUPS MANAGEMENT ---
@@ -522,6 +518,9 @@ def api_ban_user(request):
         details=f"Reason: {reason}, Expires: {expires_at or 'Never'}"
     )
 
+    # Update Ban Index
+    sync_user_bans([target_user.id])
+
     # Remove from Waitlist (WaitlistEntry)
     deleted_count, _ = WaitlistEntry.objects.filter(character__user=target_user).delete()
 
@@ -548,6 +547,7 @@ def api_update_ban(request):
             action='remove',
             details=f"Ban removed for {ban.user.username}"
         )
+        sync_user_bans([ban.user_id])
         return JsonResponse({'success': True})
 
     elif action == 'update':
@@ -581,6 +581,7 @@ def api_update_ban(request):
                 action='update',
                 details=", ".join(changes)
             )
+            sync_user_bans([ban.user_id])
 
         return JsonResponse({'success': True})
 
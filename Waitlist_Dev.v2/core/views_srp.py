@@ -3,15 +3,17 @@ from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
-from django.db.models import Sum, Q
-from django.core.paginator import Paginator
+from django.db.models import Sum, Q, F
 from django.core.cache import cache # Import Cache
 from django.utils import timezone
-from datetime import timedelta
+from datetime import timedelta, time
 from dateutil.parser import parse
 
 from core.permissions import get_template_base, get_mgmt_context
-from pilot_data.models import SRPConfiguration, EveCharacter, CorpWalletJournal, EsiHeaderCache
+from pilot_data.models import SRPConfiguration, EveCharacter, CorpWalletJournal, EsiHeaderCache, SRPDailyRollup, SRPPayerDailyRollup
+from core.srp_rollups import PAYER_REF_TYPE, refresh_rollup_days
+from core.wallet_search import amount_filter, text_filter
+from core.wallet_categories import recategorise
 from scheduler.tasks import refresh_srp_wallet_task
 
 def can_manage_srp(user):
@@ -78,7 +80,7 @@ def api_sync_srp(request):
     # Determine execution time based on ESI Cache
     countdown = 0
     if config.character and config.character.corporation_id:
-        prefix = f"corp_wallet_{config.character.corporation_id}"
+        prefix = f"corp_wallet_{config.character.corporation_id}_"
         cache_entry = EsiHeaderCache.objects.filter(
             character=config.character,
             endpoint_name__startswith=prefix
@@ -133,10 +135,44 @@ def api_update_transaction_category(request):
     
     # Update
     transaction.custom_category = category
-    transaction.save()
+    transaction.save(update_fields=['custom_category'])
+
+    # Moves the amount between category buckets in the charts
+    refresh_rollup_days(transaction.config_id, [transaction.date])
     
     return JsonResponse({'success': True})
 
+@login_required
+@user_passes_test(can_manage_srp)
+@require_POST
+def api_bulk_update_category(request):
+    """
+    Sets one category on every journal entry matching the dashboard filters
+    (query string, same params as api_srp_data) or on an explicit entry_ids list.
+    """
+    config = SRPConfiguration.objects.first()
+    if not config: return JsonResponse({'success': False, 'error': 'No configuration found'})
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+
+    category = data.get('category') or None
+    entry_ids = data.get('entry_ids')
+
+    if entry_ids:
+        qs = CorpWalletJournal.objects.filter(config=config, entry_id__in=entry_ids)
+    else:
+        f = _journal_filters(request.GET)
+        # Refuse a request without a date/column filter: that would recategorise the whole journal
+        if not any(value for key, value in f.items() if key != 'divisions'):
+            return JsonResponse({'success': False, 'error': 'Apply at least one filter first'})
+        qs = _filter_journal(config, f)
+
+    updated = recategorise(qs, category)
+    return JsonResponse({'success': True, 'updated': updated})
+
 # --- DASHBOARD ---
 
 @login_required
@@ -146,6 +182,7 @@ def srp_dashboard(request):
     
     context = {
         'config': config,
+        'can_manage': can_manage_srp(request.user),
         # 'next_sync' is now fetched via API to ensure client-side freshness
         'base_template': get_template_base(request)
     }
@@ -164,8 +201,8 @@ def api_srp_status(request):
 
     next_sync = None
     if config.character and config.character.corporation_id:
-        # Matches format in wallet_service.py: corp_wallet_{id}_{div}_{page}
-        prefix = f"corp_wallet_{config.character.corporation_id}"
+        # Matches wallet_service.wallet_cache_key: corp_wallet_{id}_{div}
+        prefix = f"corp_wallet_{config.character.corporation_id}_"
         
         cache_entry = EsiHeaderCache.objects.filter(
             character=config.character,
@@ -186,111 +223,103 @@ def api_srp_status(request):
         'server_time': timezone.now().isoformat()
     })
 
-@login_required
-@user_passes_test(can_view_srp)
-def api_srp_data(request):
+def _journal_filters(params):
     """
-    Powerhouse API for the Dashboard Charts and Table.
+    Reads the dashboard filter params (query string) into a dict.
     """
-    config = SRPConfiguration.objects.first()
-    if not config: return JsonResponse({'error': 'Not Configured'}, status=404)
+    return {
+        # Base Filters
+        'start_date': params.get('start_date'),
+        'end_date': params.get('end_date'),
+        'divisions': params.getlist('divisions[]'), # List of ints
+        # Text/Search Filters
+        'f_div': params.get('f_div', '').strip(),
+        'f_amount': params.get('f_amount', '').strip(),
+        'f_from': params.get('f_from', '').strip(), # Renamed from f_party
+        'f_to': params.get('f_to', '').strip(),     # New 'To' filter
+        'f_type': params.get('f_type', '').strip(),
+        'f_category': params.get('f_category', '').strip(),
+        'f_reason': params.get('f_reason', '').strip(),
+    }
 
-    # 1. Base Filters
-    start_date_str = request.GET.get('start_date')
-    end_date_str = request.GET.get('end_date')
-    divisions = request.GET.getlist('divisions[]') # List of ints
-    
-    # 2. Text/Search Filters (NEW)
-    f_div = request.GET.get('f_div', '').strip()   # NEW
-    f_amount = request.GET.get('f_amount', '').strip()
-    f_from = request.GET.get('f_from', '').strip() # Renamed from f_party
-    f_to = request.GET.get('f_to', '').strip()     # New 'To' filter
-    f_type = request.GET.get('f_type', '').strip()
-    f_category = request.GET.get('f_category', '').strip()
-    f_reason = request.GET.get('f_reason', '').strip()
-
-    # Pagination Params
-    try:
-        page_number = int(request.GET.get('page', 1))
-    except ValueError:
-        page_number = 1
-        
-    try:
-        limit = int(request.GET.get('limit', 25))
-    except ValueError:
-        limit = 25
-    
+def _filter_journal(config, f):
     qs = CorpWalletJournal.objects.filter(config=config)
     
     # Apply Base Filters
-    if start_date_str: qs = qs.filter(date__gte=parse(start_date_str))
-    if end_date_str: qs = qs.filter(date__lte=parse(end_date_str))
-    if divisions: qs = qs.filter(division__in=divisions)
+    if f['start_date']: qs = qs.filter(date__gte=parse(f['start_date']))
+    if f['end_date']: qs = qs.filter(date__lte=parse(f['end_date']))
+    if f['divisions']: qs = qs.filter(division__in=f['divisions'])
 
     # Apply Column Search Filters
-    if f_div:
+    if f['f_div']:
         # Strict exact match for division number
         try:
-            qs = qs.filter(division=int(f_div))
+            qs = qs.filter(division=int(f['f_div']))
         except ValueError:
             pass # Ignore invalid non-integer searches
 
-    if f_amount:
-        if f_amount.startswith('>'):
-            try: qs = qs.filter(amount__gt=float(f_amount[1:]))
-            except: pass
-        elif f_amount.startswith('<'):
-            try: qs = qs.filter(amount__lt=float(f_amount[1:]))
-            except: pass
-        else:
-            qs = qs.filter(amount__icontains=f_amount) # String match fallback
+    if f['f_amount']:
+        # Parsed into a range (">1m", "1m-5m", "250k"), unparseable input is ignored
+        amount_q = amount_filter(f['f_amount'])
+        if amount_q is not None:
+            qs = qs.filter(amount_q)
 
     # Changed: Split party filter into From and To
-    if f_from:
-        qs = qs.filter(first_party_name__icontains=f_from)
+    if f['f_from']:
+        qs = text_filter(qs, 'first_party_name', f['f_from'])
         
-    if f_to:
-        qs = qs.filter(second_party_name__icontains=f_to)
+    if f['f_to']:
+        qs = text_filter(qs, 'second_party_name', f['f_to'])
     
-    if f_type:
-        qs = qs.filter(ref_type__icontains=f_type)
+    if f['f_type']:
+        qs = qs.filter(ref_type__icontains=f['f_type'])
         
-    if f_category:
-        if f_category == 'uncategorised':
+    if f['f_category']:
+        if f['f_category'] == 'uncategorised':
             # Filter for NULL or Empty string
             qs = qs.filter(Q(custom_category__isnull=True) | Q(custom_category=''))
         else:
-            qs = qs.filter(custom_category__iexact=f_category)
+            qs = qs.filter(custom_category__iexact=f['f_category'])
         
-    if f_reason:
-        # Standard contains search (Removed [empty] token logic)
-        qs = qs.filter(reason__icontains=f_reason)
-
-    # 3. Aggregates (Income/Outcome) - CALCULATED ON FULL SET (POST-FILTER)
-    # Exclude internal transfers from these specific totals per user request
-    agg_qs = qs.exclude(custom_category='internal_transfer')
-    total_income = agg_qs.filter(amount__gt=0).aggregate(s=Sum('amount'))['s'] or 0
-    total_outcome = agg_qs.filter(amount__lt=0).aggregate(s=Sum('amount'))['s'] or 0
-    net_change = total_income + total_outcome
-
-    # 4. Division Balances (Snapshot of latest known state)
-    # We fetch the absolute latest entry for each selected division, ignoring date filters
-    div_balances = {}
-    if divisions:
-        for div_id in divisions:
-            # FIX: Order by entry_id DESC primarily. Date can be unreliable for same-tick transactions.
-            # ESI entry_id is strictly sequential.
-            latest_entry = CorpWalletJournal.objects.filter(
-                config=config, 
-                division=div_id
-            ).order_by('-entry_id').values('balance').first()
-            
-            if latest_entry:
-                div_balances[div_id] = latest_entry['balance']
-            else:
-                div_balances[div_id] = 0
+    if f['f_reason']:
+        qs = text_filter(qs, 'reason', f['f_reason'])
+
+    return qs
+
+MAX_PAGE_SIZE = 500
+
+def _make_cursor(row):
+    return f"{row['date'].isoformat()}|{row['entry_id']}"
+
+def _parse_cursor(value):
+    """
+    'iso-date|entry_id' -> (datetime, entry_id), None for missing/garbled cursors.
+    """
+    if not value: return None
+    try:
+        date_str, entry_id = value.rsplit('|', 1)
+        return parse(date_str), int(entry_id)
+    except (ValueError, TypeError):
+        return None
+
+def _category_label(custom_category, ref_type):
+    # Prefer custom category if set
+    return (custom_category or ref_type).replace('_', ' ').title()
+
+def _charts_from_rows(qs):
+    """
+    Chart data straight from the journal. Only used when a free-text filter
+    (amount, parties, reason) rules out the rollup tables.
+    """
+    # Exclude internal transfers from the summary totals per user request
+    totals = qs.exclude(custom_category='internal_transfer').aggregate(
+        income=Sum('amount', filter=Q(amount__gt=0)),
+        outcome=Sum('amount', filter=Q(amount__lt=0))
+    )
+    total_income = totals['income'] or 0
+    total_outcome = totals['outcome'] or 0
+    summary = {'income': total_income, 'outcome': total_outcome, 'net': total_income + total_outcome}
 
-    # 5. Process Data for Charts - CALCULATED ON FULL SET (POST-FILTER)
     chart_data = qs.values('amount', 'date', 'ref_type', 'first_party_name', 'second_party_name', 'custom_category').order_by('date')
     
     monthly_stats = {}
@@ -298,7 +327,7 @@ def api_srp_data(request):
     ref_type_breakdown = {'in': {}, 'out': {}}
     timeline_payers = {}
 
-    for row in chart_data:
+    for row in chart_data.iterator(chunk_size=2000):
         amt = float(row['amount'])
         d = row['date']
         month_key = f"{d.year}-{d.month:02d}"
@@ -308,20 +337,14 @@ def api_srp_data(request):
         if amt > 0: monthly_stats[month_key]['in'] += amt
         else: monthly_stats[month_key]['out'] += abs(amt)
 
-        # Ref Types (Prefer custom category if set)
-        category_label = row['custom_category']
-        if not category_label:
-            category_label = row['ref_type'].replace('_', ' ').title()
-        else:
-            category_label = category_label.replace('_', ' ').title()
-
+        category_label = _category_label(row['custom_category'], row['ref_type'])
         if amt > 0:
             ref_type_breakdown['in'][category_label] = ref_type_breakdown['in'].get(category_label, 0) + amt
         else:
             ref_type_breakdown['out'][category_label] = ref_type_breakdown['out'].get(category_label, 0) + abs(amt)
 
         # Payers
-        if row['ref_type'] == 'player_donation' and amt > 0:
+        if row['ref_type'] == PAYER_REF_TYPE and amt > 0:
             payer = row['first_party_name']
             if payer not in top_payers: top_payers[payer] = {'count': 0, 'total': 0}
             top_payers[payer]['count'] += 1
@@ -331,36 +354,206 @@ def api_srp_data(request):
             if payer not in timeline_payers: timeline_payers[payer] = {}
             timeline_payers[payer][day_key] = timeline_payers[payer].get(day_key, 0) + amt
 
-    # 5. Transaction Table (Paginated)
-    full_qs = qs.order_by('-date')
-    paginator = Paginator(full_qs, limit)
-    page_obj = paginator.get_page(page_number)
+    return summary, monthly_stats, ref_type_breakdown, top_payers, timeline_payers
+
+def _filter_rollups(config, start_dt, end_dt, divisions, f_div, f_type, f_category):
+    """
+    Applies the dashboard's structured filters to the per-day rollup tables.
+    Date filters arrive as midnights and `date <= end` on the raw rows means "before the end day".
+    """
+    buckets = SRPDailyRollup.objects.filter(config=config)
+    payers = SRPPayerDailyRollup.objects.filter(config=config)
+
+    if start_dt:
+        buckets = buckets.filter(day__gte=start_dt.date())
+        payers = payers.filter(day__gte=start_dt.date())
+    if end_dt:
+        buckets = buckets.filter(day__lt=end_dt.date())
+        payers = payers.filter(day__lt=end_dt.date())
+    if divisions:
+        buckets = buckets.filter(division__in=divisions)
+        payers = payers.filter(division__in=divisions)
+    if f_div:
+        try:
+            buckets = buckets.filter(division=int(f_div))
+            payers = payers.filter(division=int(f_div))
+        except ValueError:
+            pass
+    if f_type:
+        buckets = buckets.filter(ref_type__icontains=f_type)
+        if f_type.lower() not in PAYER_REF_TYPE:
+            payers = payers.none()
+    if f_category:
+        if f_category == 'uncategorised':
+            buckets = buckets.filter(category='')
+            payers = payers.filter(category='')
+        else:
+            buckets = buckets.filter(category__iexact=f_category)
+            payers = payers.filter(category__iexact=f_category)
+
+    return buckets, payers
+
+def _charts_from_rollups(buckets, payers):
+    """
+    Same output as _charts_from_rows, read from the (filtered) rollup tables.
+    """
+    totals = buckets.exclude(category='internal_transfer').aggregate(income=Sum('income'), outcome=Sum('outcome'))
+    total_income = totals['income'] or 0
+    total_outcome = totals['outcome'] or 0
+    summary = {'income': total_income, 'outcome': total_outcome, 'net': total_income + total_outcome}
+
+    monthly_stats = {}
+    ref_type_breakdown = {'in': {}, 'out': {}}
+    rows = buckets.values('day', 'category', 'ref_type').annotate(
+        income=Sum('income'), outcome=Sum('outcome'), count_in=Sum('count_in'), count_out=Sum('count_out')
+    ).order_by('day')
+
+    for row in rows:
+        month_key = f"{row['day'].year}-{row['day'].month:02d}"
+        income = float(row['income'])
+        outcome = abs(float(row['outcome']))
+
+        if month_key not in monthly_stats: monthly_stats[month_key] = {'in': 0, 'out': 0}
+        monthly_stats[month_key]['in'] += income
+        monthly_stats[month_key]['out'] += outcome
+
+        category_label = _category_label(row['category'], row['ref_type'])
+        if row['count_in']:
+            ref_type_breakdown['in'][category_label] = ref_type_breakdown['in'].get(category_label, 0) + income
+        if row['count_out']:
+            ref_type_breakdown['out'][category_label] = ref_type_breakdown['out'].get(category_label, 0) + outcome
+
+    top_payers = {}
+    timeline_payers = {}
+    payer_rows = payers.values('payer_name', 'day').annotate(total=Sum('total'), count=Sum('count')).order_by('day')
+    for row in payer_rows:
+        payer = row['payer_name']
+        amt = float(row['total'])
+        if payer not in top_payers: top_payers[payer] = {'count': 0, 'total': 0}
+        top_payers[payer]['count'] += row['count']
+        top_payers[payer]['total'] += amt
+
+        day_key = row['day'].strftime("%Y-%m-%d")
+        if payer not in timeline_payers: timeline_payers[payer] = {}
+        timeline_payers[payer][day_key] = timeline_payers[payer].get(day_key, 0) + amt
 
-    paginated_transactions = list(page_obj.object_list.values(
+    return summary, monthly_stats, ref_type_breakdown, top_payers, timeline_payers
+
+@login_required
+@user_passes_test(can_view_srp)
+def api_srp_data(request):
+    """
+    Powerhouse API for the Dashboard Charts and Table.
+    """
+    config = SRPConfiguration.objects.first()
+    if not config: return JsonResponse({'error': 'Not Configured'}, status=404)
+
+    # 1. Filters (shared with the bulk category endpoint)
+    f = _journal_filters(request.GET)
+
+    # Pagination Params (keyset: 'after' / 'before' carry a cursor, 'page' is only echoed for the UI)
+    try:
+        page_number = int(request.GET.get('page', 1))
+    except ValueError:
+        page_number = 1
+        
+    try:
+        limit = min(max(int(request.GET.get('limit', 25)), 1), MAX_PAGE_SIZE)
+    except ValueError:
+        limit = 25
+
+    after = _parse_cursor(request.GET.get('after'))
+    before = _parse_cursor(request.GET.get('before'))
+
+    # Paging through the table doesn't need the charts again
+    with_charts = request.GET.get('charts', '1') != '0'
+    
+    qs = _filter_journal(config, f)
+
+    # 3. Summary + Charts - CALCULATED ON FULL SET (POST-FILTER)
+    # Rollups cover every structured filter; free-text filters still need the raw rows
+    start_dt = parse(f['start_date']) if f['start_date'] else None
+    end_dt = parse(f['end_date']) if f['end_date'] else None
+    day_aligned = all(dt is None or dt.time() == time.min for dt in (start_dt, end_dt))
+    rollup_filters = day_aligned and not (f['f_amount'] or f['f_from'] or f['f_to'] or f['f_reason'])
+
+    buckets = payers = None
+    if rollup_filters:
+        buckets, payers = _filter_rollups(config, start_dt, end_dt, f['divisions'], f['f_div'], f['f_type'], f['f_category'])
+
+    response = {}
+    if with_charts:
+        if rollup_filters:
+            summary, monthly_stats, ref_type_breakdown, top_payers, timeline_payers = _charts_from_rollups(buckets, payers)
+        else:
+            summary, monthly_stats, ref_type_breakdown, top_payers, timeline_payers = _charts_from_rows(qs)
+
+        # 4. Division Balances (Snapshot of latest known state)
+        # We fetch the absolute latest entry for each selected division, ignoring date filters
+        div_balances = {}
+        if f['divisions']:
+            for div_id in f['divisions']:
+                # FIX: Order by entry_id DESC primarily. Date can be unreliable for same-tick transactions.
+                # ESI entry_id is strictly sequential.
+                latest_entry = CorpWalletJournal.objects.filter(
+                    config=config, 
+                    division=div_id
+                ).order_by('-entry_id').values('balance').first()
+                
+                if latest_entry:
+                    div_balances[div_id] = latest_entry['balance']
+                else:
+                    div_balances[div_id] = 0
+
+        response.update({
+            'summary': summary,
+            'division_balances': div_balances, # NEW FIELD
+            'monthly': monthly_stats,
+            'categories': ref_type_breakdown,
+            'top_payers': top_payers,
+            'timeline': timeline_payers,
+        })
+
+    # 5. Transaction Table (Keyset paginated on date, entry_id - no OFFSET)
+    fields = (
         'entry_id', 'date', 'division', 'amount', 'first_party_name', 
         'second_party_name', 'ref_type', 'reason', 'custom_category'
-    ))
+    )
+    if before:
+        # Walking back: read the page above the cursor in ascending order, then flip it
+        rows = list(qs.filter(
+            Q(date__gt=before[0]) | Q(date=before[0], entry_id__gt=before[1])
+        ).order_by('date', 'entry_id').values(*fields)[:limit + 1])
+        has_previous = len(rows) > limit
+        rows = rows[:limit][::-1]
+        has_next = True
+    else:
+        page_qs = qs
+        if after:
+            page_qs = qs.filter(Q(date__lt=after[0]) | Q(date=after[0], entry_id__lt=after[1]))
+        rows = list(page_qs.order_by('-date', '-entry_id').values(*fields)[:limit + 1])
+        has_next = len(rows) > limit
+        rows = rows[:limit]
+        has_previous = after is not None
+
+    # Totals come from the rollups when the filters allow it; a raw COUNT would scan the journal
+    total_count = None
+    if buckets is not None:
+        total_count = buckets.aggregate(n=Sum(F('count_in') + F('count_out')))['n'] or 0
 
     pagination_meta = {
-        'current_page': page_obj.number,
-        'total_pages': paginator.num_pages,
-        'has_next': page_obj.has_next(),
-        'has_previous': page_obj.has_previous(),
-        'total_count': paginator.count,
-        'limit': limit
+        'current_page': page_number,
+        'total_pages': max(1, -(-total_count // limit)) if total_count is not None else None,
+        'has_next': has_next,
+        'has_previous': has_previous,
+        'total_count': total_count,
+        'limit': limit,
+        'next_cursor': _make_cursor(rows[-1]) if rows and has_next else None,
+        'prev_cursor': _make_cursor(rows[0]) if rows and has_previous else None
     }
 
-    return JsonResponse({
-        'summary': {
-            'income': total_income,
-            'outcome': total_outcome,
-            'net': net_change
-        },
-        'division_balances': div_balances, # NEW FIELD
-        'monthly': monthly_stats,
-        'categories': ref_type_breakdown,
-        'top_payers': top_payers,
-        'timeline': timeline_payers,
-        'transactions': paginated_transactions,
+    response.update({
+        'transactions': rows,
         'pagination': pagination_meta
-    })
\ No newline at end of file
+    })
+    return JsonResponse(response)
@@ -0,0 +1,211 @@
+import logging
+from decimal import Decimal
+from django.db.models import Q, F, Value, Case, When, CharField, DecimalField, Min, Max
+from django.db.models.functions import Mod, TruncDate
+from django.db.models.lookups import LessThan
+from datetime import timezone as dt_timezone
+
+from pilot_data.models import CorpWalletJournal, SRPConfiguration
+from core.srp_rollups import refresh_rollup_days, rebuild_rollups
+
+logger = logging.getLogger(__name__)
+
+# Standard ESI ref_types for taxes and fees
+TAX_REF_TYPES = ['contract_brokers_fee', 'brokers_fee', 'transaction_tax', 'tax']
+BROKER_KEYWORDS = ["broker's fee", "brokers fee"]
+
+# Multiple of 20,000,000 (Insurance Payouts often look like this or user donations)
+SRP_PAYOUT_STEP = 20000000
+SRP_PAYOUT_EPSILON = Decimal('0.1')
+
+# Rows per UPDATE when re-applying rules over the whole journal
+RULE_CHUNK = 20000
+
+def _payout_multiple(row, corp_id):
+    try:
+        # Use small epsilon for float comparison just in case
+        return abs(float(row['amount']) % SRP_PAYOUT_STEP) < 0.1
+    except (TypeError, ValueError):
+        return False
+
+def _payout_multiple_sql(corp_id):
+    amount_mod = Mod(F('amount'), Value(Decimal(SRP_PAYOUT_STEP), output_field=DecimalField()))
+    return Q(LessThan(amount_mod, Value(SRP_PAYOUT_EPSILON, output_field=DecimalField())), amount__gt=0)
+
+# Ordered rule table: first match wins. Every rule carries a Python predicate (sync/import
+# path, one row at a time) and, where it can be expressed, the same condition as a Q for
+# set-based UPDATEs. Rules with sql=None are applied by the chunked Python pass instead.
+CATEGORY_RULES = [
+    # 1. Tax / Broker Fees (Check ref_type first as it is most reliable)
+    {
+        'category': 'tax',
+        'match': lambda row, corp_id: row['ref_type'] in TAX_REF_TYPES,
+        'sql': lambda corp_id: Q(ref_type__in=TAX_REF_TYPES),
+    },
+    # Fallback text check for broker fees if ref_type wasn't definitive
+    {
+        'category': 'tax',
+        'match': lambda row, corp_id: any(k in row['reason'] for k in BROKER_KEYWORDS),
+        'sql': lambda corp_id: Q(reason__icontains=BROKER_KEYWORDS[0]) | Q(reason__icontains=BROKER_KEYWORDS[1]),
+    },
+    # 2. Internal Transfer (Corp to Corp)
+    {
+        'category': 'internal_transfer',
+        'match': lambda row, corp_id: row['first_party_id'] == corp_id and row['second_party_id'] == corp_id,
+        'sql': lambda corp_id: Q(first_party_id=corp_id, second_party_id=corp_id),
+    },
+    # 3. SRP In (Positive Amount)
+    {
+        'category': 'srp_in',
+        'match': lambda row, corp_id: row['amount'] > 0 and 'srp' in row['reason'],
+        'sql': lambda corp_id: Q(amount__gt=0, reason__icontains='srp'),
+    },
+    {
+        'category': 'srp_in',
+        'match': lambda row, corp_id: row['amount'] > 0 and _payout_multiple(row, corp_id),
+        'sql': _payout_multiple_sql,
+    },
+    # 4. SRP Out (Negative Amount)
+    {
+        'category': 'srp_out',
+        'match': lambda row, corp_id: row['amount'] < 0 and 'srp' in row['reason'],
+        'sql': lambda corp_id: Q(amount__lt=0, reason__icontains='srp'),
+    },
+    {
+        'category': 'giveaway',
+        'match': lambda row, corp_id: row['amount'] < 0 and 'giveaway' in row['reason'],
+        'sql': lambda corp_id: Q(amount__lt=0, reason__icontains='giveaway'),
+    },
+]
+
+def _rule_row(amount, reason, first_party_id, second_party_id, ref_type):
+    return {
+        'amount': amount,
+        'reason': str(reason or "").lower(), # Normalize to lowercase string
+        'first_party_id': first_party_id,
+        'second_party_id': second_party_id,
+        'ref_type': ref_type,
+    }
+
+def determine_auto_category(amount, reason, first_party_id, second_party_id, corp_id, ref_type=None, rules=None):
+    """
+    Applies business rules to guess the category.
+    Shared by Sync and Backfill tools.
+    """
+    row = _rule_row(amount, reason, first_party_id, second_party_id, ref_type)
+    for rule in (rules or CATEGORY_RULES):
+        if rule['match'](row, corp_id):
+            return rule['category']
+    return None
+
+def compile_category_case(corp_id, rules=None):
+    """
+    The SQL-expressible prefix of the rule table as one CASE expression (NULL = no rule).
+    Stops at the first Python-only rule, since a later SQL rule may only win if it didn't match.
+    """
+    whens = []
+    for rule in (rules or CATEGORY_RULES):
+        if rule['sql'] is None:
+            break
+        whens.append(When(rule['sql'](corp_id), then=Value(rule['category'])))
+    if not whens:
+        return None
+    return Case(*whens, default=Value(None), output_field=CharField())
+
+def _sql_only(rules):
+    return all(rule['sql'] is not None for rule in rules)
+
+def apply_category_rules(config, force=False, queryset=None, rules=None, chunk_size=RULE_CHUNK, on_progress=None):
+    """
+    Re-applies the rules to a config's journal (or a narrower queryset of it).
+    Default only fills uncategorised rows; force also overwrites existing categories.
+    A rule never clears a category, matching the per-row backfill it replaces.
+    SQL rules run as chunked UPDATE ... CASE statements over id ranges; any
+    Python-only rules run afterwards over the rows that are still unmatched.
+    Returns the number of rows changed.
+    """
+    rules = rules or CATEGORY_RULES
+    corp_id = config.character.corporation_id
+
+    qs = queryset if queryset is not None else CorpWalletJournal.objects.all()
+    qs = qs.filter(config=config)
+    if not force:
+        qs = qs.filter(Q(custom_category__isnull=True) | Q(custom_category=''))
+
+    bounds = qs.aggregate(low=Min('id'), high=Max('id'))
+    if bounds['low'] is None:
+        return 0
+
+    changed = 0
+    case = compile_category_case(corp_id, rules)
+    if case is not None:
+        for start in range(bounds['low'], bounds['high'] + 1, chunk_size):
+            chunk = qs.filter(id__gte=start, id__lt=start + chunk_size)
+            changed += chunk.annotate(auto_category=case).filter(
+                auto_category__isnull=False
+            ).exclude(custom_category=F('auto_category')).update(custom_category=case)
+            if on_progress: on_progress(changed)
+
+    if not _sql_only(rules):
+        changed += _apply_python_rules(qs, corp_id, rules, case, chunk_size, on_progress, changed)
+
+    if changed:
+        # Category moves shift money between rollup buckets
+        rebuild_rollups(config.id)
+    return changed
+
+def _apply_python_rules(qs, corp_id, rules, case, chunk_size, on_progress, changed_so_far):
+    """
+    Chunked Python pass for rules that have no SQL form. Rows already claimed by
+    the SQL prefix are skipped, the rest are evaluated against the full rule table.
+    """
+    if case is not None:
+        qs = qs.annotate(auto_category=case).filter(auto_category__isnull=True)
+
+    changed = 0
+    pending = []
+    fields = ('id', 'amount', 'reason', 'first_party_id', 'second_party_id', 'ref_type', 'custom_category')
+    for row in qs.values(*fields).iterator(chunk_size=chunk_size):
+        new_cat = determine_auto_category(
+            row['amount'], row['reason'], row['first_party_id'], row['second_party_id'], corp_id, row['ref_type'], rules
+        )
+        if new_cat and new_cat != row['custom_category']:
+            pending.append(CorpWalletJournal(id=row['id'], custom_category=new_cat))
+
+        if len(pending) >= chunk_size:
+            CorpWalletJournal.objects.bulk_update(pending, ['custom_category'])
+            changed += len(pending)
+            pending = []
+            if on_progress: on_progress(changed_so_far + changed)
+
+    if pending:
+        CorpWalletJournal.objects.bulk_update(pending, ['custom_category'])
+        changed += len(pending)
+    return changed
+
+def recategorise(queryset, category):
+    """
+    Bulk manual recategorisation: one UPDATE for everything the queryset matches,
+    then a rollup refresh for just the days involved. Returns the number of rows updated.
+    """
+    category = category or None
+    touched = {}
+    for config_id, day in queryset.order_by().annotate(
+        day=TruncDate('date', tzinfo=dt_timezone.utc)
+    ).values_list('config_id', 'day').distinct():
+        touched.setdefault(config_id, set()).add(day)
+
+    updated = queryset.update(custom_category=category)
+
+    for config_id, days in touched.items():
+        refresh_rollup_days(config_id, days)
+    return updated
+
+def apply_rules_everywhere(force=False, on_progress=None):
+    """
+    apply_category_rules for every SRP configuration (backfill command).
+    """
+    total = 0
+    for config in SRPConfiguration.objects.select_related('character'):
+        total += apply_category_rules(config, force=force, on_progress=on_progress)
+    return total
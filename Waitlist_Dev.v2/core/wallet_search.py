@@ -0,0 +1,94 @@
+import re
+from decimal import Decimal, InvalidOperation
+from django.db import connection
+from django.db.models import F, Q, Value, Lookup, CharField, TextField
+
+# Journal text columns with a MySQL FULLTEXT index (pilot_data migration 0023)
+FULLTEXT_FIELDS = ('first_party_name', 'second_party_name', 'reason')
+
+# InnoDB defaults: innodb_ft_min_token_size = 3 and the built-in stopword list.
+# Words the index never holds can't be matched, those searches stay on icontains.
+FT_MIN_TOKEN = 3
+FT_STOPWORDS = {
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i',
+    'in', 'is', 'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when',
+    'where', 'who', 'will', 'with', 'und', 'www'
+}
+
+ISK_SUFFIXES = {'k': Decimal('1e3'), 'm': Decimal('1e6'), 'b': Decimal('1e9')}
+
+class FullTextMatch(Lookup):
+    """
+    MATCH (col) AGAINST (%s IN BOOLEAN MODE). MySQL only, used as a filter() expression.
+    """
+    lookup_name = 'ft_match'
+
+    def as_mysql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f"MATCH ({lhs}) AGAINST ({rhs} IN BOOLEAN MODE)", (*lhs_params, *rhs_params)
+
+def _fulltext_query(term):
+    """
+    Boolean-mode query that can only narrow, never drop, rows icontains would match.
+    A FULLTEXT word prefix can't express infix matches, so the first word of the term is
+    left out when it may start mid-token ("mith" must still find "Smith"). Later words
+    follow a separator in any matching text, so they start a token there ("+smi*").
+    """
+    # Apostrophes can sit inside an InnoDB token ("o'neil"), so words touching one are skipped
+    words = re.split(r"[^\w']+", term.lower())
+    if words and words[0] and re.match(r"[\w']", term):
+        words = words[1:]
+    words = [w for w in words if "'" not in w and len(w) >= FT_MIN_TOKEN and w not in FT_STOPWORDS]
+    return " ".join(f"+{w}*" for w in words)
+
+def text_filter(qs, field, term):
+    """
+    Substring search on a journal text column. On MySQL the FULLTEXT index narrows
+    the rows first when the term has a word it can use; the icontains check always
+    decides, so results are the same as a plain icontains search.
+    """
+    if connection.vendor == 'mysql' and field in FULLTEXT_FIELDS:
+        query = _fulltext_query(term)
+        if query:
+            output = TextField() if field == 'reason' else CharField()
+            qs = qs.filter(FullTextMatch(F(field), Value(query, output_field=output)))
+    return qs.filter(**{f'{field}__icontains': term})
+
+def parse_isk(value):
+    """
+    '1,500,000' / '1.5m' / '250k' / '2b' -> Decimal. Raises ValueError on junk.
+    """
+    value = value.strip().lower().replace(',', '').replace(' ', '').replace('isk', '')
+    multiplier = Decimal(1)
+    if value and value[-1] in ISK_SUFFIXES:
+        multiplier = ISK_SUFFIXES[value[-1]]
+        value = value[:-1]
+    try:
+        return Decimal(value) * multiplier
+    except InvalidOperation:
+        raise ValueError(f"Not an amount: {value}")
+
+def amount_filter(expr):
+    """
+    Turns the amount column filter into an indexable range predicate.
+      '>1m' '>=1m' '<0' '<=-5k'  compare the signed amount
+      '1m-2m' / '1m..2m'         inclusive range on the size of the amount (in or out)
+      '1.5m'                     exact size of the amount (in or out)
+    Returns a Q, or None if the filter can't be parsed.
+    """
+    expr = expr.strip()
+    try:
+        for op, lookup in (('>=', 'gte'), ('<=', 'lte'), ('>', 'gt'), ('<', 'lt')):
+            if expr.startswith(op):
+                return Q(**{f'amount__{lookup}': parse_isk(expr[len(op):])})
+
+        match = re.match(r'^(.+?)(?:\.\.|(?<=[\dkmb])-)(.+)$', expr.lower())
+        if match:
+            low, high = sorted((abs(parse_isk(match.group(1))), abs(parse_isk(match.group(2)))))
+            return Q(amount__gte=low, amount__lte=high) | Q(amount__gte=-high, amount__lte=-low)
+
+        value = abs(parse_isk(expr))
+        return Q(amount=value) | Q(amount=-value)
+    except ValueError:
+        return None
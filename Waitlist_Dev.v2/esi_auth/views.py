@@ -16,6 +16,7 @@ from cryptography.fernet import InvalidToken
 
 from pilot_data.models import EveCharacter
 from scheduler.tasks import refresh_character_task
+from esi_calls.token_cache import forget_access_token
 
 # --- PERMISSION HELPER ---
 def can_manage_srp(user):
@@ -78,7 +79,7 @@ def _start_sso_flow(request):
         'scope': scopes,
         'state': state_token 
     }
-    base_url = "https://login.eveonline.com/v2/oauth/authorize/"
+    base_url = f"{settings.EVE_SSO_URL}/v2/oauth/authorize/"
     url = f"{base_url}?{urllib.parse.urlencode(params)}"
     return redirect(url)
 
@@ -98,7 +99,7 @@ def sso_callback(request):
     if not code: return HttpResponse("SSO Error: No code received", status=400)
 
     # 1. Exchange code for tokens
-    token_url = "https://login.eveonline.com/v2/oauth/token"
+    token_url = f"{settings.EVE_SSO_URL}/v2/oauth/token"
     client_id = settings.EVE_CLIENT_ID
     secret_key = os.getenv('EVE_SECRET_KEY')
 
@@ -119,7 +120,7 @@ def sso_callback(request):
     token_expiry = timezone.now() + timedelta(seconds=expires_in)
 
     # 2. Verify Identity
-    verify_url = "https://esi.evetech.net/verify/"
+    verify_url = f"{settings.ESI_ROOT_URL}/verify/"
     headers = {'Authorization': f'Bearer {access_token}'}
     verify_response = requests.get(verify_url, headers=headers)
     if verify_response.status_code != 200: return HttpResponse("Verification Failed", status=400)
@@ -144,7 +145,9 @@ def sso_callback(request):
             'character_name': char_name,
             'access_token': access_token,
             'refresh_token': refresh_token,
-            'token_expires': token_expiry
+            'token_expires': token_expiry,
+            'token_status': 'valid',
+            'last_refresh_error': ""
         }
 
         if user.characters.filter(is_main=True).exclude(character_id=char_id).exists():
@@ -156,12 +159,13 @@ def sso_callback(request):
                 defaults=defaults
             )
         except InvalidToken:
-            EveCharacter.objects.filter(character_id=char_id).update(access_token="", refresh_token="")
+            EveCharacter.objects.filter(character_id=char_id).update(access_token="", refresh_token="", has_refresh_token=False, token_status='missing', last_refresh_error="decrypt_failed")
             target_char, created = EveCharacter.objects.update_or_create(
                 character_id=char_id,
                 defaults=defaults
             )
 
+        forget_access_token(target_char.character_id)
         refresh_character_task.delay(target_char.character_id)
         
         # Redirect Logic
@@ -173,7 +177,7 @@ def sso_callback(request):
         try:
             target_char = EveCharacter.objects.get(character_id=char_id)
         except InvalidToken:
-            EveCharacter.objects.filter(character_id=char_id).update(access_token="", refresh_token="")
+            EveCharacter.objects.filter(character_id=char_id).update(access_token="", refresh_token="", has_refresh_token=False, token_status='missing', last_refresh_error="decrypt_failed")
             target_char = EveCharacter.objects.get(character_id=char_id)
         except EveCharacter.DoesNotExist:
             target_char = None
@@ -183,7 +187,10 @@ def sso_callback(request):
             target_char.access_token = access_token
             target_char.refresh_token = refresh_token
             target_char.token_expires = token_expiry
+            target_char.token_status = 'valid'
+            target_char.last_refresh_error = ""
             target_char.save()
+            forget_access_token(target_char.character_id)
         else:
             is_first_user = User.objects.count() == 0
             user = User.objects.create_user(username=str(char_id), first_name=char_name)
@@ -203,7 +210,8 @@ def sso_callback(request):
                 is_main=True,
                 access_token=access_token,
                 refresh_token=refresh_token,
-                token_expires=token_expiry
+                token_expires=token_expiry,
+                token_status='valid'
             )
             refresh_character_task.delay(target_char.character_id)
 
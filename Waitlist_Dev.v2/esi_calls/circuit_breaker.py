@@ -0,0 +1,271 @@
+import logging
+import re
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+import requests
+
+from core.metrics import incr, incr_many
+from core.redis_client import get_redis_connection
+from esi_calls.http_pool import get_shared_session
+from esi_calls.worker_profile import io_stage
+
+logger = logging.getLogger(__name__)
+
+# Shared circuit breaker per ESI route ("GET /characters/{id}/skills/"), state kept in Redis
+# so every worker / Daphne process sees the same picture.
+#   closed    -> requests flow; FAILURE_THRESHOLD failures inside FAILURE_WINDOW open it
+#   open      -> requests are refused locally until opened_until
+#   half-open -> after the backoff, HALF_OPEN_PROBES requests go through per PROBE_WINDOW;
+#                a probe success closes the route, a probe failure reopens it with a longer backoff
+# If Redis is unreachable the breaker stays out of the way (everything is treated as closed).
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = 5
+FAILURE_WINDOW = 30 # seconds
+OPEN_BASE = 15 # seconds, doubled per consecutive reopen
+OPEN_MAX = 600
+HALF_OPEN_PROBES = 3
+PROBE_WINDOW = 20 # seconds a batch of probe slots lives before the next batch is handed out
+
+# Closed routes are trusted locally this long, so the happy path costs no Redis round trip
+LOCAL_TTL = 1.0
+
+METRICS_FLUSH_INTERVAL = 5
+
+STATE_KEY = 'esi_breaker:{route}'
+FAILS_KEY = 'esi_breaker:{route}:fails'
+PROBES_KEY = 'esi_breaker:{route}:probes'
+OPEN_SET_KEY = 'esi_breaker:open'
+
+# Version prefixes ESI accepts in front of every route
+_VERSION_SEGMENT = re.compile(r'^(latest|legacy|dev|v\d+)$')
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised by esi_request() when the route is open. Subclasses RequestException so
+    existing `except Exception` / network-error handling treats it like ESI being down.
+    """
+    def __init__(self, route, retry_at=None):
+        self.route = route
+        self.retry_at = retry_at
+        super().__init__(f"Circuit open for {route}")
+
+def route_key(method, url):
+    """
+    'GET', 'https://esi.evetech.net/latest/characters/9001/skills/?x=1' -> 'GET /characters/{id}/skills/'
+    """
+    segments = urlsplit(url).path.split('/')
+    parts = []
+    for segment in segments:
+        if not segment:
+            continue
+        if not parts and _VERSION_SEGMENT.match(segment):
+            continue
+        parts.append('{id}' if segment.isdigit() else segment)
+    return f"{method.upper()} /{'/'.join(parts)}/" if parts else f"{method.upper()} /"
+
+def is_failure(status):
+    """
+    Upstream health failures only. 4xx (missing scope, not in fleet, 420 error budget)
+    are about the caller, not the route. None = network error / timeout.
+    """
+    return status is None or status >= 500
+
+# --- Per-process state ---
+
+_local = {} # route -> (state, valid_until monotonic, retry_at epoch)
+_local_lock = threading.Lock()
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+_metrics_flushed = time.monotonic()
+
+def _count(field, amount=1):
+    global _metrics_flushed
+    with _metrics_lock:
+        _metrics[field] += amount
+        if time.monotonic() - _metrics_flushed < METRICS_FLUSH_INTERVAL:
+            return
+        pending = dict(_metrics)
+        _metrics.clear()
+        _metrics_flushed = time.monotonic()
+    incr_many('esi_breaker', pending)
+
+def _remember(route, state, seconds, retry_at=None):
+    with _local_lock:
+        _local[route] = (state, time.monotonic() + seconds, retry_at)
+
+def _forget(route):
+    with _local_lock:
+        _local.pop(route, None)
+
+def _backoff(open_count):
+    return min(OPEN_BASE * (2 ** max(open_count - 1, 0)), OPEN_MAX)
+
+# --- Public API ---
+
+def check(route):
+    """
+    Decides whether a request on `route` may go out.
+    Returns CLOSED (normal), HALF_OPEN (this request is a probe) or OPEN (refuse it).
+    Pass the result back to record() once the request finished.
+    """
+    with _local_lock:
+        cached = _local.get(route)
+    if cached and cached[1] > time.monotonic():
+        if cached[0] == OPEN:
+            _count('rejected')
+        return cached[0]
+
+    try:
+        r = get_redis_connection()
+        data = r.hgetall(STATE_KEY.format(route=route))
+        if not data:
+            _remember(route, CLOSED, LOCAL_TTL)
+            return CLOSED
+
+        opened_until = float(data.get(b'opened_until', 0))
+        now = time.time()
+        if now < opened_until:
+            # Nothing can change before opened_until, so refuse locally until then
+            _remember(route, OPEN, opened_until - now, opened_until)
+            _count('rejected')
+            return OPEN
+
+        probes_key = PROBES_KEY.format(route=route)
+        taken = r.incr(probes_key)
+        if taken == 1:
+            r.expire(probes_key, PROBE_WINDOW)
+        if taken <= HALF_OPEN_PROBES:
+            _count('probe')
+            return HALF_OPEN
+        # Probe slots for this window are used up; ask Redis again shortly
+        _remember(route, OPEN, LOCAL_TTL, now + PROBE_WINDOW)
+        _count('rejected')
+        return OPEN
+    except Exception as e:
+        logger.debug(f"[Breaker] state for {route} unavailable: {e}")
+        return CLOSED
+
+def record(route, ok, state=CLOSED):
+    """
+    Feeds one request outcome back. Successes on a closed route cost nothing;
+    a failure counts towards opening it, a probe decides between closing and reopening.
+    """
+    try:
+        if ok:
+            if state == HALF_OPEN:
+                _close(route)
+            return
+        if state == HALF_OPEN:
+            _reopen(route)
+        else:
+            _count_failure(route)
+    except Exception as e:
+        logger.debug(f"[Breaker] record for {route} failed: {e}")
+
+def _count_failure(route):
+    r = get_redis_connection()
+    fails_key = FAILS_KEY.format(route=route)
+    failures = r.incr(fails_key)
+    if failures == 1:
+        r.expire(fails_key, FAILURE_WINDOW)
+    # Only the caller that crosses the threshold opens it, and never over an existing
+    # open state (late failures from other processes must not reset its backoff)
+    if failures == FAILURE_THRESHOLD and not r.exists(STATE_KEY.format(route=route)):
+        _open(route, 1)
+
+def _open(route, open_count):
+    r = get_redis_connection()
+    opened_until = time.time() + _backoff(open_count)
+    pipe = r.pipeline()
+    pipe.hset(STATE_KEY.format(route=route), mapping={'opened_until': opened_until, 'open_count': open_count})
+    pipe.expire(STATE_KEY.format(route=route), OPEN_MAX * 6)
+    pipe.delete(FAILS_KEY.format(route=route), PROBES_KEY.format(route=route))
+    pipe.sadd(OPEN_SET_KEY, route)
+    pipe.execute()
+    _remember(route, OPEN, opened_until - time.time(), opened_until)
+    incr('esi_breaker', 'opened' if open_count == 1 else 'reopened')
+    logger.warning(f"[Breaker] {route} OPEN for {_backoff(open_count)}s (trip #{open_count})")
+
+def _reopen(route):
+    r = get_redis_connection()
+    data = r.hgetall(STATE_KEY.format(route=route))
+    if not data:
+        # Another probe closed it meanwhile; count this one as a plain failure
+        _count_failure(route)
+        return
+    if time.time() < float(data.get(b'opened_until', 0)):
+        return # A concurrent probe already reopened it
+    _open(route, int(data.get(b'open_count', 1)) + 1)
+
+def _close(route):
+    r = get_redis_connection()
+    pipe = r.pipeline()
+    pipe.delete(STATE_KEY.format(route=route), FAILS_KEY.format(route=route), PROBES_KEY.format(route=route))
+    pipe.srem(OPEN_SET_KEY, route)
+    removed = pipe.execute()[0]
+    _forget(route)
+    if removed:
+        incr('esi_breaker', 'closed')
+        logger.info(f"[Breaker] {route} CLOSED (probe succeeded)")
+
+def blocked_routes():
+    """
+    {route: {'state': OPEN | HALF_OPEN, 'retry_at': epoch, 'open_count': n}} for every
+    route that is not closed. One SMEMBERS + one pipelined HGETALL, for dispatchers and the monitor.
+    """
+    try:
+        r = get_redis_connection()
+        routes = [m.decode() for m in r.smembers(OPEN_SET_KEY)]
+        if not routes:
+            return {}
+        pipe = r.pipeline(transaction=False)
+        for route in routes:
+            pipe.hgetall(STATE_KEY.format(route=route))
+        states = pipe.execute()
+    except Exception as e:
+        logger.debug(f"[Breaker] blocked_routes unavailable: {e}")
+        return {}
+
+    now = time.time()
+    result = {}
+    stale = []
+    for route, data in zip(routes, states):
+        if not data:
+            stale.append(route) # State key expired without a probe ever closing it
+            continue
+        opened_until = float(data.get(b'opened_until', 0))
+        result[route] = {
+            'state': OPEN if now < opened_until else HALF_OPEN,
+            'retry_at': opened_until,
+            'open_count': int(data.get(b'open_count', 1)),
+        }
+    if stale:
+        try: r.srem(OPEN_SET_KEY, *stale)
+        except Exception: pass
+    return result
+
+def esi_request(method, url, session=None, **kwargs):
+    """
+    requests-style call guarded by the breaker, for ESI calls made outside call_esi()
+    and the rate governor. Raises CircuitOpenError instead of sending when the route is open.
+    """
+    route = route_key(method, url)
+    state = check(route)
+    if state == OPEN:
+        raise CircuitOpenError(route)
+    try:
+        with io_stage():
+            response = (session or get_shared_session()).request(method, url, **kwargs)
+    except Exception:
+        record(route, False, state)
+        raise
+    record(route, not is_failure(response.status_code), state)
+    return response
@@ -4,6 +4,10 @@ import asyncio
 from django.utils import timezone
 from datetime import datetime, timezone as dt_timezone
 from pilot_data.models import EsiHeaderCache
+from esi_calls.token_cache import get_access_token
+from esi_calls import circuit_breaker
+from esi_calls.http_pool import get_shared_session
+from esi_calls.worker_profile import io_stage
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from django.core.cache import cache # Import Django Cache
@@ -27,7 +31,9 @@ def get_esi_session():
         status_forcelist=[502, 503, 504],
         allowed_methods=frozenset(['GET', 'POST'])
     )
-    session.mount('https://', HTTPAdapter(max_retries=retries))
+    adapter = HTTPAdapter(max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter) # ESI_MOCK_URL
     return session
 
 def _broadcast_ratelimit(user, headers):
@@ -109,6 +115,7 @@ def call_esi(character, endpoint_name, url, method='GET', params=None, body=None
     """
     Smart ESI Caller.
     :param force_refresh: If True, ignores local DB cache and ETags to ensure data is returned.
+    Routes with an open circuit get {'status': 503, 'circuit_open': True} without a request.
     """
     # 1. Check Cache Validity (Unless forced)
     cache_entry = None
@@ -119,9 +126,15 @@ def call_esi(character, endpoint_name, url, method='GET', params=None, body=None
             if timezone.now() < cache_entry.expires:
                 return {'status': 304, 'data': None}
 
-    # 2. Prepare Request
+    # 2. Shared Circuit Breaker (per route, across all workers)
+    route = circuit_breaker.route_key(method, url)
+    breaker_state = circuit_breaker.check(route)
+    if breaker_state == circuit_breaker.OPEN:
+        return {'status': 503, 'error': 'Circuit open', 'circuit_open': True}
+
+    # 3. Prepare Request
     headers = {
-        'Authorization': f'Bearer {character.access_token}',
+        'Authorization': f'Bearer {get_access_token(character)}',
         'User-Agent': 'Waitlist-Project-v1 (contact: admin@example.com)', 
         'Accept': 'application/json'
     }
@@ -130,13 +143,17 @@ def call_esi(character, endpoint_name, url, method='GET', params=None, body=None
     if not force_refresh and cache_entry and cache_entry.etag:
         headers['If-None-Match'] = cache_entry.etag
 
+    response = None
     try:
-        session = get_esi_session()
+        session = get_shared_session()
         
-        if method == 'GET':
-            response = session.get(url, headers=headers, params=params, timeout=10)
-        else:
-            response = session.post(url, headers=headers, json=body, timeout=10)
+        with io_stage():
+            if method == 'GET':
+                response = session.get(url, headers=headers, params=params, timeout=10)
+            else:
+                response = session.post(url, headers=headers, json=body, timeout=10)
+
+        circuit_breaker.record(route, not circuit_breaker.is_failure(response.status_code), breaker_state)
 
         # --- BROADCAST RATE LIMITS ---
         _broadcast_ratelimit(character.user, response.headers)
@@ -146,12 +163,12 @@ def call_esi(character, endpoint_name, url, method='GET', params=None, body=None
         if rem and int(rem) < 20:
             print(f"  !!! WARNING: Rate Limit Low: {rem} !!!")
 
-        # 3. Handle 304 Not Modified
+        # 4. Handle 304 Not Modified
         if response.status_code == 304:
             _update_cache_headers(character, endpoint_name, response.headers, cache_entry)
             return {'status': 304, 'data': None, 'headers': response.headers}
 
-        # 4. Handle 200 OK
+        # 5. Handle 200 OK
         if response.status_code == 200:
             _update_cache_headers(character, endpoint_name, response.headers, cache_entry)
             return {'status': 200, 'data': response.json(), 'headers': response.headers}
@@ -184,6 +201,8 @@ def call_esi(character, endpoint_name, url, method='GET', params=None, body=None
         response.raise_for_status()
 
     except Exception as e:
+        if response is None:
+            circuit_breaker.record(route, False, breaker_state)
         print(f"ESI Network Error ({endpoint_name}): {e}")
         return {'status': 500, 'error': str(e)}
 
@@ -1,26 +1,40 @@
 import email.utils
-import requests
-import time
-from django.core.cache import cache
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from core.tiered_cache import TieredCache
 from pilot_data.models import EveCharacter, ItemType, ItemGroup
 from esi_calls.esi_network import call_esi, get_esi_session
 from esi_calls.token_manager import check_token
+from esi_calls.token_cache import get_access_token
+from esi_calls.structure_sync import plan_structure_sync, StructureSyncExecutor
+from esi_calls.rate_governor import get_governor
+from esi_calls.circuit_breaker import esi_request
 
 # Base ESI URL
-ESI_BASE = "https://esi.evetech.net/latest"
+ESI_BASE = settings.ESI_BASE_URL
 
-def get_fleet_composition(fleet_id, fc_character):
+# fleet_id -> (composition, None); TTL matches the ESI cache window
+FLEET_COMPOSITION = TieredCache('fleet_comp', ttl=5, local_ttl=1)
+
+def get_fleet_composition(fleet_id, fc_character, use_cache=True):
     """
     Fetches raw fleet members AND wing structure.
-    Uses Django Cache to prevent ESI spam when multiple users are dashboarding.
+    Uses the shared two-tier cache to prevent ESI spam when multiple users are dashboarding.
     Cache TTL: 5 seconds (Matches ESI spec).
+    use_cache=False forces a live read (structure sync needs the real current layout).
     """
-    cache_key = f"fleet_comp_{fleet_id}"
-    cached_data = cache.get(cache_key)
-    
-    if cached_data:
-        return cached_data, None
-
+    if not use_cache:
+        return _fetch_fleet_composition(fleet_id, fc_character)
+
+    # Single-flight: concurrent dashboards / processes share one pair of ESI calls.
+    # Errors are returned but never cached.
+    return FLEET_COMPOSITION.get_or_compute(
+        fleet_id,
+        lambda: _fetch_fleet_composition(fleet_id, fc_character),
+        cacheable=lambda result: result[1] is None
+    )
+
+def _fetch_fleet_composition(fleet_id, fc_character):
     # 1. Fetch Members (Force Refresh to get body)
     members_url = f"{ESI_BASE}/fleets/{fleet_id}/members/"
     members_resp = call_esi(fc_character, f'fleet_members_{fleet_id}', members_url, force_refresh=True)
@@ -37,10 +51,6 @@ def get_fleet_composition(fleet_id, fc_character):
         'members': members_resp.get('data', []),
         'wings': wings_resp.get('data', [])
     }
-    
-    # Cache the successful result for 5 seconds
-    cache.set(cache_key, data, timeout=5)
-    
     return data, None
 
 def resolve_unknown_names(char_ids):
@@ -63,7 +73,7 @@ def resolve_unknown_names(char_ids):
     for i in range(0, len(missing_ids), chunk_size):
         chunk = missing_ids[i:i + chunk_size]
         try:
-            resp = requests.post(url, json=chunk, timeout=3)
+            resp = esi_request('POST', url, json=chunk, timeout=3)
             if resp.status_code == 200:
                 for entry in resp.json():
                     if entry['category'] == 'character':
@@ -203,7 +213,7 @@ def invite_to_fleet(fleet_id, fc_character, target_character_id, role='squad_mem
     if not check_token(fc_character): 
         return False, "FC Token Expired"
     
-    headers = {'Authorization': f'Bearer {fc_character.access_token}'}
+    headers = {'Authorization': f'Bearer {get_access_token(fc_character)}'}
     url = f"{ESI_BASE}/fleets/{fleet_id}/members/"
     
     payload = {"character_id": target_character_id, "role": role}
@@ -211,8 +221,7 @@ def invite_to_fleet(fleet_id, fc_character, target_character_id, role='squad_mem
     elif wing_id: payload['wing_id'] = wing_id
     
     try:
-        session = get_esi_session()
-        resp = session.post(url, headers=headers, json=payload, timeout=5)
+        resp = esi_request('POST', url, headers=headers, json=payload, timeout=5)
         
         if resp.status_code == 204:
             return True, "Invite Sent"
@@ -230,12 +239,57 @@ def invite_to_fleet(fleet_id, fc_character, target_character_id, role='squad_mem
     except Exception as e:
         return False, f"Network Error: {str(e)}"
 
+# Parallel invites per bulk request (shares the fleet rate governor with structure sync)
+INVITE_CONCURRENCY = 4
+
+def bulk_invite_to_fleet(fleet_id, fc_character, invites):
+    """
+    Sends many invites concurrently under the fleet rate governor.
+    :param invites: list of dicts {'character_id', 'role'?, 'squad_id'?, 'wing_id'?}
+    :return: {character_id: (success, message)}
+    Throttles (420/429) and 5xx responses are retried by the governor.
+    """
+    if not invites: return {}
+    if not check_token(fc_character):
+        return {inv['character_id']: (False, "FC Token Expired") for inv in invites}
+
+    url = f"{ESI_BASE}/fleets/{fleet_id}/members/"
+    headers = {'Authorization': f'Bearer {get_access_token(fc_character)}'}
+    governor = get_governor('fleet')
+    session = get_esi_session()
+
+    def send(invite):
+        payload = {"character_id": invite['character_id'], "role": invite.get('role', 'squad_member')}
+        if invite.get('squad_id'): payload['squad_id'] = invite['squad_id']
+        elif invite.get('wing_id'): payload['wing_id'] = invite['wing_id']
+        try:
+            resp = governor.request(session, 'POST', url, headers=headers, json=payload, timeout=5)
+        except Exception as e:
+            return False, f"Network Error: {str(e)}"
+        if resp.status_code == 204:
+            return True, "Invite Sent"
+        error_msg = f"ESI {resp.status_code}"
+        try:
+            data = resp.json()
+            if 'error' in data: error_msg = data['error']
+        except Exception:
+            pass
+        return False, error_msg
+
+    try:
+        with ThreadPoolExecutor(max_workers=INVITE_CONCURRENCY) as pool:
+            outcomes = list(pool.map(send, invites))
+    finally:
+        session.close()
+
+    return {inv['character_id']: outcome for inv, outcome in zip(invites, outcomes)}
+
 def update_fleet_settings(fleet_id, fc_character, motd=None, is_free_move=None):
     if not check_token(fc_character):
         return False, "FC Token Expired"
 
     url = f"{ESI_BASE}/fleets/{fleet_id}/"
-    headers = {'Authorization': f'Bearer {fc_character.access_token}'}
+    headers = {'Authorization': f'Bearer {get_access_token(fc_character)}'}
     
     payload = {}
     if motd is not None: payload['motd'] = motd
@@ -244,8 +298,7 @@ def update_fleet_settings(fleet_id, fc_character, motd=None, is_free_move=None):
     if not payload: return True, "No changes"
 
     try:
-        session = get_esi_session()
-        resp = session.put(url, headers=headers, json=payload, timeout=5)
+        resp = esi_request('PUT', url, headers=headers, json=payload, timeout=5)
         if resp.status_code == 204: return True, "Settings Updated"
         error_msg = f"ESI {resp.status_code}"
         try:
@@ -257,149 +310,30 @@ def update_fleet_settings(fleet_id, fc_character, motd=None, is_free_move=None):
 
 # --- FLEET STRUCTURE MANAGEMENT (Full Sync) ---
 
-def sync_fleet_structure(fleet_id, fc_character, desired_structure):
+def sync_fleet_structure(fleet_id, fc_character, desired_structure, on_progress=None):
     """
     Synchronizes in-game structure to match desired structure exactly (Create/Rename/Delete).
+    Plans the full diff first, then runs it concurrently under the fleet rate governor.
+    Safe to re-run: a second pass only applies whatever is still different.
+    Most callers should queue waitlist_data.tasks.sync_fleet_structure_task instead of blocking.
     """
     if not check_token(fc_character):
         return False, "FC Token Expired"
 
-    # 1. Fetch Current State
-    current_data, error = get_fleet_composition(fleet_id, fc_character)
+    # 1. Fetch Current State (live, the 5s dashboard cache may predate our last run)
+    current_data, error = get_fleet_composition(fleet_id, fc_character, use_cache=False)
     if error: return False, error
-    
-    current_wings = current_data.get('wings', [])
-    # Sort by ID to ensure stable mapping
-    current_wings.sort(key=lambda x: x['id'])
-    
-    logs = []
-    
-    # 2. DELETE Extra Wings (Prune from end)
-    while len(current_wings) > len(desired_structure):
-        last_wing = current_wings.pop()
-        time.sleep(0.5)
-        if _delete_wing(fc_character, fleet_id, last_wing['id']):
-            logs.append(f"Deleted Wing {last_wing['name']}")
-    
-    # 3. Process remaining desired wings
-    for i, desired_wing in enumerate(desired_structure):
-        wing_id = None
-        
-        # A. Get or Create Wing
-        if i < len(current_wings):
-            # Existing
-            wing_data = current_wings[i]
-            wing_id = wing_data['id']
-            if wing_data['name'] != desired_wing['name']:
-                time.sleep(0.5)
-                if _rename_entity(fc_character, fleet_id, 'wings', wing_id, desired_wing['name']):
-                    logs.append(f"Renamed Wing {wing_id} -> {desired_wing['name']}")
-        else:
-            # New
-            time.sleep(0.5)
-            wing_id = _create_wing(fc_character, fleet_id)
-            if wing_id:
-                time.sleep(0.5)
-                _rename_entity(fc_character, fleet_id, 'wings', wing_id, desired_wing['name'])
-                logs.append(f"Created Wing {desired_wing['name']}")
-                current_wings.append({'id': wing_id, 'squads': []}) # Update local model
-            else:
-                logs.append(f"Failed to create wing {desired_wing['name']}")
-                continue
-
-        # B. Sync Squads
-        if wing_id:
-            # Determine current squads for this wing
-            # If it was existing, use fetched data. If new, it's empty.
-            current_squads = []
-            if i < len(current_wings):
-                # NOTE: current_wings[i] here refers to the snapshot we fetched/updated
-                current_squads = current_wings[i].get('squads', [])
-                current_squads.sort(key=lambda x: x['id'])
-
-            desired_squads = desired_wing.get('squads', [])
-
-            # DELETE Extra Squads
-            while len(current_squads) > len(desired_squads):
-                last_squad = current_squads.pop()
-                time.sleep(0.5)
-                if _delete_squad(fc_character, fleet_id, last_squad['id']):
-                    logs.append(f"Deleted Squad {last_squad['name']}")
-
-            # CREATE / RENAME Squads
-            for j, desired_squad_name in enumerate(desired_squads):
-                squad_id = None
-                
-                if j < len(current_squads):
-                    # Existing
-                    squad_data = current_squads[j]
-                    squad_id = squad_data['id']
-                    if squad_data['name'] != desired_squad_name:
-                        time.sleep(0.5)
-                        _rename_entity(fc_character, fleet_id, 'squads', squad_id, desired_squad_name, wing_id=wing_id)
-                else:
-                    # New
-                    time.sleep(0.5)
-                    squad_id = _create_squad(fc_character, fleet_id, wing_id)
-                    if squad_id:
-                        time.sleep(0.5)
-                        _rename_entity(fc_character, fleet_id, 'squads', squad_id, desired_squad_name, wing_id=wing_id)
-    
-    return True, logs
 
-def _create_wing(character, fleet_id):
-    url = f"{ESI_BASE}/fleets/{fleet_id}/wings/"
-    headers = {'Authorization': f'Bearer {character.access_token}'}
-    try:
-        session = get_esi_session()
-        resp = session.post(url, headers=headers)
-        if resp.status_code == 201: return resp.json()['wing_id']
-    except: pass
-    return None
-
-def _create_squad(character, fleet_id, wing_id):
-    url = f"{ESI_BASE}/fleets/{fleet_id}/wings/{wing_id}/squads/"
-    headers = {'Authorization': f'Bearer {character.access_token}'}
-    try:
-        session = get_esi_session()
-        resp = session.post(url, headers=headers)
-        if resp.status_code == 201: return resp.json()['squad_id']
-    except: pass
-    return None
-
-def _delete_wing(character, fleet_id, wing_id):
-    url = f"{ESI_BASE}/fleets/{fleet_id}/wings/{wing_id}/"
-    headers = {'Authorization': f'Bearer {character.access_token}'}
-    try:
-        session = get_esi_session()
-        resp = session.delete(url, headers=headers)
-        return resp.status_code == 204
-    except: return False
-
-def _delete_squad(character, fleet_id, squad_id):
-    # Squad delete URL is flat: /fleets/{fleet_id}/squads/{squad_id}/
-    url = f"{ESI_BASE}/fleets/{fleet_id}/squads/{squad_id}/"
-    headers = {'Authorization': f'Bearer {character.access_token}'}
-    try:
-        session = get_esi_session()
-        resp = session.delete(url, headers=headers)
-        return resp.status_code == 204
-    except: return False
-
-def _rename_entity(character, fleet_id, entity_type, entity_id, new_name, wing_id=None):
-    url = ""
-    if entity_type == 'wings':
-        url = f"{ESI_BASE}/fleets/{fleet_id}/wings/{entity_id}/"
-    elif entity_type == 'squads':
-        url = f"{ESI_BASE}/fleets/{fleet_id}/squads/{entity_id}/"
-    
-    headers = {'Authorization': f'Bearer {character.access_token}'}
-    payload = {'name': new_name}
-    
-    try:
-        session = get_esi_session()
-        resp = session.put(url, headers=headers, json=payload)
-        return resp.status_code in [200, 204]
-    except Exception as e:
-        print(f"Error renaming entity: {e}")
-        return False
\ No newline at end of file
+    # 2. Plan + Execute
+    waves = plan_structure_sync(current_data.get('wings', []), desired_structure)
+    if not waves: return True, []
+
+    executor = StructureSyncExecutor(fleet_id, fc_character, on_progress=on_progress)
+    success = executor.run(waves)
+
+    # Structure changed, drop the cached composition
+    FLEET_COMPOSITION.delete(fleet_id)
+
+    if not success:
+        return False, executor.logs + [f"Failed: {msg}" for msg in executor.failures]
+    return True, executor.logs
@@ -0,0 +1,53 @@
+import os
+import threading
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# One pooled requests.Session per process. get_esi_session() builds a fresh session (and a
+# fresh TLS handshake) per call; under the gevent worker hundreds of greenlets would each
+# open their own sockets. The shared session keeps up to ESI_HTTP_POOL_SIZE keep-alive
+# connections to ESI and blocks callers beyond that instead of opening more.
+
+_session = None
+_lock = threading.Lock()
+
+def _build_session():
+    size = getattr(settings, 'ESI_HTTP_POOL_SIZE', 20)
+    session = requests.Session()
+    retries = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504],
+        allowed_methods=frozenset(['GET', 'POST'])
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=size, pool_block=True, max_retries=retries)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def get_shared_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+def close_shared_session():
+    global _session
+    with _lock:
+        session, _session = _session, None
+    if session is not None:
+        try: session.close()
+        except Exception: pass
+
+def _reset_after_fork():
+    # Prefork children must not share the parent's sockets
+    global _session, _lock
+    _session = None
+    _lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
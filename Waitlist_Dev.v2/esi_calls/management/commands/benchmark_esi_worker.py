@@ -0,0 +1,253 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import timedelta
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+
+from pilot_data.models import EveCharacter, CharacterSkill, CharacterQueue, CharacterImplant
+from esi_calls.esi_network import call_esi
+from esi_calls.mock_esi import MockEsiServer
+from esi_calls.worker_profile import db_stage, is_green
+
+BENCH_USERNAME = 'sim_user_esi_bench'
+BENCH_CHAR_BASE = 95000000
+
+# endpoint_name -> path under /characters/<id>/
+BENCH_ENDPOINTS = [
+    ('skills', 'skills'),
+    ('queue', 'skillqueue'),
+    ('implants', 'implants'),
+]
+
+def _refresh_one(char_id, base_url):
+    """
+    One benchmark task, shaped like a character refresh: three ESI GETs, then the DB writes.
+    Returns (seconds, ok).
+    """
+    start = time.perf_counter()
+    ok = True
+    try:
+        with db_stage():
+            char = EveCharacter.objects.select_related('user').get(character_id=char_id)
+            results = {}
+            for endpoint_name, path in BENCH_ENDPOINTS:
+                resp = call_esi(char, endpoint_name, f"{base_url}/characters/{char_id}/{path}/", force_refresh=True)
+                if resp['status'] != 200:
+                    ok = False
+                    continue
+                results[endpoint_name] = resp['data']
+
+            with transaction.atomic():
+                if 'skills' in results:
+                    CharacterSkill.objects.filter(character=char).delete()
+                    CharacterSkill.objects.bulk_create([
+                        CharacterSkill(
+                            character=char, skill_id=s['skill_id'],
+                            active_skill_level=s['active_skill_level'], skillpoints_in_skill=s['skillpoints_in_skill']
+                        ) for s in results['skills'].get('skills', [])
+                    ])
+                if 'queue' in results:
+                    CharacterQueue.objects.filter(character=char).delete()
+                    CharacterQueue.objects.bulk_create([
+                        CharacterQueue(
+                            character=char, skill_id=q['skill_id'],
+                            finished_level=q['finished_level'], queue_position=q['queue_position'],
+                            finish_date=q.get('finish_date')
+                        ) for q in results['queue']
+                    ])
+                if 'implants' in results:
+                    CharacterImplant.objects.filter(character=char).delete()
+                    CharacterImplant.objects.bulk_create([CharacterImplant(character=char, type_id=t) for t in results['implants']])
+    except Exception as e:
+        print(f"[Bench] Task {char_id} failed: {e}", file=sys.stderr)
+        ok = False
+    finally:
+        if not is_green():
+            connections.close_all()
+    return time.perf_counter() - start, ok
+
+def _refresh_one_args(args):
+    return _refresh_one(*args)
+
+class Command(BaseCommand):
+    help = 'Benchmarks character refresh throughput (tasks/sec) against a local mock ESI: prefork vs. gevent worker profile.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=300, help='Refresh tasks per run (Default: 300)')
+        parser.add_argument('--processes', type=int, default=8, help='Prefork pool size (Default: 8)')
+        parser.add_argument('--greenlets', type=int, default=200, help='Gevent pool size (Default: 200)')
+        parser.add_argument('--latency', type=int, default=150, help='Mock ESI latency per request in ms (Default: 150)')
+        parser.add_argument('--pools', type=str, default='prefork,gevent', help='Comma-separated pools to run (Default: prefork,gevent)')
+        parser.add_argument('--esi-url', type=str, default='', help='ESI base of an already running mock (e.g. http://127.0.0.1:8089/latest) instead of starting one')
+        parser.add_argument('--json', type=str, default='', help='Also write the results to this file')
+        # Internal: run a single pool in this process and print the result as JSON
+        parser.add_argument('--worker', type=str, default='', help='(internal)')
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            return self.run_worker(options)
+
+        tasks = options['tasks']
+        pools = [p.strip() for p in options['pools'].split(',') if p.strip()]
+
+        server = None
+        base_url = options['esi_url'].rstrip('/')
+        if not base_url:
+            server = MockEsiServer(latency=options['latency'] / 1000, ratelimit_limit=0).start()
+            base_url = server.esi_url
+
+        self.stdout.write(self.style.HTTP_INFO(
+            f"ESI worker benchmark: {tasks} tasks x {len(BENCH_ENDPOINTS)} ESI calls, mock ESI at {base_url} ({options['latency']}ms)"
+        ))
+        if connections['default'].vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING("SQLite serializes writers: expect 'database is locked' errors. Run against MySQL for real numbers."))
+        self.setup_characters(tasks)
+
+        results = []
+        try:
+            for pool in pools:
+                if pool == 'gevent' and not self._gevent_available():
+                    self.stdout.write(self.style.WARNING("gevent is not installed, skipping the gevent run."))
+                    continue
+                self.stdout.write(f"  Running {pool}...")
+                result = self.spawn_worker(pool, base_url, options)
+                if result:
+                    results.append(result)
+        finally:
+            self.cleanup()
+            if server:
+                server.stop()
+
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['json']}")
+
+        failed = [r['pool'] for r in results if not r['valid']]
+        if failed:
+            raise CommandError(f"Every task failed in: {', '.join(failed)} (see the errors above). No throughput to report.")
+
+    def setup_characters(self, count):
+        self.cleanup()
+        user = User.objects.create(username=BENCH_USERNAME)
+        expires = timezone.now() + timedelta(days=1)
+        EveCharacter.objects.bulk_create([
+            EveCharacter(
+                user=user,
+                character_id=BENCH_CHAR_BASE + i,
+                character_name=f"Sim Bench {i}",
+                corporation_name="Simulation Corp",
+                access_token='bench',
+                token_expires=expires
+            )
+            for i in range(count)
+        ])
+
+    def cleanup(self):
+        User.objects.filter(username=BENCH_USERNAME).delete()
+
+    def _gevent_available(self):
+        try:
+            import gevent # noqa: F401
+            return True
+        except ImportError:
+            return False
+
+    def spawn_worker(self, pool, base_url, options):
+        # Each pool runs in a fresh interpreter so gevent can patch before Django loads
+        env = dict(os.environ)
+        env.pop('ESI_WORKER_POOL', None)
+        if pool == 'gevent':
+            env['ESI_WORKER_POOL'] = 'gevent'
+
+        cmd = [
+            sys.executable, str(settings.BASE_DIR / 'manage.py'), 'benchmark_esi_worker',
+            '--worker', pool, '--esi-url', base_url,
+            '--tasks', str(options['tasks']),
+            '--processes', str(options['processes']),
+            '--greenlets', str(options['greenlets']),
+        ]
+        proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            self.stdout.write(self.style.ERROR(f"  {pool} run failed:\n{proc.stderr[-2000:]}"))
+            return None
+        return json.loads(lines[-1])
+
+    def run_worker(self, options):
+        pool = options['worker']
+        base_url = options['esi_url']
+
+        # SQLite (USE_SQLITE dev setups) allows one writer at a time: wait for the lock instead of erroring.
+        # Numbers are only meaningful on MySQL.
+        db = connections['default']
+        if db.vendor == 'sqlite':
+            db.settings_dict.setdefault('OPTIONS', {})['timeout'] = 60
+        ids = list(
+            EveCharacter.objects.filter(user__username=BENCH_USERNAME)
+            .order_by('character_id').values_list('character_id', flat=True)[:options['tasks']]
+        )
+
+        if pool == 'gevent':
+            if not is_green():
+                raise RuntimeError("gevent run requires ESI_WORKER_POOL=gevent")
+            from gevent.pool import Pool
+            concurrency = options['greenlets']
+            start = time.perf_counter()
+            timings = Pool(concurrency).map(lambda cid: _refresh_one(cid, base_url), ids)
+        else:
+            concurrency = options['processes']
+            connections.close_all() # children open their own
+            start = time.perf_counter()
+            with get_context('fork').Pool(concurrency) as workers:
+                timings = workers.map(_refresh_one_args, [(cid, base_url) for cid in ids])
+        elapsed = time.perf_counter() - start
+
+        durations = sorted(t for t, _ in timings)
+        errors = sum(1 for _, ok in timings if not ok)
+        result = {
+            'pool': pool,
+            # A run where nothing succeeded only measured how fast tasks fail
+            'valid': errors < len(ids),
+            'concurrency': concurrency,
+            'db_connections': settings.ESI_DB_CONCURRENCY if pool == 'gevent' else concurrency,
+            'tasks': len(ids),
+            'errors': errors,
+            'elapsed_s': round(elapsed, 3),
+            'tasks_per_sec': round(len(ids) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(statistics.median(durations) * 1000, 1) if durations else 0,
+            'p95_ms': round(durations[int(len(durations) * 0.95) - 1] * 1000, 1) if durations else 0,
+        }
+        self.stdout.write(json.dumps(result))
+
+    def report(self, results):
+        if not results:
+            self.stdout.write(self.style.WARNING("No results."))
+            return
+        self.stdout.write("")
+        self.stdout.write(f"{'Pool':<9} {'Conc.':>6} {'DB conns':>9} {'Tasks':>6} {'Errors':>7} {'Seconds':>8} {'Tasks/s':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for r in results:
+            if not r['valid']:
+                self.stdout.write(self.style.ERROR(
+                    f"{r['pool']:<9} {r['concurrency']:>6} {r['db_connections']:>9} {r['tasks']:>6} {r['errors']:>7}   all tasks failed"
+                ))
+                continue
+            line = (
+                f"{r['pool']:<9} {r['concurrency']:>6} {r['db_connections']:>9} {r['tasks']:>6} {r['errors']:>7} "
+                f"{r['elapsed_s']:>8} {r['tasks_per_sec']:>8} {r['p50_ms']:>8} {r['p95_ms']:>8}"
+            )
+            self.stdout.write(self.style.WARNING(line) if r['errors'] else line)
+        base = next((r for r in results if r['pool'] == 'prefork' and r['valid']), None)
+        for r in results:
+            if base and r is not base and r['valid'] and base['tasks_per_sec']:
+                self.stdout.write(self.style.SUCCESS(f"{r['pool']}: {r['tasks_per_sec'] / base['tasks_per_sec']:.1f}x prefork throughput"))
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand
+from esi_calls.mock_esi import MockEsiServer, MockEsiConfig
+
+class Command(BaseCommand):
+    help = 'Runs a local mock ESI / SSO server for load tests (see esi_calls/mock_esi.py).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', type=str, default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8089)
+        parser.add_argument('--latency', type=int, default=80, help='Mean response time in ms (Default: 80)')
+        parser.add_argument('--jitter', type=float, default=0.5, help='Latency spread, +/- fraction (Default: 0.5)')
+        parser.add_argument('--tail-rate', type=float, default=0.02, help='Share of requests 5x slower (Default: 0.02)')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with a 5xx (Default: 0)')
+        parser.add_argument('--no-304', action='store_true', help='Ignore If-None-Match, always send the body')
+        parser.add_argument('--fleet-size', type=int, default=50, help='Members per synthetic fleet, 0 = nobody in fleet (Default: 50)')
+        parser.add_argument('--fleet-churn', type=float, default=0.05, help='Share of fleet members changing per minute (Default: 0.05)')
+        parser.add_argument('--online-ratio', type=float, default=0.3, help='Share of pilots reported online (Default: 0.3)')
+        parser.add_argument('--wallet-pages', type=int, default=3, help='X-Pages of the corp wallet journal (Default: 3)')
+        parser.add_argument('--ratelimit', type=int, default=600, help='Tokens per group and 15 min window, 0 = off (Default: 600)')
+        parser.add_argument('--error-limit', type=int, default=100, help='ESI error budget per minute (Default: 100)')
+        parser.add_argument('--token-lifetime', type=int, default=1199, help='SSO access token expires_in (Default: 1199)')
+        parser.add_argument('--fixtures', type=str, default='', help='Fixture directory to replay from (or record into with --record)')
+        parser.add_argument('--record', type=str, default='', help='Upstream ESI to proxy and record, e.g. https://esi.evetech.net')
+        parser.add_argument('--sso-upstream', type=str, default='', help='Forward SSO to e.g. https://login.eveonline.com instead of mocking it')
+
+    def handle(self, *args, **options):
+        if options['record'] and not options['fixtures']:
+            self.stdout.write(self.style.ERROR("--record needs --fixtures <dir> to write into."))
+            return
+
+        config = MockEsiConfig(
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'],
+            tail_rate=options['tail_rate'],
+            error_rate=options['error_rate'],
+            etags=not options['no_304'],
+            fleet_size=options['fleet_size'],
+            fleet_churn=options['fleet_churn'],
+            online_ratio=options['online_ratio'],
+            wallet_pages=options['wallet_pages'],
+            ratelimit_limit=options['ratelimit'],
+            error_limit=options['error_limit'],
+            token_lifetime=options['token_lifetime'],
+            fixtures_dir=options['fixtures'] or None,
+            record_upstream=options['record'] or None,
+            sso_upstream=options['sso_upstream'] or None,
+        )
+        server = MockEsiServer(host=options['host'], port=options['port'], config=config)
+
+        mode = 'synthetic'
+        if config.record_upstream:
+            mode = f"recording {config.record_upstream} -> {config.fixtures_dir}"
+        elif config.fixtures_dir:
+            mode = f"replaying {config.fixtures_dir} (synthetic fallback)"
+
+        self.stdout.write(self.style.SUCCESS(f"Mock ESI listening on {server.base_url} ({mode})"))
+        self.stdout.write(f"  latency {options['latency']}ms, error rate {config.error_rate:.1%}, fleet size {config.fleet_size}")
+        self.stdout.write(f"  Stats: {server.base_url}/_mock/stats")
+        self.stdout.write("  Point the app at it:")
+        self.stdout.write(f"    ESI_MOCK_URL={server.base_url} EVE_CLIENT_ID=mock EVE_SECRET_KEY=mock")
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping mock ESI.")
+        finally:
+            server.httpd.server_close()
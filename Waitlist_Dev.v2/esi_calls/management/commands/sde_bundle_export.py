@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from esi_calls.sde_bundle import export_bundle
+
+class Command(BaseCommand):
+    help = 'Exports the imported SDE tables to an offline bundle directory (for network-free sde_bundle_import).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Bundle directory (created if missing)')
+        parser.add_argument(
+            '--published-only',
+            action='store_true',
+            help='Only published groups and the published types inside them (Attribute Definitions are always kept)',
+        )
+
+    def handle(self, *args, **options):
+        manifest = export_bundle(options['path'], published_only=options['published_only'], log=self.stdout.write)
+        total = sum(t['rows'] for t in manifest['tables'].values())
+        self.stdout.write(self.style.SUCCESS(
+            f"Bundle written to {options['path']}: {total} rows from SDE version {manifest['sde_version']}."
+        ))
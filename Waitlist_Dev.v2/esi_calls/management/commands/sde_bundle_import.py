@@ -0,0 +1,44 @@
+import os
+from django.core.management.base import BaseCommand
+from esi_calls.sde_loader import SdeLoader
+from esi_calls.sde_bundle import BundleSource, MANIFEST
+
+class Command(BaseCommand):
+    help = 'Imports the SDE from an offline bundle directory written by sde_bundle_export.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Bundle directory')
+        parser.add_argument(
+            '--clean',
+            action='store_true',
+            help='Remove items, attributes and effects that are not in the bundle (Groups and Definitions are kept to protect Rules)',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Diff every table, even if its checksum matches the last import',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(os.path.join(path, MANIFEST)):
+            self.stdout.write(self.style.ERROR(f'No SDE bundle found at: {path}'))
+            return
+
+        source = BundleSource(path)
+        self.stdout.write(self.style.SUCCESS(f"Importing SDE bundle {path} (exported {source.bundle.manifest['created_at']})..."))
+
+        loader = SdeLoader(force=options['force'], prune=options['clean'], log=self.stdout.write)
+        summary, version = loader.run(source)
+
+        for table, stats in summary.items():
+            if stats.get('error'):
+                self.stdout.write(self.style.ERROR(f"{table}: {stats['error']}"))
+            elif stats.get('skipped'):
+                self.stdout.write(f"{table}: unchanged")
+            else:
+                self.stdout.write(
+                    f"{table}: {stats['rows']} rows, {stats['changed']} inserted/updated, {stats['pruned']} removed"
+                )
+
+        self.stdout.write(self.style.SUCCESS(f'SDE Bundle Import Complete. SDE version {version}.'))
@@ -0,0 +1,784 @@
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, urlencode
+
+import requests
+
+from esi_calls.circuit_breaker import route_key
+
+# --- LOCAL MOCK ESI / SSO ---
+# Threaded HTTP server that stands in for esi.evetech.net and login.eveonline.com, so the
+# dispatcher, Celery workers and the fleet poller can be load-tested on one machine.
+#   python manage.py run_mock_esi --port 8089 --fleet-size 250
+#   ESI_MOCK_URL=http://127.0.0.1:8089 EVE_CLIENT_ID=mock EVE_SECRET_KEY=mock <runserver / celery ...>
+#
+# Answers look like ESI's: ETag / Expires / Last-Modified per route, 304 on a matching
+# If-None-Match, X-Pages on the wallet journal, X-Ratelimit-* buckets per token and group,
+# and the X-Esi-Error-Limit-* budget (420 once it is spent). Latency, injected 5xx rate,
+# synthetic fleet size and churn are configurable. Character data is generated from the
+# character_id, so every run sees the same pilots.
+#
+# Fixtures: with `record_upstream` set, requests are forwarded to real ESI and every 200 is
+# saved to `fixtures_dir`; with only `fixtures_dir` set, saved responses are replayed
+# (exact path first, then the route template) and anything missing falls back to synthetic data.
+
+DATE_FORMAT = '%a, %d %b %Y %H:%M:%S GMT'
+
+# Cache window per route template (seconds), as ESI publishes them
+CACHE_SECONDS = {
+    'GET /status/': 30,
+    'GET /characters/{id}/': 86400,
+    'GET /characters/{id}/online/': 60,
+    'GET /characters/{id}/skills/': 120,
+    'GET /characters/{id}/skillqueue/': 120,
+    'GET /characters/{id}/ship/': 5,
+    'GET /characters/{id}/wallet/': 120,
+    'GET /characters/{id}/loyalty/points/': 3600,
+    'GET /characters/{id}/implants/': 120,
+    'GET /characters/{id}/corporationhistory/': 86400,
+    'GET /characters/{id}/fleet/': 60,
+    'GET /fleets/{id}/': 5,
+    'GET /fleets/{id}/members/': 5,
+    'GET /fleets/{id}/wings/': 5,
+    'GET /corporations/{id}/wallets/{id}/journal/': 3600,
+}
+DEFAULT_CACHE_SECONDS = 60
+
+# Rate-limit group per top-level resource
+RATELIMIT_GROUPS = {
+    'characters': 'char-detail',
+    'fleets': 'fleet',
+    'corporations': 'corp-wallet',
+    'universe': 'universe',
+    'status': 'status',
+}
+
+# 5xx mix for injected failures (504s also take `timeout_factor` x the latency)
+ERROR_STATUSES = [500, 502, 502, 503, 504, 504]
+
+# Ships the synthetic fleet members fly (Incursion doctrine hulls + logi + links)
+FLEET_SHIPS = [17740, 17736, 17738, 28659, 28661, 11987, 11985, 22474, 29990]
+SOLAR_SYSTEM_ID = 30000142
+
+FLEET_ID_BASE = 1_000_000_000_000
+STRUCTURE_ID_BASE = 2_000_000_000_000
+GUEST_ID_BASE = 2_120_000_000
+JOURNAL_ID_BASE = 20_000_000_000
+JOURNAL_PAGE_SIZE = 2500
+
+class MockEsiConfig:
+    """
+    Knobs for one mock server. Times in seconds, rates as 0-1 fractions.
+    """
+    def __init__(self, latency=0.08, jitter=0.5, tail_rate=0.02, timeout_factor=10,
+                 error_rate=0.0, etags=True, fleet_size=50, fleet_churn=0.05,
+                 online_ratio=0.3, wallet_pages=3, wallet_rate=0.1,
+                 ratelimit_limit=600, ratelimit_window=900, error_limit=100, error_limit_window=60,
+                 token_lifetime=1199, fixtures_dir=None, record_upstream=None, sso_upstream=None):
+        self.latency = latency
+        self.jitter = jitter               # +/- fraction around latency
+        self.tail_rate = tail_rate         # share of requests 5x slower (ESI's long tail)
+        self.timeout_factor = timeout_factor
+        self.error_rate = error_rate
+        self.etags = etags                 # False: never answer 304
+        self.fleet_size = fleet_size       # 0: nobody is in a fleet
+        self.fleet_churn = fleet_churn     # share of members leaving/joining per minute
+        self.online_ratio = online_ratio
+        self.wallet_pages = wallet_pages
+        self.wallet_rate = wallet_rate     # new journal entries per second
+        self.ratelimit_limit = ratelimit_limit # 0: no X-Ratelimit-* buckets
+        self.ratelimit_window = ratelimit_window
+        self.error_limit = error_limit
+        self.error_limit_window = error_limit_window
+        self.token_lifetime = token_lifetime
+        self.fixtures_dir = fixtures_dir
+        self.record_upstream = record_upstream.rstrip('/') if record_upstream else None
+        self.sso_upstream = sso_upstream.rstrip('/') if sso_upstream else None
+
+# --- SYNTHETIC DATA ---
+
+def _rnd(*seed):
+    # crc32 rather than hash(): str hashes are salted per process, the data must not be
+    return random.Random(zlib.crc32(repr(seed).encode()))
+
+def _iso(dt):
+    return dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def _day_bucket(seconds=86400):
+    return int(time.time() // seconds)
+
+def _name_category(entity_id):
+    if 1_000_000 <= entity_id < 2_000_000 or 98_000_000 <= entity_id < 99_000_000:
+        return 'corporation'
+    if 99_000_000 <= entity_id < 100_000_000:
+        return 'alliance'
+    return 'character'
+
+def _corporation_for(char_id):
+    return 98_000_000 + char_id % 500
+
+def _public_info(char_id):
+    rnd = _rnd('public', char_id)
+    corp_id = _corporation_for(char_id)
+    info = {
+        'name': f"Mock Pilot {char_id}",
+        'corporation_id': corp_id,
+        'birthday': _iso(datetime(2010, 1, 1, tzinfo=dt_timezone.utc) + timedelta(days=rnd.randint(0, 5000))),
+        'gender': rnd.choice(['male', 'female']),
+        'race_id': rnd.randint(1, 8),
+        'bloodline_id': rnd.randint(1, 14),
+        'security_status': round(rnd.uniform(-2, 5), 2),
+    }
+    if corp_id % 3:
+        info['alliance_id'] = 99_000_000 + corp_id % 40
+    return info
+
+def _online(char_id, config):
+    # Flips every 10 minutes per pilot, about online_ratio of them online at once
+    bucket = _day_bucket(600)
+    rnd = _rnd('online', char_id, bucket)
+    online = rnd.random() < config.online_ratio
+    last_login = datetime.fromtimestamp(bucket * 600, dt_timezone.utc) - timedelta(minutes=rnd.randint(1, 600))
+    return {'online': online, 'last_login': _iso(last_login), 'logins': rnd.randint(10, 5000)}
+
+def _skills(char_id):
+    rnd = _rnd('skills', char_id, _day_bucket())
+    skills = [
+        {'skill_id': 3300 + i, 'active_skill_level': level, 'trained_skill_level': level,
+         'skillpoints_in_skill': 256000 * level // 5 + rnd.randint(0, 1000)}
+        for i, level in ((i, rnd.randint(1, 5)) for i in range(rnd.randint(150, 300)))
+    ]
+    return {'skills': skills, 'total_sp': sum(s['skillpoints_in_skill'] for s in skills), 'unallocated_sp': rnd.randint(0, 50000)}
+
+def _skillqueue(char_id):
+    rnd = _rnd('queue', char_id, _day_bucket())
+    now = datetime.now(dt_timezone.utc)
+    finish = now.replace(minute=0, second=0, microsecond=0)
+    queue = []
+    for position in range(rnd.randint(0, 8)):
+        start = finish
+        finish = start + timedelta(minutes=rnd.randint(30, 3000))
+        queue.append({
+            'skill_id': 3400 + rnd.randint(0, 300), 'finished_level': rnd.randint(1, 5), 'queue_position': position,
+            'start_date': _iso(start), 'finish_date': _iso(finish),
+            'level_start_sp': 0, 'level_end_sp': 256000, 'training_start_sp': 0,
+        })
+    return queue
+
+def _ship(char_id):
+    rnd = _rnd('ship', char_id, _day_bucket(600))
+    return {'ship_item_id': 1_000_000_000_000 + char_id, 'ship_name': f"{char_id}'s ship", 'ship_type_id': rnd.choice(FLEET_SHIPS)}
+
+def _wallet(char_id):
+    return round(_rnd('wallet', char_id, _day_bucket(3600)).uniform(1e6, 5e10), 2)
+
+def _loyalty(char_id):
+    rnd = _rnd('lp', char_id, _day_bucket())
+    return [
+        {'corporation_id': 1000125, 'loyalty_points': rnd.randint(0, 5_000_000)},
+        {'corporation_id': 1000035, 'loyalty_points': rnd.randint(0, 100_000)},
+    ]
+
+def _implants(char_id):
+    rnd = _rnd('implants', char_id, _day_bucket())
+    return sorted(rnd.sample(range(9899, 9999), rnd.randint(0, 10)))
+
+def _corporation_history(char_id):
+    rnd = _rnd('history', char_id)
+    start = datetime(2012, 1, 1, tzinfo=dt_timezone.utc)
+    history = []
+    for record_id in range(rnd.randint(1, 8)):
+        start += timedelta(days=rnd.randint(30, 600))
+        history.append({'corporation_id': 1_000_000 + rnd.randint(0, 300), 'record_id': record_id, 'start_date': _iso(start)})
+    history[-1]['corporation_id'] = _corporation_for(char_id)
+    return list(reversed(history))
+
+class _Fleet:
+    """
+    One synthetic fleet: boss + fleet_size - 1 members spread over 2 wings x 3 squads.
+    """
+    def __init__(self, fleet_id, boss_id, size, id_counter):
+        self.fleet_id = fleet_id
+        self.boss_id = boss_id
+        self.motd = ''
+        self.is_free_move = False
+        self._ids = id_counter
+        self._rnd = random.Random(fleet_id)
+        self._churn_debt = 0.0
+        self._churned_at = time.monotonic()
+        self.wings = []
+        for w in range(2):
+            self.wings.append({
+                'id': next(self._ids), 'name': f"Wing {w + 1}",
+                'squads': [{'id': next(self._ids), 'name': f"Squad {s + 1}"} for s in range(3)]
+            })
+        self.members = {}
+        self._guests = itertools.count(GUEST_ID_BASE + (fleet_id % 10_000) * 10_000)
+        self.add_member(boss_id, 'fleet_commander', -1, -1)
+        for _ in range(max(0, size - 1)):
+            self.add_guest()
+
+    def squads(self):
+        return [(w['id'], s['id']) for w in self.wings for s in w['squads']]
+
+    def add_member(self, char_id, role='squad_member', wing_id=None, squad_id=None):
+        if wing_id is None or squad_id is None:
+            slots = self.squads()
+            wing_id, squad_id = self._rnd.choice(slots) if slots else (-1, -1)
+        self.members[char_id] = {
+            'character_id': char_id,
+            'join_time': _iso(datetime.now(dt_timezone.utc)),
+            'role': role,
+            'role_name': role.replace('_', ' ').title(),
+            'ship_type_id': self._rnd.choice(FLEET_SHIPS),
+            'solar_system_id': SOLAR_SYSTEM_ID,
+            'squad_id': squad_id,
+            'wing_id': wing_id,
+            'takes_fleet_warp': True,
+        }
+
+    def add_guest(self):
+        self.add_member(next(self._guests))
+
+    def churn(self, rate):
+        """
+        Applies member turnover for the time since the last read.
+        """
+        now = time.monotonic()
+        self._churn_debt += rate * len(self.members) * (now - self._churned_at) / 60
+        self._churned_at = now
+        while self._churn_debt >= 1:
+            self._churn_debt -= 1
+            guests = [cid for cid, m in self.members.items() if m['role'] == 'squad_member']
+            if not guests:
+                break
+            if self._rnd.random() < 0.5:
+                # Leave + someone new joins, so the fleet stays about the same size
+                del self.members[self._rnd.choice(guests)]
+                self.add_guest()
+            else:
+                self.members[self._rnd.choice(guests)]['ship_type_id'] = self._rnd.choice(FLEET_SHIPS)
+
+    def remove_unit(self, wing_id=None, squad_id=None):
+        if wing_id is not None:
+            self.wings = [w for w in self.wings if w['id'] != wing_id]
+        if squad_id is not None:
+            for w in self.wings:
+                w['squads'] = [s for s in w['squads'] if s['id'] != squad_id]
+        for m in self.members.values():
+            if m['wing_id'] == wing_id or m['squad_id'] == squad_id:
+                m['wing_id'], m['squad_id'] = -1, -1
+
+class MockEsiState:
+    """
+    Everything that changes while the server runs: fleets, rate-limit buckets, error budgets, stats.
+    """
+    def __init__(self, config):
+        self.config = config
+        self.lock = threading.Lock()
+        self.fleets = {}
+        self.ids = itertools.count(STRUCTURE_ID_BASE)
+        self.tokens = itertools.count(1)
+        self.buckets = {}        # (group, principal) -> [window_start, used]
+        self.error_budgets = {}  # principal -> [window_start, remaining]
+        self.fixtures = FixtureStore(config.fixtures_dir) if config.fixtures_dir else None
+        self.stats = {'requests': 0, 'by_status': {}, 'by_route': {}, 'injected_errors': 0, 'rate_limited': 0, 'replayed': 0, 'recorded': 0}
+        self.started = time.time()
+
+    def count(self, route, status):
+        with self.lock:
+            self.stats['requests'] += 1
+            self.stats['by_status'][str(status)] = self.stats['by_status'].get(str(status), 0) + 1
+            self.stats['by_route'][route] = self.stats['by_route'].get(route, 0) + 1
+
+    def bump(self, field):
+        with self.lock:
+            self.stats[field] += 1
+
+    def fleet(self, fleet_id, create=True):
+        with self.lock:
+            fleet = self.fleets.get(fleet_id)
+            if fleet is None and create and self.config.fleet_size:
+                boss_id = fleet_id - FLEET_ID_BASE if fleet_id > FLEET_ID_BASE else GUEST_ID_BASE - 1
+                fleet = self.fleets[fleet_id] = _Fleet(fleet_id, boss_id, self.config.fleet_size, self.ids)
+            return fleet
+
+    def take_ratelimit(self, group, principal):
+        """
+        Fixed-window token bucket. Returns (remaining, used, retry_after or None).
+        """
+        limit, window = self.config.ratelimit_limit, self.config.ratelimit_window
+        now = time.time()
+        with self.lock:
+            bucket = self.buckets.get((group, principal))
+            if bucket is None or now - bucket[0] >= window:
+                bucket = self.buckets[(group, principal)] = [now, 0]
+            if bucket[1] >= limit:
+                return 0, bucket[1], max(1, int(bucket[0] + window - now))
+            bucket[1] += 1
+            return limit - bucket[1], bucket[1], None
+
+    def error_budget(self, principal, spend=False):
+        """
+        Returns (remaining, reset_seconds) of the ESI error limit, optionally spending one error.
+        """
+        now = time.time()
+        window = self.config.error_limit_window
+        with self.lock:
+            budget = self.error_budgets.get(principal)
+            if budget is None or now - budget[0] >= window:
+                budget = self.error_budgets[principal] = [now, self.config.error_limit]
+            if spend and budget[1] > 0:
+                budget[1] -= 1
+            return budget[1], max(1, int(budget[0] + window - now))
+
+# --- FIXTURES ---
+
+class FixtureStore:
+    """
+    One JSON file per request (method + path, query dropped except ?page=).
+    """
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+    def _file(self, key):
+        name = re.sub(r'[^A-Za-z0-9]+', '_', key).strip('_')
+        return os.path.join(self.path, f"{name}.json")
+
+    def _keys(self, method, path, page):
+        suffix = f"?page={page}" if page and page != '1' else ''
+        return [f"{method} {path}{suffix}", f"{route_key(method, path)}{suffix}"]
+
+    def load(self, method, path, page=None):
+        for key in self._keys(method, path, page):
+            if key not in self._cache:
+                try:
+                    with open(self._file(key)) as f:
+                        self._cache[key] = json.load(f)
+                except (OSError, ValueError):
+                    self._cache[key] = None
+            if self._cache[key]:
+                return self._cache[key]
+        return None
+
+    def save(self, method, path, page, status, headers, body):
+        fixture = {
+            'status': status,
+            'body': body,
+            'headers': {k: headers[k] for k in ('X-Pages', 'Content-Type') if k in headers},
+        }
+        with self._lock:
+            for key in self._keys(method, path, page):
+                self._cache[key] = fixture
+                with open(self._file(key), 'w') as f:
+                    json.dump(fixture, f)
+
+# --- HTTP ---
+
+_ROUTE_VERSION = re.compile(r'^/(latest|legacy|dev|v\d+)(?=/)')
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # keep-alive, like ESI
+    server_version = 'MockESI/1.0'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self): self._dispatch('GET')
+    def do_POST(self): self._dispatch('POST')
+    def do_PUT(self): self._dispatch('PUT')
+    def do_DELETE(self): self._dispatch('DELETE')
+
+    # --- plumbing ---
+
+    def _dispatch(self, method):
+        state = self.server.state
+        config = state.config
+        split = urlsplit(self.path)
+        self.query = parse_qs(split.query)
+        length = int(self.headers.get('Content-Length') or 0)
+        self.raw_body = self.rfile.read(length) if length else b''
+
+        # SSO lives on its own host in production, /v2/oauth/ here
+        if split.path.startswith('/v2/oauth/'):
+            return self._sso(method, split.path)
+        if split.path == '/_mock/stats':
+            return self._send(200, json.dumps(state.stats).encode(), {'Content-Type': 'application/json'})
+
+        path = _ROUTE_VERSION.sub('', split.path)
+        route = route_key(method, path)
+        principal = self.headers.get('Authorization') or self.client_address[0]
+        self._latency(1)
+
+        # Error budget spent -> 420 for everything from this principal, like ESI
+        remaining, reset = state.error_budget(principal)
+        if remaining <= 0:
+            return self._finish(route, 420, {'error': 'This software has exceeded the error limit for ESI.'}, principal)
+
+        if config.record_upstream:
+            return self._proxy(method, split, route, principal)
+
+        if config.error_rate and random.random() < config.error_rate:
+            status = random.choice(ERROR_STATUSES)
+            if status == 504:
+                self._latency(config.timeout_factor)
+            state.bump('injected_errors')
+            return self._finish(route, status, {'error': 'Timeout contacting tranquility' if status == 504 else 'Internal error'}, principal)
+
+        group = RATELIMIT_GROUPS.get(route.split('/')[1] if '/' in route else '', 'default')
+        rate_headers = {}
+        if config.ratelimit_limit:
+            left, used, retry_after = state.take_ratelimit(group, principal)
+            rate_headers = {
+                'X-Ratelimit-Group': group,
+                'X-Ratelimit-Limit': f"{config.ratelimit_limit}/{config.ratelimit_window // 60}m",
+                'X-Ratelimit-Remaining': str(left),
+                'X-Ratelimit-Used': str(used),
+            }
+            if retry_after is not None:
+                state.bump('rate_limited')
+                rate_headers['Retry-After'] = str(retry_after)
+                return self._finish(route, 429, {'error': 'Too many requests'}, principal, rate_headers)
+
+        page = (self.query.get('page') or [None])[0]
+        fixture = state.fixtures.load(method, path, page) if state.fixtures else None
+        if fixture:
+            state.bump('replayed')
+            status, body, extra = fixture['status'], fixture['body'], dict(fixture['headers'])
+        else:
+            status, body, extra = self._synthetic(method, route, path)
+        extra.update(rate_headers)
+        self._finish(route, status, body, principal, extra)
+
+    def _latency(self, factor):
+        config = self.server.state.config
+        if not config.latency:
+            return
+        delay = config.latency * factor * random.uniform(1 - config.jitter, 1 + config.jitter)
+        if factor == 1 and random.random() < config.tail_rate:
+            delay *= 5
+        time.sleep(max(0, delay))
+
+    def _finish(self, route, status, body, principal, extra=None):
+        state = self.server.state
+        headers = dict(extra or {})
+        headers.setdefault('Content-Type', 'application/json; charset=UTF-8')
+
+        if status >= 400 and status not in (420, 429):
+            remaining, reset = state.error_budget(principal, spend=True)
+        else:
+            remaining, reset = state.error_budget(principal)
+        headers['X-Esi-Error-Limit-Remain'] = str(remaining)
+        headers['X-Esi-Error-Limit-Reset'] = str(reset)
+
+        payload = b'' if body is None else json.dumps(body).encode()
+        if status == 200 and route.startswith('GET '):
+            now = datetime.now(dt_timezone.utc)
+            cache_seconds = CACHE_SECONDS.get(route.split('?')[0], DEFAULT_CACHE_SECONDS)
+            etag = f'"{zlib.crc32(payload):08x}"'
+            headers['ETag'] = etag
+            headers['Expires'] = (now + timedelta(seconds=cache_seconds)).strftime(DATE_FORMAT)
+            headers['Last-Modified'] = now.strftime(DATE_FORMAT)
+            if state.config.etags and self.headers.get('If-None-Match', '').strip() in (etag, etag.strip('"')):
+                status, payload = 304, b''
+
+        state.count(route, status)
+        self._send(status, payload, headers)
+
+    def _send(self, status, payload, headers):
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        if payload:
+            self.wfile.write(payload)
+
+    def _json_body(self):
+        try:
+            return json.loads(self.raw_body or b'null')
+        except ValueError:
+            return None
+
+    # --- record mode ---
+
+    def _proxy(self, method, split, route, principal):
+        state = self.server.state
+        config = state.config
+        url = f"{config.record_upstream}{split.path}" + (f"?{split.query}" if split.query else '')
+        forward = {k: v for k, v in self.headers.items() if k in ('Authorization', 'If-None-Match', 'Content-Type', 'Accept', 'User-Agent')}
+        try:
+            resp = requests.request(method, url, headers=forward, data=self.raw_body or None, timeout=20)
+        except requests.RequestException as e:
+            return self._finish(route, 502, {'error': f"Upstream error: {e}"}, principal)
+
+        path = _ROUTE_VERSION.sub('', split.path)
+        page = (self.query.get('page') or [None])[0]
+        body = None
+        if resp.content:
+            try: body = resp.json()
+            except ValueError: body = None
+        # /verify/ and SSO carry identities / tokens, never written to disk
+        if state.fixtures and resp.status_code == 200 and method == 'GET' and not path.startswith('/verify'):
+            state.fixtures.save(method, path, page, resp.status_code, resp.headers, body)
+            state.bump('recorded')
+
+        headers = {k: v for k, v in resp.headers.items() if k.lower().startswith('x-') or k in ('ETag', 'Expires', 'Last-Modified', 'Content-Type', 'Retry-After')}
+        state.count(route, resp.status_code)
+        self._send(resp.status_code, resp.content, headers)
+
+    # --- SSO ---
+
+    def _sso(self, method, path):
+        state = self.server.state
+        config = state.config
+        self._latency(1)
+
+        if config.sso_upstream:
+            url = f"{config.sso_upstream}{self.path}"
+            forward = {k: v for k, v in self.headers.items() if k in ('Authorization', 'Content-Type')}
+            resp = requests.request(method, url, headers=forward, data=self.raw_body or None, timeout=20, allow_redirects=False)
+            headers = {k: v for k, v in resp.headers.items() if k in ('Content-Type', 'Location')}
+            return self._send(resp.status_code, resp.content, headers)
+
+        if path.rstrip('/') == '/v2/oauth/authorize' and method == 'GET':
+            # Logs straight in as ?mock_character_id= (or a random pilot) and bounces back to the callback
+            char_id = int((self.query.get('mock_character_id') or [random.randint(90_000_001, 90_099_999)])[0])
+            target = (self.query.get('redirect_uri') or [''])[0]
+            params = urlencode({'code': f"mock:{char_id}:{next(state.tokens)}", 'state': (self.query.get('state') or [''])[0]})
+            state.count('GET /v2/oauth/authorize/', 302)
+            return self._send(302, b'', {'Location': f"{target}?{params}"})
+
+        if path.rstrip('/') == '/v2/oauth/token' and method == 'POST':
+            form = parse_qs(self.raw_body.decode())
+            grant = (form.get('grant_type') or [''])[0]
+            secret = (form.get('refresh_token') or form.get('code') or [''])[0]
+            if config.error_rate and random.random() < config.error_rate:
+                state.count('POST /v2/oauth/token/', 502)
+                return self._send(502, b'', {})
+            if grant not in ('refresh_token', 'authorization_code') or not secret:
+                state.count('POST /v2/oauth/token/', 400)
+                return self._send(400, json.dumps({'error': 'invalid_request'}).encode(), {'Content-Type': 'application/json'})
+            # Token strings carry the character id so /verify/ can answer for them
+            parts = secret.split(':')
+            char_id = parts[1] if len(parts) >= 2 and parts[0] == 'mock' else str(zlib.crc32(secret.encode()) % 1_000_000 + 90_000_000)
+            serial = next(state.tokens)
+            tokens = {
+                'access_token': f"mock:{char_id}:{serial}",
+                'expires_in': config.token_lifetime,
+                'token_type': 'Bearer',
+                'refresh_token': f"mock:{char_id}:r{serial}",
+            }
+            state.count('POST /v2/oauth/token/', 200)
+            return self._send(200, json.dumps(tokens).encode(), {'Content-Type': 'application/json'})
+
+        state.count(f"{method} {path}", 404)
+        self._send(404, b'', {})
+
+    # --- synthetic ESI ---
+
+    def _synthetic(self, method, route, path):
+        """
+        Returns (status, body, extra_headers) for a route.
+        """
+        state = self.server.state
+        config = state.config
+        ids = [int(seg) for seg in path.split('/') if seg.isdigit()]
+
+        if route == 'GET /status/':
+            return 200, {'players': 23000, 'server_version': '2900000', 'start_time': _iso(datetime.fromtimestamp(state.started, dt_timezone.utc)), 'vip': False}, {}
+
+        if route == 'GET /verify/':
+            token = (self.headers.get('Authorization') or '').replace('Bearer ', '')
+            parts = token.split(':')
+            if len(parts) < 2 or not parts[1].isdigit():
+                return 401, {'error': 'Invalid token'}, {}
+            char_id = int(parts[1])
+            expires = datetime.now(dt_timezone.utc) + timedelta(seconds=config.token_lifetime)
+            return 200, {
+                'CharacterID': char_id, 'CharacterName': f"Mock Pilot {char_id}", 'ExpiresOn': expires.strftime('%Y-%m-%dT%H:%M:%S'),
+                'Scopes': '', 'TokenType': 'Character', 'CharacterOwnerHash': f"mock{char_id}", 'IntellectualProperty': 'EVE'
+            }, {}
+
+        character_routes = {
+            'GET /characters/{id}/': lambda cid: _public_info(cid),
+            'GET /characters/{id}/online/': lambda cid: _online(cid, config),
+            'GET /characters/{id}/skills/': _skills,
+            'GET /characters/{id}/skillqueue/': _skillqueue,
+            'GET /characters/{id}/ship/': _ship,
+            'GET /characters/{id}/wallet/': _wallet,
+            'GET /characters/{id}/loyalty/points/': _loyalty,
+            'GET /characters/{id}/implants/': _implants,
+            'GET /characters/{id}/corporationhistory/': _corporation_history,
+        }
+        if route in character_routes:
+            return 200, character_routes[route](ids[0]), {}
+
+        if route == 'GET /characters/{id}/fleet/':
+            if not config.fleet_size:
+                return 404, {'error': 'Character is not in a fleet'}, {}
+            fleet_id = FLEET_ID_BASE + ids[0]
+            state.fleet(fleet_id)
+            return 200, {'fleet_id': fleet_id, 'fleet_boss_id': ids[0], 'role': 'fleet_commander', 'squad_id': -1, 'wing_id': -1}, {}
+
+        if route == 'POST /universe/names/':
+            requested = self._json_body()
+            if not isinstance(requested, list):
+                return 400, {'error': 'Invalid body'}, {}
+            names = []
+            for entity_id in requested:
+                category = _name_category(entity_id)
+                label = {'corporation': 'Mock Corp', 'alliance': 'Mock Alliance'}.get(category, 'Mock Pilot')
+                names.append({'id': entity_id, 'name': f"{label} {entity_id}", 'category': category})
+            return 200, names, {}
+
+        if route == 'GET /corporations/{id}/wallets/{id}/journal/':
+            return self._journal(ids[0], ids[1])
+
+        if route.startswith(('GET /fleets/', 'POST /fleets/', 'PUT /fleets/', 'DELETE /fleets/')):
+            return self._fleet_route(method, route, ids)
+
+        return 404, {'error': 'Requested page does not exist!'}, {}
+
+    def _journal(self, corp_id, division):
+        config = self.server.state.config
+        pages = config.wallet_pages
+        page = int((self.query.get('page') or ['1'])[0])
+        if division != 1 or page > pages:
+            return 200, [], {'X-Pages': str(max(1, pages if division == 1 else 1))}
+
+        # Newest first; a new entry is booked every 1 / wallet_rate seconds
+        newest = JOURNAL_ID_BASE + int((time.time() - 1_700_000_000) * config.wallet_rate)
+        rows = []
+        now = datetime.now(dt_timezone.utc)
+        for i in range(JOURNAL_PAGE_SIZE):
+            entry_id = newest - (page - 1) * JOURNAL_PAGE_SIZE - i
+            rnd = random.Random(entry_id)
+            amount = round(rnd.uniform(-8e8, 8e8), 2)
+            rows.append({
+                'id': entry_id,
+                'amount': amount,
+                'balance': round(rnd.uniform(1e9, 1e11), 2),
+                'date': _iso(now - timedelta(seconds=(newest - entry_id) / max(config.wallet_rate, 0.001))),
+                'description': 'Mock transfer',
+                'first_party_id': rnd.randint(90_000_001, 90_099_999) if amount > 0 else corp_id,
+                'second_party_id': corp_id if amount > 0 else rnd.randint(90_000_001, 90_099_999),
+                'reason': rnd.choice(['', 'srp', 'Incursion payout', 'donation']),
+                'ref_type': rnd.choice(['player_donation', 'corporation_account_withdrawal', 'bounty_prizes']),
+                'context_id_type': None,
+            })
+        return 200, rows, {'X-Pages': str(pages)}
+
+    def _fleet_route(self, method, route, ids):
+        state = self.server.state
+        fleet = state.fleet(ids[0], create=(method == 'GET'))
+        if fleet is None:
+            return 404, {'error': 'Fleet not found'}, {}
+
+        with state.lock:
+            if route == 'GET /fleets/{id}/':
+                return 200, {'motd': fleet.motd, 'is_free_move': fleet.is_free_move, 'is_registered': False, 'is_voice_enabled': False}, {}
+            if route == 'PUT /fleets/{id}/':
+                body = self._json_body() or {}
+                if 'motd' in body: fleet.motd = body['motd']
+                if 'is_free_move' in body: fleet.is_free_move = body['is_free_move']
+                return 204, None, {}
+            if route == 'GET /fleets/{id}/members/':
+                fleet.churn(state.config.fleet_churn)
+                return 200, list(fleet.members.values()), {}
+            if route == 'POST /fleets/{id}/members/':
+                body = self._json_body() or {}
+                if not body.get('character_id'):
+                    return 400, {'error': 'character_id missing'}, {}
+                # The invite is accepted straight away
+                fleet.add_member(body['character_id'], body.get('role', 'squad_member'), body.get('wing_id'), body.get('squad_id'))
+                return 204, None, {}
+            if route == 'PUT /fleets/{id}/members/{id}/':
+                member = fleet.members.get(ids[1])
+                if not member:
+                    return 404, {'error': 'Member not found'}, {}
+                body = self._json_body() or {}
+                member.update({k: body[k] for k in ('role', 'wing_id', 'squad_id') if k in body})
+                return 204, None, {}
+            if route == 'DELETE /fleets/{id}/members/{id}/':
+                return (204, None, {}) if fleet.members.pop(ids[1], None) else (404, {'error': 'Member not found'}, {})
+            if route == 'GET /fleets/{id}/wings/':
+                return 200, json.loads(json.dumps(fleet.wings)), {}
+            if route == 'POST /fleets/{id}/wings/':
+                wing_id = next(state.ids)
+                fleet.wings.append({'id': wing_id, 'name': 'Wing', 'squads': []})
+                return 201, {'wing_id': wing_id}, {}
+            if route == 'POST /fleets/{id}/wings/{id}/squads/':
+                wing = next((w for w in fleet.wings if w['id'] == ids[1]), None)
+                if not wing:
+                    return 404, {'error': 'Wing not found'}, {}
+                squad_id = next(state.ids)
+                wing['squads'].append({'id': squad_id, 'name': 'Squad'})
+                return 201, {'squad_id': squad_id}, {}
+            if route in ('PUT /fleets/{id}/wings/{id}/', 'PUT /fleets/{id}/squads/{id}/'):
+                name = (self._json_body() or {}).get('name', '')
+                units = fleet.wings if '/wings/' in route else [s for w in fleet.wings for s in w['squads']]
+                unit = next((u for u in units if u['id'] == ids[1]), None)
+                if not unit:
+                    return 404, {'error': 'Not found'}, {}
+                unit['name'] = name
+                return 204, None, {}
+            if route == 'DELETE /fleets/{id}/wings/{id}/':
+                fleet.remove_unit(wing_id=ids[1])
+                return 204, None, {}
+            if route == 'DELETE /fleets/{id}/squads/{id}/':
+                fleet.remove_unit(squad_id=ids[1])
+                return 204, None, {}
+
+        return 404, {'error': 'Requested page does not exist!'}, {}
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # hundreds of greenlets connect at once
+
+class MockEsiServer:
+    """
+    Usage:
+        server = MockEsiServer(latency=0.1, fleet_size=250).start()
+        ... point ESI_MOCK_URL at server.base_url ...
+        server.stop()
+    Keyword arguments are MockEsiConfig fields (or pass config=MockEsiConfig(...)).
+    """
+    def __init__(self, host='127.0.0.1', port=0, config=None, **options):
+        self.config = config or MockEsiConfig(**options)
+        self.state = MockEsiState(self.config)
+        self.httpd = _Server((host, port), _Handler)
+        self.httpd.state = self.state
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def esi_url(self):
+        return f"{self.base_url}/latest"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,114 @@
+import threading
+import time
+import logging
+from esi_calls import circuit_breaker
+from esi_calls.worker_profile import io_stage
+
+logger = logging.getLogger(__name__)
+
+# Back off once ESI's error budget gets this low (it hard-blocks at 0 with a 420)
+ERROR_LIMIT_FLOOR = 10
+
+# Fraction of a rate-limit bucket we keep in reserve for interactive calls
+BUCKET_RESERVE = 0.05
+
+# Statuses worth retrying (throttled or transient upstream failure)
+RETRY_STATUSES = {420, 429, 502, 503, 504}
+
+class EsiRateGovernor:
+    """
+    Replaces fixed time.sleep() spacing for bulk ESI writes.
+    - Caps in-flight requests with a semaphore.
+    - Reads ESI's own headers (Retry-After, X-Esi-Error-Limit-*, X-Ratelimit-*)
+      and pauses every caller in the process until the budget resets.
+    - Retries throttled / transient failures with backoff.
+    """
+    def __init__(self, name, max_concurrency=4):
+        self.name = name
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pause_until = 0.0
+
+    def pause(self, seconds, reason=""):
+        with self._lock:
+            until = time.monotonic() + seconds
+            if until > self._pause_until:
+                self._pause_until = until
+                logger.warning(f"[Governor:{self.name}] Pausing {seconds:.1f}s {reason}")
+
+    def _wait_for_budget(self):
+        while True:
+            delay = self._pause_until - time.monotonic()
+            if delay <= 0: return
+            time.sleep(min(delay, 5))
+
+    def observe(self, response):
+        headers = response.headers
+
+        if response.status_code in (420, 429):
+            try: retry_after = float(headers.get('Retry-After', 0))
+            except ValueError: retry_after = 0
+            self.pause(retry_after or 10, f"(HTTP {response.status_code})")
+            return
+
+        error_remain = headers.get('X-Esi-Error-Limit-Remain')
+        if error_remain is not None:
+            try:
+                if int(error_remain) < ERROR_LIMIT_FLOOR:
+                    self.pause(int(headers.get('X-Esi-Error-Limit-Reset', 10)), f"(error budget {error_remain})")
+            except ValueError:
+                pass
+
+        remaining = headers.get('X-Ratelimit-Remaining')
+        limit_str = headers.get('X-Ratelimit-Limit')
+        if remaining and limit_str:
+            try:
+                limit_val = int(limit_str.split('/')[0])
+                if int(remaining) < limit_val * BUCKET_RESERVE:
+                    self.pause(1, f"(bucket {remaining}/{limit_val})")
+            except ValueError:
+                pass
+
+    def request(self, session, method, url, retries=3, **kwargs):
+        """
+        Sends one request under the governor. Returns the final response (or raises the last network error).
+        Raises CircuitOpenError without sending if the route's circuit is open; only the
+        final outcome of the retries counts towards the breaker.
+        """
+        kwargs.setdefault('timeout', 10)
+        route = circuit_breaker.route_key(method, url)
+        breaker_state = circuit_breaker.check(route)
+        if breaker_state == circuit_breaker.OPEN:
+            raise circuit_breaker.CircuitOpenError(route)
+        last_error = None
+        for attempt in range(retries + 1):
+            self._wait_for_budget()
+            with self._slots:
+                try:
+                    with io_stage():
+                        response = session.request(method, url, **kwargs)
+                except Exception as e:
+                    last_error = e
+                    response = None
+            if response is not None:
+                self.observe(response)
+                if response.status_code not in RETRY_STATUSES or attempt == retries:
+                    circuit_breaker.record(route, not circuit_breaker.is_failure(response.status_code), breaker_state)
+                    return response
+            elif attempt == retries:
+                circuit_breaker.record(route, False, breaker_state)
+                raise last_error
+            # Simple exponential backoff on top of any header-driven pause
+            time.sleep(0.5 * (2 ** attempt))
+
+_governors = {}
+_registry_lock = threading.Lock()
+
+def get_governor(name, max_concurrency=4):
+    """
+    Process-wide governor per ESI rate-limit group (e.g. 'fleet').
+    """
+    with _registry_lock:
+        if name not in _governors:
+            _governors[name] = EsiRateGovernor(name, max_concurrency=max_concurrency)
+        return _governors[name]
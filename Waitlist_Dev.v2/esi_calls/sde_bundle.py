@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from django.utils import timezone
+
+from pilot_data.models import ItemType, ItemGroup, TypeAttribute, TypeEffect, AttributeDefinition, SDEState
+from esi_calls.sde_loader import SDE_TABLES, READ_CHUNK
+
+# Offline SDE bundle: a directory with a manifest.json and one uncompressed .npy file per
+# column, so every array can be memory-mapped straight from disk (np.load(mmap_mode='r')).
+# Strings are stored Arrow-style as one UTF-8 blob plus an int64 offsets array;
+# nullable columns get an extra boolean .mask.npy (True = NULL).
+# Column names follow the fuzzwork CSVs so bundles feed the same row builders as a live import.
+
+BUNDLE_FORMAT = 1
+MANIFEST = 'manifest.json'
+
+# table -> model, [(bundle column, model attname, kind)]
+BUNDLE_COLUMNS = {
+    'invGroups': (ItemGroup, [
+        ('groupID', 'group_id', 'int'), ('categoryID', 'category_id', 'int'),
+        ('groupName', 'group_name', 'str'), ('published', 'published', 'bool'),
+    ]),
+    'dgmAttributeTypes': (AttributeDefinition, [
+        ('attributeID', 'attribute_id', 'int'), ('attributeName', 'name', 'str'),
+        ('description', 'description', 'str'), ('displayName', 'display_name', 'str'),
+        ('unitID', 'unit_id', 'int'), ('published', 'published', 'bool'),
+    ]),
+    'invTypes': (ItemType, [
+        ('typeID', 'type_id', 'int'), ('groupID', 'group_id', 'int'), ('typeName', 'type_name', 'str'),
+        ('description', 'description', 'str'), ('mass', 'mass', 'float'), ('volume', 'volume', 'float'),
+        ('capacity', 'capacity', 'float'), ('published', 'published', 'bool'), ('marketGroupID', 'market_group_id', 'int'),
+    ]),
+    'dgmTypeAttributes': (TypeAttribute, [
+        ('typeID', 'item_id', 'int'), ('attributeID', 'attribute_id', 'int'), ('valueFloat', 'value', 'float'),
+    ]),
+    'dgmTypeEffects': (TypeEffect, [
+        ('typeID', 'item_id', 'int'), ('effectID', 'effect_id', 'int'), ('isDefault', 'is_default', 'bool'),
+    ]),
+}
+
+NUMPY_DTYPES = {'int': np.int64, 'float': np.float64, 'bool': np.bool_}
+
+def _published_querysets():
+    """
+    Published groups, published types inside them, and only their attributes/effects.
+    Attribute definitions are kept whole, Fit Analysis Rules may reference any of them.
+    """
+    groups = ItemGroup.objects.filter(published=True)
+    types = ItemType.objects.filter(published=True, group__published=True)
+    return {
+        'invGroups': groups,
+        'dgmAttributeTypes': AttributeDefinition.objects.all(),
+        'invTypes': types,
+        'dgmTypeAttributes': TypeAttribute.objects.filter(item__published=True, item__group__published=True),
+        'dgmTypeEffects': TypeEffect.objects.filter(item__published=True, item__group__published=True),
+    }
+
+def _write_array(path, array, digest):
+    np.save(path, array, allow_pickle=False)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+
+def _write_column(directory, table, name, kind, values, digest):
+    """
+    Writes one column, returns its manifest entry.
+    """
+    base = os.path.join(directory, f"{table}.{name}")
+    mask = np.array([v is None for v in values], dtype=np.bool_)
+    entry = {'kind': kind, 'nullable': bool(mask.any())}
+
+    if kind == 'str':
+        encoded = [(v or '').encode('utf-8') for v in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(b) for b in encoded], out=offsets[1:])
+        blob = b''.join(encoded)
+        with open(base + '.utf8', 'wb') as f:
+            f.write(blob)
+        digest.update(blob)
+        _write_array(base + '.offsets.npy', offsets, digest)
+    else:
+        filler = 0 if kind != 'bool' else False
+        array = np.array([filler if v is None else v for v in values], dtype=NUMPY_DTYPES[kind])
+        _write_array(base + '.npy', array, digest)
+
+    if entry['nullable']:
+        _write_array(base + '.mask.npy', mask, digest)
+    return entry
+
+def export_bundle(directory, published_only=False, log=None):
+    """
+    Dumps the SDE tables from the database into a bundle directory. Returns the manifest.
+    """
+    log = log or (lambda msg: None)
+    os.makedirs(directory, exist_ok=True)
+    querysets = _published_querysets() if published_only else {}
+    state = SDEState.load()
+
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'sde_version': state.version,
+        'source': state.source,
+        'published_only': published_only,
+        'created_at': timezone.now().isoformat(),
+        'tables': {}
+    }
+
+    for table in SDE_TABLES:
+        model, columns = BUNDLE_COLUMNS[table]
+        qs = querysets.get(table, model.objects.all())
+        attnames = [attname for _, attname, _ in columns]
+        # Key order keeps bundles byte-identical for identical data
+        ordering = attnames[:2] if table in ('dgmTypeAttributes', 'dgmTypeEffects') else attnames[:1]
+        rows = list(qs.order_by(*ordering).values_list(*attnames))
+        log(f"Exporting {table}: {len(rows)} rows...")
+
+        digest = hashlib.sha256()
+        by_column = list(zip(*rows)) if rows else [() for _ in columns]
+        entries = {}
+        for (name, _, kind), values in zip(columns, by_column):
+            entries[name] = _write_column(directory, table, name, kind, values, digest)
+
+        manifest['tables'][table] = {'rows': len(rows), 'columns': entries, 'checksum': digest.hexdigest()}
+
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+class SdeBundle:
+    """
+    Read side of a bundle. Numeric columns come back as read-only memory maps, so
+    opening a bundle costs nothing until the data is touched.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != BUNDLE_FORMAT:
+            raise ValueError(f"Unsupported SDE bundle format: {self.manifest.get('format')}")
+
+    @property
+    def tables(self):
+        return self.manifest['tables']
+
+    def rows(self, table):
+        return self.tables[table]['rows']
+
+    def _path(self, table, name, suffix):
+        return os.path.join(self.directory, f"{table}.{name}{suffix}")
+
+    def mask(self, table, name):
+        if not self.tables[table]['columns'][name]['nullable']:
+            return None
+        return np.load(self._path(table, name, '.mask.npy'), mmap_mode='r')
+
+    def array(self, table, name):
+        """
+        Raw column: a memmap for numeric columns, (offsets memmap, bytes memmap) for strings.
+        """
+        if self.tables[table]['columns'][name]['kind'] == 'str':
+            offsets = np.load(self._path(table, name, '.offsets.npy'), mmap_mode='r')
+            size = os.path.getsize(self._path(table, name, '.utf8'))
+            blob = np.memmap(self._path(table, name, '.utf8'), dtype=np.uint8, mode='r') if size else np.zeros(0, dtype=np.uint8)
+            return offsets, blob
+        return np.load(self._path(table, name, '.npy'), mmap_mode='r')
+
+    def column(self, table, name, start=0, stop=None):
+        """
+        Decoded slice of a column as a list of Python values (None for NULLs).
+        """
+        spec = self.tables[table]['columns'][name]
+        stop = self.rows(table) if stop is None else stop
+        raw = self.array(table, name)
+
+        if spec['kind'] == 'str':
+            offsets, blob = raw
+            data = bytes(blob[offsets[start]:offsets[stop]])
+            base = int(offsets[start])
+            bounds = (offsets[start:stop + 1] - base).tolist()
+            values = [data[bounds[i]:bounds[i + 1]].decode('utf-8') for i in range(stop - start)]
+        else:
+            values = raw[start:stop].tolist()
+
+        mask = self.mask(table, name)
+        if mask is not None:
+            values = [None if null else v for null, v in zip(mask[start:stop].tolist(), values)]
+        return values
+
+    def frames(self, table, chunksize=READ_CHUNK):
+        """
+        DataFrame chunks in the same shape read_csv_chunks produces for the live CSVs.
+        """
+        names = list(self.tables[table]['columns'])
+        total = self.rows(table)
+        for start in range(0, total, chunksize):
+            stop = min(start + chunksize, total)
+            yield pd.DataFrame({name: self.column(table, name, start, stop) for name in names})
+
+class BundleSource:
+    """
+    SdeLoader source backed by a bundle directory. Tables whose checksum matches the
+    last import are skipped, the same way an unchanged ETag skips a live download.
+    """
+    def __init__(self, directory):
+        self.bundle = SdeBundle(directory)
+        self.label = f"bundle:{os.path.abspath(directory)}"
+
+    def open(self, table, previous=None):
+        previous = previous or {}
+        info = self.bundle.tables[table]
+        if previous.get('checksum') == info['checksum']:
+            return None, previous
+        return self.bundle.frames(table), {'url': self.label, 'checksum': info['checksum']}
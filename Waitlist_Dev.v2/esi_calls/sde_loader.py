@@ -0,0 +1,333 @@
+import bz2
+import hashlib
+import io
+import logging
+import pandas as pd
+import requests
+from django.db import connection, transaction
+from django.utils import timezone
+
+from pilot_data.models import ItemType, ItemGroup, TypeAttribute, TypeEffect, AttributeDefinition, SDEState
+from core.slot_layout import rebuild_slot_layouts
+
+logger = logging.getLogger(__name__)
+
+FUZZWORK_BASE = "https://www.fuzzwork.co.uk/dump/latest"
+
+# CSV rows parsed per DataFrame chunk (also the unit of the DB diff)
+READ_CHUNK = 100000
+
+# Rows per upsert statement
+UPSERT_BATCH = 5000
+
+# Ids per DELETE when pruning
+DELETE_BATCH = 1000
+
+# Keys per lookup when diffing a chunk against the DB
+KEY_BATCH = 10000
+
+# Only the columns we store, with explicit dtypes (nullable ints where fuzzwork emits None)
+SDE_COLUMNS = {
+    'invGroups': {'groupID': 'int64', 'categoryID': 'int64', 'groupName': 'object', 'published': 'Int8'},
+    'dgmAttributeTypes': {
+        'attributeID': 'int64', 'attributeName': 'object', 'description': 'object',
+        'displayName': 'object', 'unitID': 'Int64', 'published': 'Int8'
+    },
+    'invTypes': {
+        'typeID': 'int64', 'groupID': 'Int64', 'typeName': 'object', 'description': 'object',
+        'mass': 'float64', 'volume': 'float64', 'capacity': 'float64', 'published': 'Int8', 'marketGroupID': 'Int64'
+    },
+    'dgmTypeAttributes': {'typeID': 'int64', 'attributeID': 'int64', 'valueInt': 'float64', 'valueFloat': 'float64'},
+    'dgmTypeEffects': {'typeID': 'int64', 'effectID': 'int64', 'isDefault': 'Int8'},
+}
+
+# Import order matters: types need groups, attributes need definitions + types
+SDE_TABLES = ['invGroups', 'dgmAttributeTypes', 'invTypes', 'dgmTypeAttributes', 'dgmTypeEffects']
+
+class _HashingReader(io.RawIOBase):
+    """
+    Read-only stream that checksums the bytes as they stream past.
+    """
+    def __init__(self, raw):
+        self.raw = raw
+        self.digest = hashlib.sha256()
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.raw.read(len(buffer))
+        self.digest.update(data)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+def read_csv_chunks(fileobj, table, chunksize=READ_CHUNK):
+    """
+    Streams a CSV as DataFrame chunks, keeping only the columns in SDE_COLUMNS.
+    Columns missing from the file are simply absent (the row builders default them).
+    """
+    dtypes = SDE_COLUMNS[table]
+    return pd.read_csv(
+        fileobj,
+        usecols=lambda col: col in dtypes,
+        dtype=dtypes,
+        chunksize=chunksize,
+        keep_default_na=True
+    )
+
+class FuzzworkSource:
+    """
+    Live CSV dumps from fuzzwork, streamed and bz2-decompressed on the fly.
+    Conditional GETs (ETag / Last-Modified) skip tables that haven't changed upstream.
+    """
+    label = FUZZWORK_BASE
+
+    def __init__(self, base_url=FUZZWORK_BASE, session=None):
+        self.base_url = base_url
+        self.session = session or requests.Session()
+
+    def open(self, table, previous=None):
+        """
+        Returns (chunks, meta) or (None, meta) when upstream reports no change.
+        meta['checksum'] is only final once the chunks have been consumed.
+        """
+        previous = previous or {}
+        headers = {}
+        if previous.get('etag'): headers['If-None-Match'] = previous['etag']
+        if previous.get('last_modified'): headers['If-Modified-Since'] = previous['last_modified']
+
+        url = f"{self.base_url}/{table}.csv.bz2"
+        response = self.session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 404:
+            # Plain CSV fallback for mirrors without the compressed variant
+            url = f"{self.base_url}/{table}.csv"
+            response = self.session.get(url, headers=headers, stream=True, timeout=60)
+        if response.status_code == 304:
+            return None, previous
+        response.raise_for_status()
+
+        response.raw.decode_content = True
+        reader = _HashingReader(response.raw)
+        stream = io.BufferedReader(reader)
+        if url.endswith('.bz2'):
+            stream = bz2.BZ2File(stream)
+        meta = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'reader': reader
+        }
+        return read_csv_chunks(stream, table), meta
+
+def _col(df, name, default):
+    """
+    Column as a plain Python list with NaN -> default (columns missing in the file -> all default).
+    """
+    if name not in df.columns:
+        return [default] * len(df)
+    series = df[name].astype(object)
+    return series.where(series.notna(), default).tolist()
+
+# --- ROW BUILDERS: DataFrame chunk -> (key, values) tuples in model field order ---
+
+def _group_rows(df, ctx):
+    published = [bool(p) for p in _col(df, 'published', 1)]
+    for gid, cid, name, pub in zip(_col(df, 'groupID', None), _col(df, 'categoryID', 0), _col(df, 'groupName', ''), published):
+        yield int(gid), (int(cid), name, pub)
+
+def _definition_rows(df, ctx):
+    cols = zip(
+        _col(df, 'attributeID', None), _col(df, 'attributeName', ''), _col(df, 'description', ''),
+        _col(df, 'displayName', None), _col(df, 'unitID', None), _col(df, 'published', 1)
+    )
+    for aid, name, desc, display, unit, pub in cols:
+        yield int(aid), (name, desc, display, int(unit) if unit is not None else None, bool(pub))
+
+def _type_rows(df, ctx):
+    valid_groups = ctx['group_ids']
+    cols = zip(
+        _col(df, 'typeID', None), _col(df, 'groupID', None), _col(df, 'typeName', ''), _col(df, 'description', ''),
+        _col(df, 'mass', 0.0), _col(df, 'volume', 0.0), _col(df, 'capacity', 0.0),
+        _col(df, 'published', 1), _col(df, 'marketGroupID', None)
+    )
+    for tid, gid, name, desc, mass, volume, capacity, pub, market in cols:
+        # We filter out items that belong to groups we don't have (integrity check)
+        if gid is None or int(gid) not in valid_groups:
+            continue
+        yield int(tid), (int(gid), name, desc, float(mass), float(volume), float(capacity), bool(pub),
+                         int(market) if market is not None else None)
+
+def _attribute_rows(df, ctx):
+    valid_attrs, valid_types = ctx['attribute_ids'], ctx['type_ids']
+    value_float = _col(df, 'valueFloat', None)
+    value_int = _col(df, 'valueInt', None)
+    for tid, aid, vf, vi in zip(_col(df, 'typeID', None), _col(df, 'attributeID', None), value_float, value_int):
+        tid, aid = int(tid), int(aid)
+        if aid not in valid_attrs or tid not in valid_types:
+            continue
+        value = vf if vf is not None else (vi if vi is not None else 0.0)
+        yield (tid, aid), (float(value),)
+
+def _effect_rows(df, ctx):
+    valid_types = ctx['type_ids']
+    for tid, eid, default in zip(_col(df, 'typeID', None), _col(df, 'effectID', None), _col(df, 'isDefault', 0)):
+        tid = int(tid)
+        if tid not in valid_types:
+            continue
+        yield (tid, int(eid)), (bool(default),)
+
+# model, key fields, value fields, row builder
+TABLE_SPECS = {
+    'invGroups': (ItemGroup, ('group_id',), ('category_id', 'group_name', 'published'), _group_rows),
+    'dgmAttributeTypes': (AttributeDefinition, ('attribute_id',), ('name', 'description', 'display_name', 'unit_id', 'published'), _definition_rows),
+    'invTypes': (ItemType, ('type_id',), ('group_id', 'type_name', 'description', 'mass', 'volume', 'capacity', 'published', 'market_group_id'), _type_rows),
+    'dgmTypeAttributes': (TypeAttribute, ('item_id', 'attribute_id'), ('value',), _attribute_rows),
+    'dgmTypeEffects': (TypeEffect, ('item_id', 'effect_id'), ('is_default',), _effect_rows),
+}
+
+# Tables the precomputed slot layouts are derived from
+LAYOUT_TABLES = ('invGroups', 'invTypes', 'dgmTypeAttributes', 'dgmTypeEffects')
+
+# Groups and definitions are never pruned: FitAnalysisRule rows cascade from them
+PRUNABLE = {'invTypes', 'dgmTypeAttributes', 'dgmTypeEffects'}
+
+def _existing_values(model, key_fields, value_fields, keys):
+    """
+    Current DB values for a chunk's keys: {key: values tuple}.
+    Composite-key tables are fetched per item (superset), then matched in Python.
+    """
+    existing = {}
+    if len(key_fields) == 1:
+        lookup, ids = f'{key_fields[0]}__in', list(keys)
+    else:
+        lookup, ids = 'item_id__in', list({key[0] for key in keys})
+
+    # Sliced so the IN list stays under SQLite's bound-parameter limit
+    for i in range(0, len(ids), KEY_BATCH):
+        rows = model.objects.filter(**{lookup: ids[i:i + KEY_BATCH]}).values_list(*key_fields, *value_fields)
+        for row in rows:
+            if len(key_fields) == 1:
+                existing[row[0]] = tuple(row[1:])
+            else:
+                existing[(row[0], row[1])] = tuple(row[2:])
+    return existing
+
+def _upsert(model, key_fields, value_fields, changed):
+    """
+    Multi-row INSERT ... ON DUPLICATE KEY UPDATE (ON CONFLICT on SQLite/Postgres),
+    which PyMySQL sends as large batched statements.
+    """
+    objs = [model(**dict(zip(key_fields + value_fields, (key if isinstance(key, tuple) else (key,)) + values)))
+            for key, values in changed]
+    # bulk_create wants field names ('group', 'item'), the specs use column attnames
+    names = lambda attnames: [model._meta.get_field(f).name for f in attnames]
+    kwargs = {'update_conflicts': True, 'update_fields': names(value_fields)}
+    if connection.features.supports_update_conflicts_with_target:
+        # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+        kwargs['unique_fields'] = names(key_fields)
+    model.objects.bulk_create(objs, batch_size=UPSERT_BATCH, **kwargs)
+
+def _prune(model, key_fields, seen):
+    """
+    Deletes rows whose key no longer exists in the source (--clean).
+    """
+    stale = []
+    if len(key_fields) == 1:
+        for pk in model.objects.values_list(key_fields[0], flat=True).iterator(chunk_size=10000):
+            if pk not in seen: stale.append(pk)
+        lookup = f'{key_fields[0]}__in'
+    else:
+        for pk, item_id, other_id in model.objects.values_list('id', *key_fields).iterator(chunk_size=10000):
+            if (item_id, other_id) not in seen: stale.append(pk)
+        lookup = 'id__in'
+
+    for i in range(0, len(stale), DELETE_BATCH):
+        model.objects.filter(**{lookup: stale[i:i + DELETE_BATCH]}).delete()
+    return len(stale)
+
+class SdeLoader:
+    """
+    Streams SDE tables from a source, diffs every chunk against the DB and only
+    writes new/changed rows. Bumps SDEState.version when anything changed.
+    """
+    def __init__(self, force=False, prune=False, log=None):
+        self.force = force
+        self.prune = prune
+        self.log = log or (lambda msg: logger.info(msg))
+
+    def _context(self):
+        return {
+            'group_ids': set(ItemGroup.objects.values_list('group_id', flat=True)),
+            'attribute_ids': set(AttributeDefinition.objects.values_list('attribute_id', flat=True)),
+            'type_ids': set(ItemType.objects.values_list('type_id', flat=True)),
+        }
+
+    def load_table(self, table, chunks):
+        model, key_fields, value_fields, build_rows = TABLE_SPECS[table]
+        ctx = self._context()
+        seen = set() if self.prune and table in PRUNABLE else None
+        stats = {'rows': 0, 'changed': 0, 'pruned': 0}
+
+        for df in chunks:
+            rows = list(build_rows(df, ctx))
+            stats['rows'] += len(rows)
+            if seen is not None:
+                seen.update(key for key, _ in rows)
+
+            existing = _existing_values(model, key_fields, value_fields, [key for key, _ in rows])
+            changed = [(key, values) for key, values in rows if existing.get(key) != values]
+            if changed:
+                with transaction.atomic():
+                    _upsert(model, key_fields, value_fields, changed)
+                stats['changed'] += len(changed)
+
+            self.log(f"  {table}: {stats['rows']} rows read, {stats['changed']} changed")
+
+        if seen is not None:
+            stats['pruned'] = _prune(model, key_fields, seen)
+        return stats
+
+    def run(self, source, tables=None):
+        state = SDEState.load()
+        summary = {}
+        for table in (tables or SDE_TABLES):
+            previous = {} if self.force else state.tables.get(table, {})
+            self.log(f"Loading {table} from {source.label}...")
+            try:
+                chunks, meta = source.open(table, previous)
+                if chunks is None:
+                    self.log(f"  {table}: unchanged upstream, skipped")
+                    summary[table] = {'skipped': True}
+                    continue
+                stats = self.load_table(table, chunks)
+            except Exception as e:
+                # Metadata is left untouched so the next run retries this table in full
+                logger.error(f"SDE import of {table} failed: {e}")
+                self.log(f"  {table}: FAILED ({e})")
+                summary[table] = {'error': str(e)}
+                continue
+
+            reader = meta.pop('reader', None)
+            state.tables[table] = {
+                **{k: v for k, v in meta.items() if v is not None},
+                'checksum': reader.hexdigest() if reader else meta.get('checksum'),
+                'rows': stats['rows'],
+                'changed': stats['changed'] + stats['pruned'],
+                'imported_at': timezone.now().isoformat()
+            }
+            summary[table] = stats
+
+        state.source = source.label
+        changed = any(s.get('changed') or s.get('pruned') for s in summary.values())
+
+        if any(summary.get(t, {}).get('changed') or summary.get(t, {}).get('pruned') for t in LAYOUT_TABLES):
+            self.log("Rebuilding ship slot layouts...")
+            self.log(f"  {rebuild_slot_layouts()} slot layouts updated")
+        if changed:
+            state.bump()
+        else:
+            state.save()
+        return summary, state.version
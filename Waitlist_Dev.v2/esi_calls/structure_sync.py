@@ -0,0 +1,177 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+
+from esi_calls.esi_network import get_esi_session
+from esi_calls.rate_governor import get_governor
+from esi_calls.token_cache import get_access_token
+
+logger = logging.getLogger(__name__)
+
+ESI_BASE = settings.ESI_BASE_URL
+
+# ESI write concurrency for one sync. Fleet endpoints share a rate-limit group,
+# the governor keeps us inside it.
+SYNC_CONCURRENCY = 4
+
+def plan_structure_sync(current_wings, desired_structure):
+    """
+    Diffs the live fleet against the desired layout (wings/squads matched by position, oldest id first).
+    Returns dependency waves of operations; ops inside a wave are independent.
+      Wave 1: deletes + renames (frees wing/squad slots before anything is created)
+      Wave 2: creates, batched per parent so new ids come back in the desired order
+    Re-planning against a partially synced fleet yields only the remaining work,
+    which is what makes a retried sync resumable.
+    """
+    current_wings = sorted(current_wings, key=lambda w: w['id'])
+    cleanup = []
+    creates = []
+
+    for wing in current_wings[len(desired_structure):]:
+        cleanup.append({'op': 'delete_wing', 'wing_id': wing['id'], 'name': wing.get('name', '')})
+
+    new_wings = desired_structure[len(current_wings):]
+    if new_wings:
+        creates.append({
+            'op': 'create_wings',
+            'names': [w['name'] for w in new_wings],
+            'squads': [w.get('squads', []) for w in new_wings]
+        })
+
+    for wing, desired_wing in zip(current_wings, desired_structure):
+        wing_id = wing['id']
+        desired_squads = desired_wing.get('squads', [])
+
+        if wing.get('name') != desired_wing['name']:
+            cleanup.append({'op': 'rename_wing', 'wing_id': wing_id, 'name': desired_wing['name']})
+
+        current_squads = sorted(wing.get('squads', []), key=lambda s: s['id'])
+        for squad in current_squads[len(desired_squads):]:
+            cleanup.append({'op': 'delete_squad', 'squad_id': squad['id'], 'name': squad.get('name', '')})
+
+        for squad, squad_name in zip(current_squads, desired_squads):
+            if squad.get('name') != squad_name:
+                cleanup.append({'op': 'rename_squad', 'squad_id': squad['id'], 'name': squad_name})
+
+        if len(desired_squads) > len(current_squads):
+            creates.append({'op': 'create_squads', 'wing_id': wing_id, 'names': desired_squads[len(current_squads):]})
+
+    return [wave for wave in (cleanup, creates) if wave]
+
+def count_ops(ops):
+    """
+    Progress units: one per wing/squad touched.
+    """
+    total = 0
+    for op in ops:
+        if op['op'] == 'create_wings':
+            total += len(op['names']) + sum(len(squads) for squads in op['squads'])
+        elif op['op'] == 'create_squads':
+            total += len(op['names'])
+        else:
+            total += 1
+    return total
+
+class StructureSyncExecutor:
+    """
+    Runs a plan concurrently through the fleet rate governor with one pooled session.
+    on_progress(done, total, message) is called after every wing/squad.
+    """
+    def __init__(self, fleet_id, fc_character, on_progress=None):
+        self.fleet_id = fleet_id
+        self.fc_character = fc_character
+        self.on_progress = on_progress
+        self.governor = get_governor('fleet')
+        self.session = get_esi_session()
+        self.done = 0
+        self.total = 0
+        self.logs = []
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def _call(self, method, url, json=None):
+        headers = {'Authorization': f'Bearer {get_access_token(self.fc_character)}'}
+        return self.governor.request(self.session, method, url, headers=headers, json=json)
+
+    def _report(self, ok, message, units=1):
+        with self._lock:
+            self.done += units
+            (self.logs if ok else self.failures).append(message)
+            done, total = self.done, self.total
+        if self.on_progress:
+            self.on_progress(done, total, message if ok else f"Failed: {message}")
+
+    def _rename(self, entity_type, entity_id, name):
+        resp = self._call('PUT', f"{ESI_BASE}/fleets/{self.fleet_id}/{entity_type}/{entity_id}/", json={'name': name})
+        return resp.status_code in (200, 204)
+
+    def _create(self, url, id_field, count):
+        """
+        Sequential POSTs under one parent so ESI hands out ids in our order.
+        """
+        ids = []
+        for _ in range(count):
+            resp = self._call('POST', url)
+            if resp.status_code != 201: break
+            ids.append(resp.json()[id_field])
+        return ids
+
+    def _run_op(self, op):
+        """
+        Executes one op. Returns follow-up ops (squad batches for freshly created wings).
+        """
+        kind = op['op']
+        if kind == 'delete_wing':
+            resp = self._call('DELETE', f"{ESI_BASE}/fleets/{self.fleet_id}/wings/{op['wing_id']}/")
+            self._report(resp.status_code == 204, f"Deleted Wing {op['name']}")
+        elif kind == 'delete_squad':
+            # Squad delete URL is flat: /fleets/{fleet_id}/squads/{squad_id}/
+            resp = self._call('DELETE', f"{ESI_BASE}/fleets/{self.fleet_id}/squads/{op['squad_id']}/")
+            self._report(resp.status_code == 204, f"Deleted Squad {op['name']}")
+        elif kind == 'rename_wing':
+            self._report(self._rename('wings', op['wing_id'], op['name']), f"Renamed Wing {op['wing_id']} -> {op['name']}")
+        elif kind == 'rename_squad':
+            self._report(self._rename('squads', op['squad_id'], op['name']), f"Renamed Squad {op['squad_id']} -> {op['name']}")
+        elif kind == 'create_wings':
+            ids = self._create(f"{ESI_BASE}/fleets/{self.fleet_id}/wings/", 'wing_id', len(op['names']))
+            follow_ups = []
+            for i, name in enumerate(op['names']):
+                if i >= len(ids):
+                    # Squads of a wing that was never created can't run either
+                    self._report(False, f"Create Wing {name}", units=1 + len(op['squads'][i]))
+                    continue
+                self._report(self._rename('wings', ids[i], name), f"Created Wing {name}")
+                if op['squads'][i]:
+                    follow_ups.append({'op': 'create_squads', 'wing_id': ids[i], 'names': op['squads'][i]})
+            return follow_ups
+        elif kind == 'create_squads':
+            ids = self._create(f"{ESI_BASE}/fleets/{self.fleet_id}/wings/{op['wing_id']}/squads/", 'squad_id', len(op['names']))
+            for i, name in enumerate(op['names']):
+                if i >= len(ids):
+                    self._report(False, f"Create Squad {name}")
+                    continue
+                self._report(self._rename('squads', ids[i], name), f"Created Squad {name}")
+        else:
+            raise ValueError(f"Unknown structure op {kind}")
+        return []
+
+    def _safe_run(self, op):
+        try:
+            return self._run_op(op)
+        except Exception as e:
+            logger.error(f"[StructureSync] {op['op']} failed: {e}")
+            with self._lock: self.failures.append(f"{op['op']}: {e}")
+            return []
+
+    def run(self, waves):
+        self.total = sum(count_ops(wave) for wave in waves)
+        try:
+            with ThreadPoolExecutor(max_workers=SYNC_CONCURRENCY) as pool:
+                for wave in waves:
+                    pending = wave
+                    while pending:
+                        pending = [child for children in pool.map(self._safe_run, pending) for child in children]
+        finally:
+            self.session.close()
+        return not self.failures and self.done >= self.total
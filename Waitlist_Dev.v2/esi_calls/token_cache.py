@@ -0,0 +1,63 @@
+import threading
+from datetime import timedelta
+from django.utils import timezone
+
+# In-process cache of decrypted access tokens: character_id -> (access_token, expires)
+# Lets hot paths load EveCharacter with .defer('access_token', 'refresh_token')
+# and skip the Fernet decrypt on every poll. An entry is only served while its expiry matches
+# the row's token_expires (loaded with every character), so a token rewritten or wiped by
+# another process (SSO re-login, wipe_all_characters --tokens-only) is dropped on next use.
+_tokens = {}
+_lock = threading.Lock()
+
+# Treat tokens this close to expiry as gone so a request never leaves with a dying token
+EXPIRY_MARGIN = timedelta(seconds=30)
+
+def store_access_token(character_id, access_token, expires):
+    if not access_token or not expires: return
+    now = timezone.now()
+    with _lock:
+        _tokens[character_id] = (access_token, expires)
+        # Opportunistic prune, keeps the dict bounded to live tokens
+        if len(_tokens) > 512:
+            for cid in [c for c, (_, exp) in _tokens.items() if exp <= now]:
+                del _tokens[cid]
+
+def get_cached_access_token(character_id, expires=None):
+    """
+    expires: the character row's current token_expires; a different value means the
+    cached token was replaced since.
+    """
+    entry = _tokens.get(character_id)
+    if not entry:
+        return None
+    if expires is not None and entry[1] != expires:
+        forget_access_token(character_id)
+        return None
+    if entry[1] > timezone.now() + EXPIRY_MARGIN:
+        return entry[0]
+    return None
+
+def get_access_token(character):
+    """
+    Returns the Bearer token for a character, decrypting at most once per token lifetime per process.
+    Call check_token() first to make sure the token is current.
+    """
+    if not character.token_expires:
+        # Wiped (or never had one)
+        forget_access_token(character.character_id)
+        return character.access_token
+    token = get_cached_access_token(character.character_id, character.token_expires)
+    if token: return token
+
+    token = character.access_token
+    store_access_token(character.character_id, token, character.token_expires)
+    return token
+
+def forget_access_token(character_id):
+    with _lock:
+        _tokens.pop(character_id, None)
+
+def forget_all_access_tokens():
+    with _lock:
+        _tokens.clear()
@@ -3,10 +3,14 @@ import base64
 import os
 from django.utils import timezone
 from django.conf import settings
-from django.core.cache import cache
+from django.db.models import Min
+from core.tiered_cache import TieredCache
 from datetime import timedelta
 from pilot_data.models import EveCharacter, ItemType, CharacterSkill, CharacterQueue, CharacterImplant, CharacterHistory, SkillHistory, EsiHeaderCache
 from esi_calls.esi_network import call_esi
+from esi_calls.token_cache import store_access_token
+from esi_calls.circuit_breaker import esi_request
+from esi_calls.worker_profile import io_stage
 
 # --- QUANTIFIED ESI ENDPOINTS ---
 ENDPOINT_ONLINE = 'online'
@@ -27,77 +31,245 @@ ALL_ENDPOINTS = [
 # List of endpoints that are pointless to check if the user is offline
 SKIP_IF_OFFLINE = [ENDPOINT_SHIP, ENDPOINT_IMPLANTS]
 
+# Circuit breaker route per endpoint (see esi_calls.circuit_breaker.route_key)
+ENDPOINT_ROUTES = {
+    ENDPOINT_ONLINE: 'GET /characters/{id}/online/',
+    ENDPOINT_SKILLS: 'GET /characters/{id}/skills/',
+    ENDPOINT_QUEUE: 'GET /characters/{id}/skillqueue/',
+    ENDPOINT_SHIP: 'GET /characters/{id}/ship/',
+    ENDPOINT_WALLET: 'GET /characters/{id}/wallet/',
+    ENDPOINT_LP: 'GET /characters/{id}/loyalty/points/',
+    ENDPOINT_IMPLANTS: 'GET /characters/{id}/implants/',
+    ENDPOINT_PUBLIC_INFO: 'GET /characters/{id}/',
+    ENDPOINT_HISTORY: 'GET /characters/{id}/corporationhistory/',
+}
+
+# --- EVENT-DRIVEN SKILL REFRESH ---
+# The 'skills' cache row does not follow ESI's 2-minute Expires: it is set to the next
+# skill queue completion (plus a grace for ESI to apply and re-cache it), so the dispatcher
+# wakes it exactly when training lands. Without anything training, skills are only
+# re-checked after an idle interval (the queue keeps being polled and reschedules this).
+SKILL_WAKE_GRACE = timedelta(minutes=3)
+SKILLS_IDLE_REFRESH_ONLINE = timedelta(hours=6)
+SKILLS_IDLE_REFRESH_OFFLINE = timedelta(hours=24)
+
+def next_skill_wakeup(character, now=None):
+    """
+    When the 'skills' endpoint should be refreshed next, from the stored skill queue.
+    """
+    now = now or timezone.now()
+    idle = SKILLS_IDLE_REFRESH_ONLINE if character.is_online else SKILLS_IDLE_REFRESH_OFFLINE
+    next_finish = CharacterQueue.objects.filter(
+        character=character, finish_date__gt=now
+    ).aggregate(next_finish=Min('finish_date'))['next_finish']
+    if next_finish:
+        return min(next_finish + SKILL_WAKE_GRACE, now + idle)
+    return now + idle
+
+def schedule_skill_wakeup(character):
+    EsiHeaderCache.objects.filter(character=character, endpoint_name=ENDPOINT_SKILLS).update(
+        expires=next_skill_wakeup(character)
+    )
+
+# A failed skills refresh pushes the wake-up out instead of leaving the row expired
+# (the dispatcher would re-queue the pilot every minute). Dead tokens need a re-login first.
+SKILL_WAKE_FAILURE_BACKOFF = timedelta(hours=1)
+SKILL_WAKE_TOKEN_BACKOFF = SKILLS_IDLE_REFRESH_OFFLINE
+
+def backoff_skill_wakeup(character, delay=SKILL_WAKE_FAILURE_BACKOFF):
+    EsiHeaderCache.objects.filter(character=character, endpoint_name=ENDPOINT_SKILLS).update(
+        expires=timezone.now() + delay
+    )
+
+# Status flag read on every ESI-heavy path: process LRU for 5s, shared Redis value for 60s
+ESI_STATUS = TieredCache('esi_status', ttl=60, local_ttl=5)
+
 def check_esi_status():
     """
     Checks EVE Online server status via ESI.
-    Returns True if online and accepting requests.
-    Caches result for 60 seconds to prevent spamming the status endpoint.
+    Returns False only when ESI says it is not serving (VIP mode, downtime 503).
+    A slow or unreachable /status/ no longer halts everything: degraded routes are
+    handled per route by the circuit breaker.
+    Caches result for 60 seconds to prevent spamming the status endpoint
+    (single-flight, so one process checks while the rest wait for its answer).
     """
-    # 1. Check Cache
-    status = cache.get('esi_status_flag')
-    if status is not None:
-        return status
+    return ESI_STATUS.get_or_compute('flag', _fetch_esi_status)
 
-    # 2. Check Endpoint
-    url = "https://esi.evetech.net/latest/status/"
+def _fetch_esi_status():
+    url = f"{settings.ESI_BASE_URL}/status/"
     try:
         # Use standard requests (no auth needed) with short timeout
-        resp = requests.get(url, timeout=3)
+        resp = esi_request('GET', url, timeout=3)
         
         if resp.status_code == 200:
             data = resp.json()
             # If VIP is True, the server is in restricted mode (usually dev only or startup)
             if data.get('vip') is True:
                 print("  [ESI Status] VIP Mode Enabled. Halting calls.")
-                is_healthy = False
-            else:
-                is_healthy = True
-        else:
-            print(f"  [ESI Status] Endpoint returned {resp.status_code}. Halting calls.")
-            is_healthy = False
+                return False
+            return True
+        if resp.status_code == 503:
+            # Daily downtime / Tranquility offline
+            print("  [ESI Status] Server unavailable. Halting calls.")
+            return False
+        print(f"  [ESI Status] Endpoint returned {resp.status_code}. Leaving it to the route breakers.")
+        return True
             
     except Exception as e:
-        print(f"  [ESI Status] Connection failed: {e}")
-        is_healthy = False
+        print(f"  [ESI Status] Check failed ({e}). Leaving it to the route breakers.")
+        return True
+
+# --- TOKEN REFRESH TIMING ---
+# Background refresher renews tokens 5-10 minutes ahead of expiry (see scheduler.tasks.refresh_expiring_tokens).
+# Hot paths only refresh inline if a token has actually run out, so they almost never wait on SSO.
+INLINE_REFRESH_MARGIN = timedelta(seconds=30)
+PROACTIVE_LEAD_MIN = timedelta(minutes=5)
+PROACTIVE_LEAD_JITTER = 300 # seconds, spread per character
+
+# Held while a refresh is in flight. Refresh tokens rotate, so two concurrent
+# refreshes for the same character would invalidate one of them.
+TOKEN_LOCK_KEY = 'token_refresh:{character_id}'
+TOKEN_LOCK_TIMEOUT = 60 # covers SSO timeout + session retries
+
+def get_refresh_lead(character_id):
+    """
+    Deterministic per-character lead time so renewals don't bunch up on the same minute.
+    """
+    return PROACTIVE_LEAD_MIN + timedelta(seconds=character_id % PROACTIVE_LEAD_JITTER)
 
-    # 3. Set Cache (Short TTL)
-    cache.set('esi_status_flag', is_healthy, timeout=60)
-    return is_healthy
+# How long an inline caller waits on another worker's in-flight refresh before giving up
+TOKEN_LOCK_WAIT = 15
 
-def check_token(character):
-    if not character.refresh_token: return False
-    if not character.token_expires or character.token_expires <= timezone.now() + timedelta(minutes=5):
+# Fields re-read after winning the lock (another worker may have just rotated them)
+TOKEN_FIELDS = ['access_token', 'refresh_token', 'token_expires', 'has_refresh_token', 'token_status', 'last_refresh_error']
+
+def check_token(character, wait=False):
+    """
+    Makes sure the character has a usable access token, refreshing inline if it ran out.
+    Request paths keep wait=False: while another worker refreshes, they carry on with the
+    current token if it hasn't expired yet instead of blocking on the lock.
+    Celery tasks pass wait=True and queue behind the refresh (up to TOKEN_LOCK_WAIT).
+    """
+    # Indexed mirror, so deferred-token loads don't decrypt here
+    if not character.has_refresh_token: return False
+    if not character.token_expires or character.token_expires <= timezone.now() + INLINE_REFRESH_MARGIN:
         print(f"Refreshing token for {character.character_name}...")
-        return _refresh_access_token(character)
+        return refresh_token_locked(character, wait=wait)
     return True
 
-def _refresh_access_token(character):
-    url = "https://login.eveonline.com/v2/oauth/token"
+def refresh_token_locked(character, session=None, wait=True):
+    """
+    Single-flight token refresh.
+    Only the lock holder talks to SSO. Waiters block (up to TOKEN_LOCK_WAIT) and then
+    reuse whatever the holder saved instead of spending the rotated refresh token again.
+    wait=False (request paths, background refresher) doesn't queue: it re-reads the row and
+    reports whether the token it has (possibly already rotated by the holder) is still alive.
+    Lock outcomes are counted in the 'token_lock' metrics namespace.
+    """
+    from core.redis_client import get_redis_connection
+    from core.metrics import incr
+
+    # The expiry the caller decided on; only a different one means someone else refreshed
+    seen_expires = character.token_expires
+
+    try:
+        lock = get_redis_connection().lock(
+            TOKEN_LOCK_KEY.format(character_id=character.character_id),
+            timeout=TOKEN_LOCK_TIMEOUT
+        )
+        acquired = lock.acquire(blocking=False)
+        if not acquired:
+            incr('token_lock', 'contended')
+            if not wait:
+                incr('token_lock', 'skipped')
+                character.refresh_from_db(fields=TOKEN_FIELDS)
+                return bool(character.has_refresh_token and character.token_expires and character.token_expires > timezone.now())
+            acquired = lock.acquire(blocking=True, blocking_timeout=TOKEN_LOCK_WAIT)
+            if not acquired:
+                incr('token_lock', 'wait_timeout')
+                return False
+            incr('token_lock', 'waited')
+    except Exception as e:
+        # Redis down: better to refresh unguarded than to stop refreshing entirely
+        print(f"  [Token] Lock unavailable for {character.character_name}: {e}")
+        incr('token_lock', 'unguarded')
+        return _refresh_access_token(character, session=session)
+
+    try:
+        # Another holder may have refreshed while we queued (or between our read and the lock).
+        # A still-valid but unchanged expiry is not a refresh: the proactive renewal asks early on purpose.
+        character.refresh_from_db(fields=TOKEN_FIELDS)
+        if (
+            character.token_expires and character.token_expires != seen_expires
+            and character.token_expires > timezone.now() + INLINE_REFRESH_MARGIN
+        ):
+            incr('token_lock', 'reused')
+            store_access_token(character.character_id, character.access_token, character.token_expires)
+            return True
+        if not character.has_refresh_token:
+            return False
+
+        incr('token_lock', 'refreshed')
+        return _refresh_access_token(character, session=session)
+    finally:
+        try: lock.release()
+        except Exception: pass
+
+def _record_token_failure(character, status, reason):
+    """
+    Persists the failure state on the indexed health columns only (no token re-encrypt).
+    """
+    character.token_status = status
+    character.last_refresh_error = reason[:64]
+    EveCharacter.objects.filter(pk=character.pk).update(token_status=status, last_refresh_error=character.last_refresh_error)
+
+def _refresh_access_token(character, session=None):
+    url = f"{settings.EVE_SSO_URL}/v2/oauth/token"
     client_id = settings.EVE_CLIENT_ID
     secret_key = os.getenv('EVE_SECRET_KEY')
     
     if not secret_key:
+        # Config problem, not a character problem - leave token health alone
         print("ERROR: EVE_SECRET_KEY is missing from .env file!")
         return False
     
     try:
-        response = requests.post(
-            url,
-            data={'grant_type': 'refresh_token', 'refresh_token': character.refresh_token},
-            auth=(client_id, secret_key),
-            timeout=10 
-        )
-        if response.status_code != 200: return False
-        response.raise_for_status()
+        with io_stage():
+            response = (session or requests).post(
+                url,
+                data={'grant_type': 'refresh_token', 'refresh_token': character.refresh_token},
+                auth=(client_id, secret_key),
+                timeout=10 
+            )
+        if response.status_code != 200:
+            # SSO answers 400 + invalid_grant when the token was revoked or has expired for good
+            error_code = ""
+            try: error_code = response.json().get('error', '')
+            except ValueError: pass
+            if response.status_code in (400, 401) and error_code:
+                _record_token_failure(character, 'invalid', error_code)
+            else:
+                _record_token_failure(character, 'error', f"http_{response.status_code}")
+            return False
         tokens = response.json()
         
         character.access_token = tokens['access_token']
         character.refresh_token = tokens.get('refresh_token', character.refresh_token) 
         character.token_expires = timezone.now() + timedelta(seconds=tokens['expires_in'])
+        character.token_status = 'valid'
+        character.last_refresh_error = ""
         character.save()
+        store_access_token(character.character_id, character.access_token, character.token_expires)
         return True
+    except requests.exceptions.Timeout:
+        _record_token_failure(character, 'error', "timeout")
+        return False
+    except requests.exceptions.ConnectionError:
+        _record_token_failure(character, 'error', "connection")
+        return False
     except Exception as e:
         print(f"Exception refreshing token: {e}")
+        _record_token_failure(character, 'error', type(e).__name__)
         return False
 
 # UPDATED: Added force_refresh parameter
@@ -105,20 +277,30 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
     """
     Updates character data from ESI.
     """
-    # 1. Global Circuit Breaker (Check Status First)
+    # 1. Server Status (VIP / downtime). Route outages are handled by the circuit breaker in call_esi.
     if not check_esi_status():
         return False
 
-    if not check_token(character): return False
-    base_url = "https://esi.evetech.net/latest/characters/{char_id}"
+    if not check_token(character, wait=True):
+        if target_endpoints is None or ENDPOINT_SKILLS in target_endpoints:
+            backoff_skill_wakeup(character, SKILL_WAKE_TOKEN_BACKOFF)
+        return False
+    base_url = settings.ESI_BASE_URL + "/characters/{char_id}"
     char_id = character.character_id
 
     if target_endpoints is None:
         target_endpoints = list(ALL_ENDPOINTS)
 
+    # Set when fresh skills / queue data arrived, so the skill wake-up gets re-registered
+    reschedule_skills = False
+
     try:
         # --- NEW: Error Handler with Backoff ---
         def check_critical_error(response, endpoint_name):
+            if response.get('circuit_open'):
+                # Route is open for everyone; the dispatcher holds these back until it half-opens,
+                # so no per-character backoff row is needed
+                return True
             if response['status'] >= 500:
                 print(f"  !!! CRITICAL ESI ERROR {response['status']} ({endpoint_name}). Backing off.")
                 
@@ -167,7 +349,7 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
                 if character.alliance_id: names_to_resolve.add(character.alliance_id)
                 
                 try:
-                    name_resp = requests.post("https://esi.evetech.net/latest/universe/names/", json=list(names_to_resolve))
+                    name_resp = esi_request('POST', f"{settings.ESI_BASE_URL}/universe/names/", json=list(names_to_resolve), timeout=10)
                     if name_resp.status_code == 200:
                         for entry in name_resp.json():
                             if entry['id'] == character.corporation_id:
@@ -182,6 +364,10 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
         # --- SKILLS ---
         if ENDPOINT_SKILLS in target_endpoints:
             resp = call_esi(character, ENDPOINT_SKILLS, f"{base_url.format(char_id=char_id)}/skills/", force_refresh=force_refresh)
+            reschedule_skills = resp['status'] in (200, 304)
+            # 5xx gets check_critical_error's short cooldown, an open circuit is held back by the dispatcher
+            if not reschedule_skills and not resp.get('circuit_open') and resp['status'] < 500:
+                backoff_skill_wakeup(character)
             if not check_critical_error(resp, ENDPOINT_SKILLS) and resp['status'] == 200:
                 data = resp['data']
                 character.total_sp = data.get('total_sp', 0)
@@ -222,6 +408,9 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
         # --- SKILL QUEUE ---
         if ENDPOINT_QUEUE in target_endpoints:
             resp = call_esi(character, ENDPOINT_QUEUE, f"{base_url.format(char_id=char_id)}/skillqueue/", force_refresh=force_refresh)
+            # A failed skills call keeps its backoff instead of being pushed out to the next completion
+            if ENDPOINT_SKILLS not in target_endpoints and resp['status'] == 200:
+                reschedule_skills = True
             if not check_critical_error(resp, ENDPOINT_QUEUE) and resp['status'] == 200:
                 CharacterQueue.objects.filter(character=character).delete()
                 new_queue = [
@@ -281,7 +470,7 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
                 corp_names = {}
                 if corp_ids:
                     try:
-                        name_resp = requests.post("https://esi.evetech.net/latest/universe/names/", json=list(corp_ids))
+                        name_resp = esi_request('POST', f"{settings.ESI_BASE_URL}/universe/names/", json=list(corp_ids), timeout=10)
                         if name_resp.status_code == 200:
                             for entry in name_resp.json():
                                 corp_names[entry['id']] = entry['name']
@@ -297,6 +486,9 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
                 ]
                 CharacterHistory.objects.bulk_create(new_history)
 
+        if reschedule_skills:
+            schedule_skill_wakeup(character)
+
         character.last_updated = timezone.now()
         character.save(update_fields=['last_updated'])
 
@@ -304,4 +496,6 @@ def update_character_data(character, target_endpoints=None, force_refresh=False)
 
     except Exception as e:
         print(f"ESI Update Process Error: {e}")
+        if ENDPOINT_SKILLS in target_endpoints and not reschedule_skills:
+            backoff_skill_wakeup(character)
         return False
\ No newline at end of file
@@ -1,179 +1,254 @@
-import requests
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db.models import Max
 from django.utils import timezone
 from dateutil.parser import parse
-from pilot_data.models import SRPConfiguration, CorpWalletJournal
-from esi_calls.esi_network import call_esi
+from pilot_data.models import SRPConfiguration, CorpWalletJournal, EsiHeaderCache, EveCharacter
+from esi_calls.esi_network import get_esi_session, _update_cache_headers
 from esi_calls.token_manager import check_token
+from esi_calls.token_cache import get_access_token
 from esi_calls.fleet_service import resolve_unknown_names
+from esi_calls.rate_governor import get_governor
+from core.srp_rollups import refresh_rollup_days
+# Rule table lives in core.wallet_categories; re-exported here for the sync/import callers
+from core.wallet_categories import determine_auto_category
 
-ESI_BASE = "https://esi.evetech.net/latest"
+logger = logging.getLogger(__name__)
 
-def determine_auto_category(amount, reason, first_party_id, second_party_id, corp_id, ref_type=None):
+ESI_BASE = settings.ESI_BASE_URL
+
+WALLET_DIVISIONS = range(1, 8)
+
+# Journal pages fetched in parallel per division (all divisions share one governor)
+WALLET_PAGE_CONCURRENCY = 4
+
+WALLET_INSERT_BATCH = 500
+
+def wallet_cache_key(corp_id, division):
     """
-    Applies business rules to guess the category.
-    Shared by Sync and Backfill tools.
+    One EsiHeaderCache row per division. Only page 1 carries the ETag we care about:
+    the journal is newest-first, so an unchanged page 1 means nothing new was booked.
     """
-    reason = str(reason or "").lower() # Normalize to lowercase string
-    
-    # 1. Tax / Broker Fees (Check ref_type first as it is most reliable)
-    if ref_type:
-        # Standard ESI ref_types for taxes and fees
-        if ref_type in ['contract_brokers_fee', 'brokers_fee', 'transaction_tax', 'tax']:
-            return 'tax'
-
-    # Fallback text check for broker fees if ref_type wasn't definitive
-    if "broker's fee" in reason or "brokers fee" in reason:
-        return 'tax'
-
-    # 2. Internal Transfer (Corp to Corp)
-    if first_party_id == corp_id and second_party_id == corp_id:
-        return 'internal_transfer'
-
-    # 3. SRP In (Positive Amount)
-    if amount > 0:
-        if "srp" in reason:
-            return 'srp_in'
-        # Multiple of 20,000,000 (Insurance Payouts often look like this or user donations)
-        try:
-            # Use small epsilon for float comparison just in case
-            if abs(float(amount) % 20000000) < 0.1:
-                return 'srp_in'
-        except:
-            pass
+    return f"corp_wallet_{corp_id}_{division}"
 
-    # 4. SRP Out (Negative Amount)
-    if amount < 0:
-        if "srp" in reason:
-            return 'srp_out'
-        if "giveaway" in reason:
-            return 'giveaway'
+def _fetch_page(session, governor, url, token, page, etag=None):
+    headers = {'Authorization': f'Bearer {token}', 'Accept': 'application/json'}
+    if etag:
+        headers['If-None-Match'] = etag
+    return governor.request(session, 'GET', url, params={'page': page}, headers=headers)
 
-    return None
+def _fetch_division(session, governor, corp_id, division, token, etag, high_water):
+    """
+    Pulls every journal page newer than the division's high-water mark.
+    Page 1 goes first (conditional on the ETag, and it tells us X-Pages), the rest
+    are fetched WALLET_PAGE_CONCURRENCY at a time until a page reaches the mark.
+    Runs in a worker thread, so no DB access in here.
+    """
+    url = f"{ESI_BASE}/corporations/{corp_id}/wallets/{division}/journal/"
+    result = {'division': division, 'pages': {}, 'headers': None, 'last_page': None, 'error': None, 'not_modified': False}
+
+    def reaches_mark(rows):
+        # An empty page or one that dips to the stored mark means we have caught up
+        return not rows or (high_water is not None and min(r['id'] for r in rows) <= high_water)
+
+    try:
+        resp = _fetch_page(session, governor, url, token, 1, etag)
+    except Exception as e:
+        result['error'] = f"Div {division}: {e}"
+        return result
+
+    if resp.status_code == 304:
+        result['not_modified'] = True
+        result['headers'] = resp.headers
+        return result
+    if resp.status_code != 200:
+        # 404 = division not in use / no access, same as before
+        if resp.status_code != 404:
+            result['error'] = f"Div {division} Page 1: HTTP {resp.status_code}"
+        return result
+
+    result['headers'] = resp.headers
+    rows = resp.json()
+    result['pages'][1] = rows
+    try:
+        total_pages = int(resp.headers.get('X-Pages', 1))
+    except ValueError:
+        total_pages = 1
+
+    if reaches_mark(rows) or total_pages <= 1:
+        result['last_page'] = 1
+        return result
+
+    def fetch(page):
+        try:
+            r = _fetch_page(session, governor, url, token, page)
+            if r.status_code == 200:
+                return page, r.json(), None
+            return page, None, f"Div {division} Page {page}: HTTP {r.status_code}"
+        except Exception as e:
+            return page, None, f"Div {division} Page {page}: {e}"
+
+    next_page = 2
+    with ThreadPoolExecutor(max_workers=WALLET_PAGE_CONCURRENCY) as pool:
+        while next_page <= total_pages:
+            batch = range(next_page, min(next_page + WALLET_PAGE_CONCURRENCY, total_pages + 1))
+            for page, page_rows, error in pool.map(fetch, batch):
+                if error:
+                    result['error'] = result['error'] or error
+                else:
+                    result['pages'][page] = page_rows
+                    if result['last_page'] is None and reaches_mark(page_rows):
+                        result['last_page'] = page
+            if result['last_page'] or result['error']:
+                break
+            next_page = batch[-1] + 1
+
+    if result['last_page'] is None and not result['error']:
+        result['last_page'] = total_pages
+    return result
+
+def _contiguous_rows(result, high_water):
+    """
+    Rows that are safe to store. With a failed page in the middle we only keep the
+    unbroken run of pages directly above the high-water mark: storing anything newer
+    would move the mark past the gap and the missing page would never be fetched.
+    """
+    last_page = result['last_page']
+    if last_page is None:
+        return []
+    rows = []
+    page = last_page
+    while page >= 1 and page in result['pages']:
+        rows.extend(result['pages'][page])
+        page -= 1
+    if high_water is not None:
+        rows = [r for r in rows if r['id'] > high_water]
+    return rows
 
 def sync_corp_wallet(srp_config):
     """
     Fetches wallet journal for the configured corp/character.
     Designed to be APPEND-ONLY to preserve history beyond ESI's 30-day limit.
+    Divisions are fetched concurrently and each one stops at its stored high-water
+    mark (newest entry_id we hold), so a failed run simply resumes from there.
     """
     character = srp_config.character
-    if not check_token(character):
+    if not check_token(character, wait=True):
         return False, "Token Invalid"
 
     corp_id = character.corporation_id
     if not corp_id:
         return False, "Character has no corporation"
 
-    total_new = 0
-    errors = []
+    high_water = dict(
+        CorpWalletJournal.objects.filter(config=srp_config)
+        .values('division')
+        .annotate(mark=Max('entry_id'))
+        .values_list('division', 'mark')
+    )
+    cache_rows = {
+        row.endpoint_name: row for row in EsiHeaderCache.objects.filter(
+            character=character,
+            endpoint_name__in=[wallet_cache_key(corp_id, d) for d in WALLET_DIVISIONS]
+        )
+    }
+
+    token = get_access_token(character)
+    governor = get_governor('corp_wallet', max_concurrency=8)
+    session = get_esi_session()
+
+    now = timezone.now()
+
+    def run_division(division):
+        cache_row = cache_rows.get(wallet_cache_key(corp_id, division))
+        if cache_row and cache_row.expires and cache_row.expires > now and division in high_water:
+            # ESI would hand back the same cached journal, skip the round trip
+            return {'division': division, 'pages': {}, 'headers': None, 'last_page': None, 'error': None, 'not_modified': True}
+        # Without stored rows the ETag proves nothing, so ask for the full page
+        etag = cache_row.etag if cache_row and division in high_water else None
+        return _fetch_division(session, governor, corp_id, division, token, etag, high_water.get(division))
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(WALLET_DIVISIONS)) as pool:
+            results = list(pool.map(run_division, WALLET_DIVISIONS))
+    finally:
+        session.close()
 
-    # Store the latest ESI date header encountered
+    errors = []
+    new_rows = []
     latest_esi_date = None
 
-    # Iterate divisions 1 through 7
-    for division in range(1, 8):
-        page = 1
-        keep_fetching = True
-        consecutive_full_dupe_pages = 0
-        
-        while keep_fetching:
-            url = f"{ESI_BASE}/corporations/{corp_id}/wallets/{division}/journal/"
-            resp = call_esi(character, f'corp_wallet_{corp_id}_{division}_{page}', url, params={'page': page}, force_refresh=True)
-            
-            if resp['status'] != 200:
-                if resp['status'] != 404: 
-                    errors.append(f"Div {division} Page {page}: {resp.get('error')}")
-                keep_fetching = False
-                continue
-
-            # Capture Date Header for Sync Timestamp
-            if 'headers' in resp:
-                date_header = resp['headers'].get('Date')
-                if date_header:
-                    try:
-                        latest_esi_date = parse(date_header)
-                    except (ValueError, TypeError) as e:
-                        # Log error if date parsing fails but continue
-                        print(f"Warning: Failed to parse Date header '{date_header}': {e}")
-
-            data = resp['data']
-            if not data:
-                keep_fetching = False
-                continue
-
-            batch_ids = [x['id'] for x in data]
-            existing_ids = set(CorpWalletJournal.objects.filter(
-                config=srp_config, 
-                entry_id__in=batch_ids
-            ).values_list('entry_id', flat=True))
-
-            if len(existing_ids) == len(batch_ids):
-                consecutive_full_dupe_pages += 1
-                if consecutive_full_dupe_pages >= 2:
-                    keep_fetching = False
-                    continue
-            else:
-                consecutive_full_dupe_pages = 0
-
-            new_entries = []
-            party_ids_to_resolve = set()
-
-            for row in data:
-                if row['id'] in existing_ids:
-                    continue
-
-                if row.get('first_party_id'): party_ids_to_resolve.add(row['first_party_id'])
-                if row.get('second_party_id'): party_ids_to_resolve.add(row['second_party_id'])
-
-                new_entries.append(row)
-
-            names_map = resolve_unknown_names(list(party_ids_to_resolve))
-
-            db_objects = []
-            for row in new_entries:
-                amount = float(row.get('amount', 0))
-                reason = row.get('reason', '')
-                f_id = row.get('first_party_id')
-                s_id = row.get('second_party_id')
-                ref_type = row.get('ref_type', '')
-
-                # Using shared logic
-                auto_cat = determine_auto_category(amount, reason, f_id, s_id, corp_id, ref_type)
-
-                db_objects.append(CorpWalletJournal(
-                    config=srp_config,
-                    entry_id=row['id'],
-                    amount=amount,
-                    balance=row.get('balance', 0),
-                    context_id=row.get('context_id'),
-                    context_id_type=row.get('context_id_type'),
-                    date=parse(row['date']),
-                    description=row.get('description', ''),
-                    first_party_id=f_id,
-                    second_party_id=s_id,
-                    reason=reason,
-                    ref_type=ref_type,
-                    tax=row.get('tax'),
-                    division=division,
-                    first_party_name=names_map.get(f_id, ''),
-                    second_party_name=names_map.get(s_id, ''),
-                    custom_category=auto_cat
-                ))
-
-            if db_objects:
-                CorpWalletJournal.objects.bulk_create(db_objects, ignore_conflicts=True)
-                total_new += len(db_objects)
-            
-            page += 1
-            if page > 50: keep_fetching = False
-
-    if latest_esi_date:
-        srp_config.last_sync = latest_esi_date
-    else:
-        srp_config.last_sync = timezone.now()
-
-    srp_config.save()
-    
+    for result in results:
+        division = result['division']
+        if result['error']:
+            errors.append(result['error'])
+
+        if result['headers'] is not None:
+            date_header = result['headers'].get('Date')
+            if date_header:
+                try:
+                    esi_date = parse(date_header)
+                    if not latest_esi_date or esi_date > latest_esi_date:
+                        latest_esi_date = esi_date
+                except (ValueError, TypeError) as e:
+                    print(f"Warning: Failed to parse Date header '{date_header}': {e}")
+
+            # Keep the ETag only for a complete pass, otherwise the next run would 304 past the gap
+            if not result['error']:
+                _update_cache_headers(character, wallet_cache_key(corp_id, division), result['headers'])
+
+        for row in _contiguous_rows(result, high_water.get(division)):
+            new_rows.append((division, row))
+
+    # Names: one lookup for the whole run (local characters first, ESI for the rest)
+    party_ids = set()
+    for _, row in new_rows:
+        if row.get('first_party_id'): party_ids.add(row['first_party_id'])
+        if row.get('second_party_id'): party_ids.add(row['second_party_id'])
+    names_map = dict(EveCharacter.objects.filter(character_id__in=party_ids).values_list('character_id', 'character_name'))
+    names_map.update(resolve_unknown_names(list(party_ids)))
+
+    db_objects = []
+    for division, row in new_rows:
+        amount = float(row.get('amount', 0))
+        reason = row.get('reason', '')
+        f_id = row.get('first_party_id')
+        s_id = row.get('second_party_id')
+        ref_type = row.get('ref_type', '')
+
+        # Using shared logic
+        auto_cat = determine_auto_category(amount, reason, f_id, s_id, corp_id, ref_type)
+
+        db_objects.append(CorpWalletJournal(
+            config=srp_config,
+            entry_id=row['id'],
+            amount=amount,
+            balance=row.get('balance', 0),
+            context_id=row.get('context_id'),
+            context_id_type=row.get('context_id_type'),
+            date=parse(row['date']),
+            description=row.get('description', ''),
+            first_party_id=f_id,
+            second_party_id=s_id,
+            reason=reason,
+            ref_type=ref_type,
+            tax=row.get('tax'),
+            division=division,
+            first_party_name=names_map.get(f_id, ''),
+            second_party_name=names_map.get(s_id, ''),
+            custom_category=auto_cat
+        ))
+
+    if db_objects:
+        CorpWalletJournal.objects.bulk_create(db_objects, batch_size=WALLET_INSERT_BATCH, ignore_conflicts=True)
+        refresh_rollup_days(srp_config.id, [obj.date for obj in db_objects])
+
+    srp_config.last_sync = latest_esi_date or timezone.now()
+    srp_config.save(update_fields=['last_sync'])
+
     if errors:
+        logger.warning(f"[SRP] Wallet sync stored {len(db_objects)} entries with errors: {'; '.join(errors)}")
         return False, "; ".join(errors)
-    
-    return True, f"Synced {total_new} entries."
\ No newline at end of file
+
+    return True, f"Synced {len(db_objects)} entries."
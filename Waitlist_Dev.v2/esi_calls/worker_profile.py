@@ -0,0 +1,105 @@
+import logging
+import sys
+import threading
+from contextlib import contextmanager
+from celery.signals import worker_shutting_down, worker_process_shutdown, worker_shutdown
+from django.conf import settings
+from django.db import connection
+
+from esi_calls.http_pool import close_shared_session
+
+logger = logging.getLogger(__name__)
+
+# --- HIGH-CONCURRENCY (GEVENT) WORKER PROFILE ---
+# Run the ESI queues with hundreds of greenlets:
+#   ESI_WORKER_POOL=gevent celery -A waitlist_project worker -P gevent -c 200 -Q esi_critical,esi_normal,esi_background
+# waitlist_project/celery.py monkey-patches before Django loads, so requests / PyMySQL become cooperative.
+#
+# Every greenlet would otherwise hold its own DB connection for the whole task. Instead a task
+# runs inside db_stage(), which takes one of ESI_DB_CONCURRENCY slots, and every ESI round trip
+# runs inside io_stage(), which hands the slot (and closes the connection) back while the
+# greenlet waits on the network. At most ESI_DB_CONCURRENCY connections are open at any time.
+# Under prefork / threads both context managers do nothing.
+
+_local = threading.local() # greenlet-local once patched
+_slots = None
+_slots_lock = threading.Lock()
+
+# Set by the worker_shutting_down signal; refresh tasks that haven't started yet re-queue themselves
+shutting_down = False
+
+def is_green():
+    """
+    True when running under a gevent-patched worker.
+    """
+    if 'gevent' not in sys.modules:
+        return False
+    try:
+        from gevent import monkey
+        return monkey.is_module_patched('socket')
+    except Exception:
+        return False
+
+def _get_slots():
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(getattr(settings, 'ESI_DB_CONCURRENCY', 10))
+    return _slots
+
+@contextmanager
+def db_stage():
+    """
+    Wraps one unit of work (a character refresh). No-op outside gevent, or when nested.
+    """
+    if not is_green() or getattr(_local, 'holding', None) is not None:
+        yield
+        return
+
+    slots = _get_slots()
+    slots.acquire()
+    _local.holding = True
+    try:
+        yield
+    finally:
+        held = _local.holding
+        _local.holding = None
+        connection.close()
+        if held:
+            slots.release()
+
+@contextmanager
+def io_stage():
+    """
+    Wraps a blocking ESI/SSO round trip inside db_stage(): the DB slot is free while we wait.
+    """
+    if not getattr(_local, 'holding', None):
+        yield
+        return
+
+    # Leaving an atomic block's connection would break the transaction, so keep the slot
+    if connection.in_atomic_block:
+        yield
+        return
+
+    connection.close()
+    _local.holding = False
+    _get_slots().release()
+    try:
+        yield
+    finally:
+        _get_slots().acquire()
+        _local.holding = True
+
+def _on_shutting_down(**kwargs):
+    global shutting_down
+    shutting_down = True
+    logger.info("[Worker] Shutdown requested: finishing in-flight ESI tasks, re-queueing the rest.")
+
+def _on_process_shutdown(**kwargs):
+    close_shared_session()
+
+worker_shutting_down.connect(_on_shutting_down, weak=False)
+worker_process_shutdown.connect(_on_process_shutdown, weak=False)
+worker_shutdown.connect(_on_process_shutdown, weak=False)
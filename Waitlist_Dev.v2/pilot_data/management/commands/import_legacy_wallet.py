@@ -1,8 +1,21 @@
 from django.core.management.base import BaseCommand
+from django.core.exceptions import ValidationError
+from django.db import DatabaseError, transaction
 from django.utils import timezone
 from pilot_data.models import CorpWalletJournal, EveCharacter, SRPConfiguration
+from core.srp_rollups import rebuild_rollups
 import datetime
 import os
+import re
+import time
+
+# Rows per existence check / bulk insert transaction
+BATCH_SIZE = 2000
+
+# Bytes read from the dump at a time (the parser keeps its state across reads)
+READ_CHUNK = 1024 * 1024
+
+TUPLE_SPECIALS = re.compile(r"['\",)]")
 
 class Command(BaseCommand):
     help = 'Imports legacy wallet history from SQL dump'
@@ -14,10 +27,17 @@ class Command(BaseCommand):
             action='store_true',
             help='Update division numbers for existing entries based on the SQL file.',
         )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=BATCH_SIZE,
+            help=f'Rows per insert transaction (default {BATCH_SIZE}).',
+        )
 
     def handle(self, *args, **options):
         file_path = options['file_path']
         fix_divisions = options['fix_divisions']
+        batch_size = max(options['batch_size'], 1)
 
         if not os.path.exists(file_path):
             self.stdout.write(self.style.ERROR(f'File not found: {file_path}'))
@@ -30,167 +50,254 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('Error: No SRPConfiguration found in the database.'))
             self.stdout.write(self.style.WARNING('Please create at least one SRP Configuration in the admin panel so these legacy entries can be assigned to it.'))
             return
-            
+
         self.stdout.write(f'Using SRP Configuration: "{default_config}" (ID: {default_config.pk}) for import.')
-        self.stdout.write(f'Reading file: {file_path}...')
+        self.stdout.write(f'Streaming file: {file_path} ({os.path.getsize(file_path) / 1024 / 1024:.1f} MB)...')
+
+        self.stats = {'count': 0, 'skipped': 0, 'updated': 0, 'seen': 0}
+        self.errors_printed = 0
+        started = time.monotonic()
 
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-
-            self.stdout.write('Parsing SQL content...')
-            
-            rows = self.parse_sql_inserts(content)
-            
-            count = 0
-            skipped = 0
-            updated = 0
-            errors_printed = 0
-            
-            # Helper to safely convert numbers that might be 'NULL'
-            def safe_val(val, type_func, default):
-                if val == 'NULL' or val is None:
-                    return default
-                try:
-                    return type_func(val)
-                except (ValueError, TypeError):
-                    return default
-
-            for i, parts in enumerate(rows):
-                try:
-                    # Filter out header rows (like `transaction_id`, `corporation_id`, etc.)
-                    if not parts[0].replace("'", "").replace("`", "").isdigit():
+                batch = []
+                for i, parts in enumerate(self.parse_sql_inserts(f)):
+                    entry = self.build_entry(i, parts, default_config)
+                    if entry is None:
                         continue
+                    batch.append(entry)
 
-                    if len(parts) < 17:
-                        continue
+                    if len(batch) >= batch_size:
+                        self.flush(batch, fix_divisions)
+                        batch = []
+                        self.report_progress(started)
 
-                    entry_id = int(parts[0])
-                    division = safe_val(parts[2], int, 1)
-                    
-                    # Check if exists
-                    existing = CorpWalletJournal.objects.filter(entry_id=entry_id).first()
-                    
-                    if existing:
-                        if fix_divisions:
-                            if existing.division != division:
-                                existing.division = division
-                                existing.save(update_fields=['division'])
-                                updated += 1
-                        skipped += 1
-                        continue
+                if batch:
+                    self.flush(batch, fix_divisions)
 
-                    # Parse Date
-                    date_str = parts[3]
-                    try:
-                        entry_date = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-                        entry_date = timezone.make_aware(entry_date)
-                    except (ValueError, TypeError):
-                        entry_date = timezone.now()
-
-                    first_party_id = safe_val(parts[5], int, 0)
-                    first_party_name = parts[6] if parts[6] != 'NULL' else ''
-                    
-                    # Clean strings
-                    description = parts[16] if parts[16] != 'NULL' else ''
-                    reason = parts[11] if parts[11] != 'NULL' else ''
-
-                    entry = CorpWalletJournal(
-                        entry_id=entry_id,
-                        amount=safe_val(parts[9], float, 0.0),
-                        balance=safe_val(parts[10], float, 0.0),
-                        description=description,
-                        reason=reason,
-                        ref_type=parts[4],
-                        date=entry_date,
-                        first_party_id=first_party_id,
-                        first_party_name=first_party_name,
-                        second_party_id=safe_val(parts[7], int, 0),
-                        second_party_name=parts[8] if parts[8] != 'NULL' else '',
-                        tax=safe_val(parts[13], float, 0.0),
-                        division=division, # Now correctly mapped
-                        config=default_config
-                    )
-                    entry.save()
-                    count += 1
-                    
-                    if count % 1000 == 0:
-                        self.stdout.write(f'Processed {count} entries...')
-
-                except Exception as e:
-                    skipped += 1
-                    if errors_printed < 5:
-                        self.stdout.write(self.style.WARNING(f"Error on row {i+1}: {e}"))
-                        self.stdout.write(f"Row data: {parts}")
-                        errors_printed += 1
-                    continue
-
-            self.stdout.write(self.style.SUCCESS(f'Import Complete: {count} new, {skipped} skipped.'))
+            elapsed = max(time.monotonic() - started, 0.001)
+            self.stdout.write(self.style.SUCCESS(
+                f"Import Complete: {self.stats['count']} new, {self.stats['skipped']} skipped "
+                f"({self.stats['seen'] / elapsed:.0f} rows/s, {elapsed:.1f}s)."
+            ))
             if fix_divisions:
-                self.stdout.write(self.style.SUCCESS(f'Updates: {updated} records corrected.'))
+                self.stdout.write(self.style.SUCCESS(f"Updates: {self.stats['updated']} records corrected."))
+
+            if self.stats['count'] or self.stats['updated']:
+                self.stdout.write('Rebuilding SRP chart rollups...')
+                rebuild_rollups(default_config.id)
 
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'An error occurred: {e}'))
             import traceback
             traceback.print_exc()
 
-    def parse_sql_inserts(self, content):
+    def build_entry(self, i, parts, config):
         """
-        Parses SQL content looking for INSERT INTO ... VALUES (...) tuples.
-        Handles escaped quotes and multiple INSERT statements.
+        One dump tuple -> unsaved, validated CorpWalletJournal (None for header / short / broken rows).
+        Values the database would reject (over-long strings, out of range numbers) are caught here,
+        so a bad row is skipped on its own instead of failing the bulk insert of its batch.
+        """
+        # Helper to safely convert numbers that might be 'NULL'
+        def safe_val(val, type_func, default):
+            if val == 'NULL' or val is None:
+                return default
+            try:
+                return type_func(val)
+            except (ValueError, TypeError):
+                return default
+
+        # Filter out header rows (like `transaction_id`, `corporation_id`, etc.)
+        if not parts or not parts[0].replace("'", "").replace("`", "").isdigit():
+            return None
+
+        if len(parts) < 17:
+            return None
+
+        try:
+            # Parse Date
+            date_str = parts[3]
+            try:
+                entry_date = datetime.datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+                entry_date = timezone.make_aware(entry_date)
+            except (ValueError, TypeError):
+                entry_date = timezone.now()
+
+            # Clean strings
+            description = parts[16] if parts[16] != 'NULL' else ''
+            reason = parts[11] if parts[11] != 'NULL' else ''
+
+            entry = CorpWalletJournal(
+                entry_id=int(parts[0]),
+                amount=safe_val(parts[9], float, 0.0),
+                balance=safe_val(parts[10], float, 0.0),
+                description=description,
+                reason=reason,
+                ref_type=parts[4],
+                date=entry_date,
+                first_party_id=safe_val(parts[5], int, 0),
+                first_party_name=parts[6] if parts[6] != 'NULL' else '',
+                second_party_id=safe_val(parts[7], int, 0),
+                second_party_name=parts[8] if parts[8] != 'NULL' else '',
+                tax=safe_val(parts[13], float, 0.0),
+                division=safe_val(parts[2], int, 1), # Now correctly mapped
+                config=config
+            )
+            # Converts the floats to Decimal and applies the max_length / range / digit checks
+            entry.clean_fields(exclude=['config'])
+            return entry
+        except Exception as e:
+            self.stats['skipped'] += 1
+            self.report_error(f"row {i+1}", e, parts)
+            return None
+
+    def report_error(self, where, error, data):
+        if self.errors_printed < 5:
+            if isinstance(error, ValidationError):
+                error = '; '.join(f"{field}: {' '.join(msgs)}" for field, msgs in error.message_dict.items())
+            self.stdout.write(self.style.WARNING(f"Error on {where}: {error}"))
+            self.stdout.write(f"Row data: {data}")
+            self.errors_printed += 1
+
+    def flush(self, batch, fix_divisions):
+        """
+        One existence query, one bulk INSERT and (with --fix-divisions) one UPDATE
+        per target division, all in a single transaction.
+        """
+        # Last occurrence wins if the dump repeats an id
+        by_id = {entry.entry_id: entry for entry in batch}
+        self.stats['seen'] += len(batch)
+        self.stats['skipped'] += len(batch) - len(by_id)
+
+        existing = dict(CorpWalletJournal.objects.filter(
+            entry_id__in=list(by_id)
+        ).values_list('entry_id', 'division'))
+
+        new_entries = [entry for entry_id, entry in by_id.items() if entry_id not in existing]
+        self.stats['skipped'] += len(existing)
+
+        with transaction.atomic():
+            if new_entries:
+                self.insert(new_entries)
+
+            if fix_divisions:
+                moves = {}
+                for entry_id, division in existing.items():
+                    target = by_id[entry_id].division
+                    if division != target:
+                        moves.setdefault(target, []).append(entry_id)
+                for target, ids in moves.items():
+                    self.stats['updated'] += CorpWalletJournal.objects.filter(entry_id__in=ids).update(division=target)
+
+    def insert(self, entries):
+        """
+        Bulk inserts the batch. Should the database still reject it, falls back to one
+        savepoint per row so only the offending rows are logged and skipped.
+        """
+        try:
+            with transaction.atomic():
+                CorpWalletJournal.objects.bulk_create(entries, ignore_conflicts=True)
+            self.stats['count'] += len(entries)
+            return
+        except DatabaseError:
+            pass
+
+        for entry in entries:
+            try:
+                with transaction.atomic():
+                    CorpWalletJournal.objects.bulk_create([entry], ignore_conflicts=True)
+                self.stats['count'] += 1
+            except DatabaseError as e:
+                self.stats['skipped'] += 1
+                self.report_error(f"entry {entry.entry_id}", e, {
+                    f.attname: getattr(entry, f.attname) for f in entry._meta.concrete_fields if not f.primary_key
+                })
+
+    def report_progress(self, started):
+        elapsed = max(time.monotonic() - started, 0.001)
+        self.stdout.write(
+            f"Processed {self.stats['seen']} rows ({self.stats['count']} new, "
+            f"{self.stats['skipped']} skipped) - {self.stats['seen'] / elapsed:.0f} rows/s"
+        )
+
+    def parse_sql_inserts(self, f):
+        """
+        Streams INSERT INTO ... VALUES (...) tuples out of an open SQL file.
+        Handles escaped quotes and multiple INSERT statements; the tokenizer state
+        survives chunk boundaries, so memory use is independent of the dump size.
         Yields a list of values for each valid row found.
         """
-        length = len(content)
-        idx = 0
-        
         # State Machine constants
         STATE_SCAN = 0
         STATE_IN_TUPLE = 1
         STATE_IN_STRING = 2
-        
+
         state = STATE_SCAN
         quote_char = None
         escaped = False
-        
+
         current_row = []
         current_val = []
-        
-        while idx < length:
-            char = content[idx]
-            
-            if state == STATE_SCAN:
-                if char == '(':
+
+        while True:
+            content = f.read(READ_CHUNK)
+            if not content:
+                break
+
+            idx = 0
+            length = len(content)
+            while idx < length:
+                if state == STATE_SCAN:
+                    start = content.find('(', idx)
+                    if start < 0:
+                        break
                     state = STATE_IN_TUPLE
                     current_row = []
                     current_val = []
-            
-            elif state == STATE_IN_TUPLE:
-                if char == "'" or char == '"':
-                    state = STATE_IN_STRING
-                    quote_char = char
-                elif char == ',' and not escaped:
-                    val = "".join(current_val).strip()
-                    current_row.append(val)
-                    current_val = []
-                elif char == ')' and not escaped:
-                    val = "".join(current_val).strip()
-                    if val:
-                        current_row.append(val)
-                    yield current_row
-                    state = STATE_SCAN
-                else:
-                    current_val.append(char)
-            
-            elif state == STATE_IN_STRING:
-                if escaped:
-                    current_val.append(char)
-                    escaped = False
-                elif char == '\\':
-                    escaped = True
-                elif char == quote_char:
-                    state = STATE_IN_TUPLE
-                    quote_char = None
-                else:
-                    current_val.append(char)
-            
-            idx += 1
\ No newline at end of file
+                    idx = start + 1
+
+                elif state == STATE_IN_TUPLE:
+                    match = TUPLE_SPECIALS.search(content, idx)
+                    if not match:
+                        current_val.append(content[idx:])
+                        break
+                    current_val.append(content[idx:match.start()])
+                    char = match.group()
+                    idx = match.end()
+
+                    if char == "'" or char == '"':
+                        state = STATE_IN_STRING
+                        quote_char = char
+                    elif char == ',':
+                        current_row.append("".join(current_val).strip())
+                        current_val = []
+                    else: # ')'
+                        val = "".join(current_val).strip()
+                        if val:
+                            current_row.append(val)
+                        yield current_row
+                        state = STATE_SCAN
+
+                else: # STATE_IN_STRING
+                    if escaped:
+                        current_val.append(content[idx])
+                        escaped = False
+                        idx += 1
+                        continue
+
+                    # Jump to the next backslash or closing quote
+                    next_escape = content.find('\\', idx)
+                    next_quote = content.find(quote_char, idx)
+                    stops = [pos for pos in (next_escape, next_quote) if pos >= 0]
+                    if not stops:
+                        current_val.append(content[idx:])
+                        break
+                    stop = min(stops)
+                    current_val.append(content[idx:stop])
+                    idx = stop + 1
+
+                    if stop == next_escape:
+                        escaped = True
+                    else:
+                        state = STATE_IN_TUPLE
+                        quote_char = None
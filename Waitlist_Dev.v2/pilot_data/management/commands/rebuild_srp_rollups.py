@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from dateutil.parser import parse
+from core.srp_rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    help = 'Recomputes the SRP dashboard rollup tables from the wallet journal.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', type=str, help='Only rebuild from this day (YYYY-MM-DD) onwards.')
+
+    def handle(self, *args, **options):
+        first_day = parse(options['since']).date() if options['since'] else None
+
+        self.stdout.write("Rebuilding SRP rollups...")
+        buckets = rebuild_rollups(first_day=first_day)
+        self.stdout.write(self.style.SUCCESS(f"Complete. Wrote {buckets} daily buckets."))
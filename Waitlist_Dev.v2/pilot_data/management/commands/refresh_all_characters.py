@@ -1,7 +1,8 @@
 import time
 from django.core.management.base import BaseCommand
 from pilot_data.models import EveCharacter
-from scheduler.tasks import refresh_character_task
+from scheduler.tasks import queue_refresh
+from scheduler.priorities import TIER_BACKGROUND
 
 class Command(BaseCommand):
     help = 'Queues a background refresh for ALL characters in the database.'
@@ -68,4 +69,5 @@ class Command(BaseCommand):
 
     def _process_batch(self, batch):
         for char_id in batch:
-            refresh_character_task.delay(char_id)
\ No newline at end of file
+            # Background tier, so a full re-sync never delays waitlisted pilots
+            queue_refresh(char_id, tier=TIER_BACKGROUND)
\ No newline at end of file
@@ -1,5 +1,7 @@
 ﻿from django.core.management.base import BaseCommand
 from django.db import connection, transaction
+from pilot_data.models import EveCharacter
+from esi_calls.token_cache import forget_all_access_tokens
 
 class Command(BaseCommand):
     help = 'FACTORY RESET: Wipes Characters, Users, Fleets, and all related data via Raw SQL.'
@@ -10,8 +12,16 @@ class Command(BaseCommand):
             action='store_true',
             help='Skip the confirmation prompt',
         )
+        parser.add_argument(
+            '--tokens-only',
+            action='store_true',
+            help='Only clear stored ESI tokens (e.g. after rotating SECRET_KEY). Keeps users and characters.',
+        )
 
     def handle(self, *args, **options):
+        if options['tokens_only']:
+            return self.wipe_tokens(options['force'])
+
         # Safety Confirmation
         if not options['force']:
             self.stdout.write(self.style.WARNING(
@@ -66,4 +76,24 @@ class Command(BaseCommand):
                 # 2. Re-enable Foreign Key Checks
                 cursor.execute("SET FOREIGN_KEY_CHECKS = 1;")
 
-        self.stdout.write(self.style.SUCCESS("SUCCESS: Factory Reset Complete. Database is clean."))
\ No newline at end of file
+        self.stdout.write(self.style.SUCCESS("SUCCESS: Factory Reset Complete. Database is clean."))
+
+    def wipe_tokens(self, force):
+        if not force:
+            confirm = input("Clear ESI tokens for ALL characters? Everyone will need to re-login. [y/N]: ")
+            if confirm.lower() != 'y':
+                self.stdout.write(self.style.ERROR("Operation cancelled."))
+                return
+
+        # Plain UPDATE (no decrypt) - health columns are reset alongside so counts stay correct
+        count = EveCharacter.objects.update(
+            access_token="",
+            refresh_token="",
+            token_expires=None,
+            has_refresh_token=False,
+            token_status='missing',
+            last_refresh_error="wiped"
+        )
+        # Running processes drop their cached copies on next use (token_expires no longer matches)
+        forget_all_access_tokens()
+        self.stdout.write(self.style.SUCCESS(f"SUCCESS: Cleared tokens for {count} characters."))
@@ -0,0 +1,47 @@
+# Generated by Django 5.0 on 2026-10-18 22:34
+
+from django.db import migrations, models
+
+
+def backfill_has_refresh_token(apps, schema_editor):
+    """
+    One-off decrypt pass so the flag matches existing data.
+    Rows that can no longer be decrypted (rotated SECRET_KEY) count as missing.
+    """
+    from cryptography.fernet import InvalidToken
+
+    EveCharacter = apps.get_model('pilot_data', 'EveCharacter')
+
+    pks = list(EveCharacter.objects.values_list('pk', flat=True))
+    with_token = []
+    for i in range(0, len(pks), 500):
+        chunk = pks[i:i + 500]
+        try:
+            rows = list(EveCharacter.objects.filter(pk__in=chunk).values_list('pk', 'refresh_token'))
+        except InvalidToken:
+            # One bad row poisons the whole chunk, so retry it row by row
+            rows = []
+            for pk in chunk:
+                try:
+                    rows.extend(EveCharacter.objects.filter(pk=pk).values_list('pk', 'refresh_token'))
+                except InvalidToken:
+                    pass
+        with_token.extend(pk for pk, token in rows if token)
+
+    for i in range(0, len(with_token), 1000):
+        EveCharacter.objects.filter(pk__in=with_token[i:i + 1000]).update(has_refresh_token=True)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0018_corpwalletjournal_custom_category_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evecharacter',
+            name='has_refresh_token',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.RunPython(backfill_has_refresh_token, migrations.RunPython.noop),
+    ]
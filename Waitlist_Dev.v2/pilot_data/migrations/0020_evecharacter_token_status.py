@@ -0,0 +1,30 @@
+# Generated by Django 5.0 on 2026-10-18 22:37
+
+from django.db import migrations, models
+
+
+def seed_token_status(apps, schema_editor):
+    # Anything holding a refresh token is presumed valid until the next refresh says otherwise
+    EveCharacter = apps.get_model('pilot_data', 'EveCharacter')
+    EveCharacter.objects.filter(has_refresh_token=True).update(token_status='valid')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0019_evecharacter_has_refresh_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='evecharacter',
+            name='last_refresh_error',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='evecharacter',
+            name='token_status',
+            field=models.CharField(choices=[('valid', 'Valid'), ('missing', 'Missing'), ('invalid', 'Revoked / Invalid'), ('error', 'Refresh Error')], db_index=True, default='missing', max_length=16),
+        ),
+        migrations.RunPython(seed_token_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.0 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+
+def drop_per_page_wallet_headers(apps, schema_editor):
+    # Old sync kept one header row per journal page (corp_wallet_{corp}_{div}_{page})
+    EsiHeaderCache = apps.get_model('pilot_data', 'EsiHeaderCache')
+    EsiHeaderCache.objects.filter(endpoint_name__regex=r'^corp_wallet_\d+_\d+_\d+$').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0020_evecharacter_token_status'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='corpwalletjournal',
+            index=models.Index(fields=['config', 'division', 'entry_id'], name='pilot_data__config__1c888a_idx'),
+        ),
+        migrations.RunPython(drop_per_page_wallet_headers, migrations.RunPython.noop),
+    ]
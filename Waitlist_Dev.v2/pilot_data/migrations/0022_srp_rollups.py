@@ -0,0 +1,60 @@
+# Generated by Django 5.0 on 2026-10-18 22:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    from core.srp_rollups import rebuild_rollups
+    rebuild_rollups(models=(
+        apps.get_model('pilot_data', 'CorpWalletJournal'),
+        apps.get_model('pilot_data', 'SRPDailyRollup'),
+        apps.get_model('pilot_data', 'SRPPayerDailyRollup'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0021_corpwalletjournal_sync_mark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SRPDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('division', models.IntegerField()),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('ref_type', models.CharField(max_length=50)),
+                ('income', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('outcome', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('count_in', models.IntegerField(default=0)),
+                ('count_out', models.IntegerField(default=0)),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='pilot_data.srpconfiguration')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['config', 'day'], name='pilot_data__config__f53710_idx')],
+                'unique_together': {('config', 'day', 'division', 'category', 'ref_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='SRPPayerDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('division', models.IntegerField()),
+                ('category', models.CharField(blank=True, max_length=50)),
+                ('payer_name', models.CharField(blank=True, max_length=255)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('count', models.IntegerField(default=0)),
+                ('config', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='payer_rollups', to='pilot_data.srpconfiguration')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['config', 'day'], name='pilot_data__config__7471e9_idx')],
+                'unique_together': {('config', 'day', 'division', 'category', 'payer_name')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
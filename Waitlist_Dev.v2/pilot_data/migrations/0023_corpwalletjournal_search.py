@@ -0,0 +1,38 @@
+# Generated by Django 5.0 on 2026-10-18 22:54
+
+from django.db import migrations, models
+
+# One FULLTEXT index per searchable column (MATCH needs the exact column list of an index)
+FULLTEXT_COLUMNS = ('first_party_name', 'second_party_name', 'reason')
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    # InnoDB FULLTEXT only; SQLite dev databases keep plain icontains searches
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for column in FULLTEXT_COLUMNS:
+        schema_editor.execute(
+            f"CREATE FULLTEXT INDEX srp_journal_ft_{column} ON pilot_data_corpwalletjournal ({column})"
+        )
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    for column in FULLTEXT_COLUMNS:
+        schema_editor.execute(f"DROP INDEX srp_journal_ft_{column} ON pilot_data_corpwalletjournal")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0022_srp_rollups'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='corpwalletjournal',
+            index=models.Index(fields=['config', 'date', 'entry_id'], name='pilot_data__config__771666_idx'),
+        ),
+        migrations.RunPython(add_fulltext_indexes, drop_fulltext_indexes),
+    ]
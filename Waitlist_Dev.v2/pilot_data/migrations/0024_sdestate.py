@@ -0,0 +1,23 @@
+# Generated by Django 5.0 on 2026-10-18 23:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0023_corpwalletjournal_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SDEState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.IntegerField(default=0)),
+                ('source', models.CharField(blank=True, max_length=255)),
+                ('tables', models.JSONField(blank=True, default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
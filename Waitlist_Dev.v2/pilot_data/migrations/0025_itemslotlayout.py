@@ -0,0 +1,36 @@
+# Generated by Django 5.0 on 2026-10-18 23:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_layouts(apps, schema_editor):
+    from core.slot_layout import rebuild_slot_layouts
+    rebuild_slot_layouts(models=(
+        apps.get_model('pilot_data', 'ItemType'),
+        apps.get_model('pilot_data', 'TypeAttribute'),
+        apps.get_model('pilot_data', 'TypeEffect'),
+        apps.get_model('pilot_data', 'ItemSlotLayout'),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('pilot_data', '0024_sdestate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemSlotLayout',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='slot_layout', serialize=False, to='pilot_data.itemtype')),
+                ('slot_kind', models.CharField(default='cargo', max_length=10)),
+                ('high_slots', models.IntegerField(default=0)),
+                ('mid_slots', models.IntegerField(default=0)),
+                ('low_slots', models.IntegerField(default=0)),
+                ('rig_slots', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(build_layouts, migrations.RunPython.noop),
+    ]
@@ -31,10 +31,40 @@ class EveCharacter(models.Model):
     # Encrypted Fields
     access_token = EncryptedTextField(blank=True, default="")
     refresh_token = EncryptedTextField(blank=True, default="")
+
+    # Indexed token health (mirrors the encrypted fields so health counts never decrypt)
+    has_refresh_token = models.BooleanField(default=False, db_index=True)
+    token_status = models.CharField(
+        max_length=16,
+        choices=[
+            ('valid', 'Valid'),
+            ('missing', 'Missing'),
+            ('invalid', 'Revoked / Invalid'),
+            ('error', 'Refresh Error')
+        ],
+        default='missing',
+        db_index=True
+    )
+    # Short reason code from the last failed refresh, e.g. "invalid_grant", "http_502", "timeout"
+    last_refresh_error = models.CharField(max_length=64, blank=True, default="", db_index=True)
     
     token_expires = models.DateTimeField(null=True, blank=True)
     last_updated = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        # Keep the indexed flag in step with the encrypted token on every save path
+        # (skipped when the token was deferred, reading it would cost a query + decrypt)
+        if 'refresh_token' not in self.get_deferred_fields():
+            self.has_refresh_token = bool(self.refresh_token)
+            if not self.has_refresh_token:
+                self.token_status = 'missing'
+            elif self.token_status == 'missing':
+                self.token_status = 'valid'
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'refresh_token' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'has_refresh_token', 'token_status'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.character_name} ({self.character_id})"
 
@@ -119,17 +149,24 @@ class ItemType(models.Model):
         except TypeAttribute.DoesNotExist:
             return 0
 
+    def _slot_count(self, key, attr_id):
+        # Precomputed layout (one cached query for all four counts), raw attribute as fallback
+        try:
+            return getattr(self.slot_layout, f'{key}_slots')
+        except ItemSlotLayout.DoesNotExist:
+            return int(self.get_attribute(attr_id))
+
     @property
-    def high_slots(self): return int(self.get_attribute(14))
+    def high_slots(self): return self._slot_count('high', 14)
     
     @property
-    def mid_slots(self): return int(self.get_attribute(13))
+    def mid_slots(self): return self._slot_count('mid', 13)
     
     @property
-    def low_slots(self): return int(self.get_attribute(12))
+    def low_slots(self): return self._slot_count('low', 12)
 
     @property
-    def rig_slots(self): return int(self.get_attribute(1137))
+    def rig_slots(self): return self._slot_count('rig', 1137)
 
 class TypeAttribute(models.Model):
     """
@@ -166,6 +203,59 @@ class TypeEffect(models.Model):
     def __str__(self):
         return f"Item {self.item.type_id} - Effect {self.effect_id}"
 
+class ItemSlotLayout(models.Model):
+    """
+    Denormalized slot data per ItemType, rebuilt at SDE import (core.slot_layout).
+    slot_kind is where the item itself is fitted; the counts are the slots it provides
+    (hull slots, or the slots a T3 subsystem adds).
+    """
+    item = models.OneToOneField(ItemType, on_delete=models.CASCADE, primary_key=True, related_name='slot_layout')
+    slot_kind = models.CharField(max_length=10, default='cargo')
+    high_slots = models.IntegerField(default=0)
+    mid_slots = models.IntegerField(default=0)
+    low_slots = models.IntegerField(default=0)
+    rig_slots = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Item {self.item_id} - {self.slot_kind} ({self.high_slots}/{self.mid_slots}/{self.low_slots}/{self.rig_slots})"
+
+class SDEState(models.Model):
+    """
+    Singleton (pk=1) tracking the imported SDE. `version` is bumped whenever an
+    import changes any row, so caches derived from the SDE can key on it.
+    `tables` keeps per-table import metadata: {name: {etag, checksum, rows, changed, imported_at}}.
+    """
+    version = models.IntegerField(default=0)
+    source = models.CharField(max_length=255, blank=True)
+    tables = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    CACHE_KEY = 'sde_version'
+
+    @classmethod
+    def load(cls):
+        state, _ = cls.objects.get_or_create(pk=1)
+        return state
+
+    @classmethod
+    def current_version(cls):
+        from django.core.cache import cache
+        version = cache.get(cls.CACHE_KEY)
+        if version is None:
+            version = cls.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+            cache.set(cls.CACHE_KEY, version, timeout=60)
+        return version
+
+    def bump(self):
+        from django.core.cache import cache
+        self.version += 1
+        self.save()
+        cache.set(self.CACHE_KEY, self.version, timeout=60)
+        return self.version
+
+    def __str__(self):
+        return f"SDE v{self.version}"
+
 # --- FIT ANALYSIS MODELS ---
 
 class AttributeDefinition(models.Model):
@@ -253,4 +343,47 @@ class CorpWalletJournal(models.Model):
             models.Index(fields=['date', 'division']),
             models.Index(fields=['ref_type']),
             models.Index(fields=['custom_category']), # Index for analytics
-        ]
\ No newline at end of file
+            models.Index(fields=['config', 'division', 'entry_id']), # Wallet sync high-water mark
+            models.Index(fields=['config', 'date', 'entry_id']), # Keyset pagination of the SRP table
+        ]
+
+class SRPDailyRollup(models.Model):
+    """
+    Journal totals per day x division x category x ref_type (maintained by core.srp_rollups).
+    Feeds the SRP dashboard charts without scanning the raw journal.
+    """
+    config = models.ForeignKey(SRPConfiguration, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    division = models.IntegerField()
+    category = models.CharField(max_length=50, blank=True) # '' = uncategorised
+    ref_type = models.CharField(max_length=50)
+
+    income = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    outcome = models.DecimalField(max_digits=20, decimal_places=2, default=0) # Sum of negative amounts
+    count_in = models.IntegerField(default=0)
+    count_out = models.IntegerField(default=0) # Includes zero-amount entries, like the charts always did
+
+    class Meta:
+        unique_together = ('config', 'day', 'division', 'category', 'ref_type')
+        indexes = [
+            models.Index(fields=['config', 'day']),
+        ]
+
+class SRPPayerDailyRollup(models.Model):
+    """
+    Incoming player donations per day x payer (maintained by core.srp_rollups).
+    """
+    config = models.ForeignKey(SRPConfiguration, on_delete=models.CASCADE, related_name='payer_rollups')
+    day = models.DateField()
+    division = models.IntegerField()
+    category = models.CharField(max_length=50, blank=True)
+    payer_name = models.CharField(max_length=255, blank=True)
+
+    total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('config', 'day', 'division', 'category', 'payer_name')
+        indexes = [
+            models.Index(fields=['config', 'day']),
+        ]
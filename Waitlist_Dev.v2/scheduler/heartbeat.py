@@ -0,0 +1,59 @@
+from datetime import timedelta
+from django.db.models import F, IntegerField, ExpressionWrapper
+
+from pilot_data.models import EveCharacter
+
+# --- DAILY HEARTBEAT PHASES ---
+# Every character gets a fixed minute of the day, derived from a hash of its character_id,
+# and its heartbeat only fires in that slot. last_updated clusters around whenever the
+# safety net or refresh_all_characters last ran; the phase does not, so the load stays flat.
+
+HEARTBEAT_ENDPOINTS = ['skills', 'queue', 'history', 'public_info']
+
+DAY_MINUTES = 24 * 60
+
+# Knuth multiplicative hash (mod 2^32). character_id * multiplier stays inside a signed
+# 64-bit integer, so the same formula runs in SQL (MySQL / SQLite) and in Python.
+PHASE_MULTIPLIER = 2654435761
+PHASE_MODULUS = 2 ** 32
+
+# A slot that passed while the dispatcher was down / held back is still picked up this long after
+HEARTBEAT_CATCHUP = 60 # minutes
+
+# Characters refreshed more recently than this (e.g. while online) skip today's slot
+HEARTBEAT_MIN_AGE = timedelta(hours=12)
+
+def heartbeat_phase(character_id):
+    """
+    Minute of the day (UTC, 0-1439) this character's heartbeat runs in.
+    """
+    return (character_id * PHASE_MULTIPLIER) % PHASE_MODULUS % DAY_MINUTES
+
+def phase_expression():
+    """
+    heartbeat_phase() as a database expression, for .annotate().
+    Uses the % operator rather than Mod(), which goes through floats on SQLite and loses precision.
+    """
+    return ExpressionWrapper(
+        F('character_id') * PHASE_MULTIPLIER % PHASE_MODULUS % DAY_MINUTES,
+        output_field=IntegerField()
+    )
+
+def minute_of_day(dt):
+    return dt.hour * 60 + dt.minute
+
+def due_phases(now, catchup=HEARTBEAT_CATCHUP):
+    """
+    Phase minutes whose slot fell within the last `catchup` minutes (wraps over midnight).
+    """
+    current = minute_of_day(now)
+    return [(current - offset) % DAY_MINUTES for offset in range(catchup + 1)]
+
+def due_heartbeat_characters(now):
+    """
+    Offline characters whose phase slot just passed and that haven't been refreshed since.
+    """
+    return EveCharacter.objects.filter(
+        is_online=False,
+        last_updated__lt=now - HEARTBEAT_MIN_AGE
+    ).annotate(heartbeat_phase=phase_expression()).filter(heartbeat_phase__in=due_phases(now))
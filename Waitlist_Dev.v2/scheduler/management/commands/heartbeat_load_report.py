@@ -0,0 +1,68 @@
+import statistics
+from django.core.management.base import BaseCommand
+from pilot_data.models import EveCharacter
+from scheduler.heartbeat import heartbeat_phase, minute_of_day, DAY_MINUTES
+
+BAR_WIDTH = 40
+
+class Command(BaseCommand):
+    help = 'Shows the daily heartbeat load shape (tasks per minute) under the phased schedule vs. the old last_updated + 24h one.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--bucket',
+            type=int,
+            default=60,
+            help='Histogram bucket size in minutes (Default: 60)'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Include online characters too (default: offline only, the heartbeat population)'
+        )
+
+    def handle(self, *args, **options):
+        bucket = max(1, min(options['bucket'], DAY_MINUTES))
+
+        qs = EveCharacter.objects.all() if options['all'] else EveCharacter.objects.filter(is_online=False)
+        phased = [0] * DAY_MINUTES
+        legacy = [0] * DAY_MINUTES
+        total = 0
+        for char_id, last_updated in qs.values_list('character_id', 'last_updated').iterator(chunk_size=2000):
+            total += 1
+            phased[heartbeat_phase(char_id)] += 1
+            # Old rule: due 24h after the last update, i.e. the same minute of day
+            if last_updated:
+                legacy[minute_of_day(last_updated)] += 1
+
+        if not total:
+            self.stdout.write(self.style.WARNING("No characters found."))
+            return
+
+        self.stdout.write(self.style.HTTP_INFO(f"Heartbeat population: {total} characters, {bucket}-minute buckets (UTC)"))
+        self._summary('Phased', phased)
+        self._summary('Legacy', legacy)
+        self.stdout.write("")
+
+        phased_buckets = self._bucketize(phased, bucket)
+        legacy_buckets = self._bucketize(legacy, bucket)
+        peak = max(max(phased_buckets), max(legacy_buckets)) or 1
+
+        self.stdout.write(f"{'Window':<13} {'Phased':>7} {'':<{BAR_WIDTH}} {'Legacy':>7}")
+        for i, (p, l) in enumerate(zip(phased_buckets, legacy_buckets)):
+            start = i * bucket
+            label = f"{start // 60:02d}:{start % 60:02d}"
+            bar = '#' * round(p / peak * BAR_WIDTH)
+            self.stdout.write(f"{label:<13} {p:>7} {bar:<{BAR_WIDTH}} {l:>7}")
+
+    def _bucketize(self, per_minute, bucket):
+        return [sum(per_minute[i:i + bucket]) for i in range(0, DAY_MINUTES, bucket)]
+
+    def _summary(self, label, per_minute):
+        mean = statistics.mean(per_minute)
+        peak = max(per_minute)
+        stdev = statistics.pstdev(per_minute)
+        ratio = peak / mean if mean else 0
+        self.stdout.write(
+            f"  {label:<7} tasks/min: mean {mean:.2f}, peak {peak}, stdev {stdev:.2f}, peak/mean {ratio:.1f}x"
+        )
@@ -0,0 +1,42 @@
+from pilot_data.models import EveCharacter
+
+# --- REFRESH PRIORITY TIERS ---
+# critical:   x'd up on an active fleet's waitlist, or in a fleet right now (FC view, check_pilot_skills)
+# normal:     everyone else the dispatcher finds with expired ESI caches
+# background: daily heartbeat and bulk re-syncs
+# Each tier has its own Celery task (own rate_limit) routed to its own queue, see
+# settings.CELERY_TASK_ROUTES, so a heartbeat backlog never sits in front of a form-up.
+TIER_CRITICAL = 'critical'
+TIER_NORMAL = 'normal'
+TIER_BACKGROUND = 'background'
+
+TIER_QUEUES = {
+    TIER_CRITICAL: 'esi_critical',
+    TIER_NORMAL: 'esi_normal',
+    TIER_BACKGROUND: 'esi_background',
+}
+
+# Waitlist states where the FC still looks at the pilot's data
+ACTIVE_ENTRY_STATUSES = ['pending', 'approved', 'invited']
+
+# Fleet audit log actions that put a pilot in the fleet
+IN_FLEET_ACTIONS = ['esi_join', 'ship_change']
+
+def critical_character_ids():
+    """
+    Characters on an active fleet's waitlist or inside an active fleet.
+    An open CharacterStats session alone is not enough: it only counts when the pilot joined a
+    fleet that is still active (sessions left open by a crashed audit would otherwise stay critical).
+    Two queries unioned here: OR-ing both to-many paths in one filter() would LEFT JOIN
+    waitlist entries x fleet history per pilot.
+    """
+    waitlisted = EveCharacter.objects.filter(
+        waitlist_entries__fleet__is_active=True,
+        waitlist_entries__status__in=ACTIVE_ENTRY_STATUSES
+    ).values_list('character_id', flat=True).distinct()
+    in_fleet = EveCharacter.objects.filter(
+        stats__active_session_start__isnull=False,
+        fleet_history__fleet__is_active=True,
+        fleet_history__action__in=IN_FLEET_ACTIONS
+    ).values_list('character_id', flat=True).distinct()
+    return set(waitlisted) | set(in_fleet)
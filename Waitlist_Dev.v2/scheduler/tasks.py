@@ -6,7 +6,11 @@ import logging
 
 # Models
 from pilot_data.models import EveCharacter, EsiHeaderCache, SRPConfiguration
-from esi_calls.token_manager import update_character_data
+from esi_calls.token_manager import update_character_data, refresh_token_locked, get_refresh_lead, PROACTIVE_LEAD_MIN, PROACTIVE_LEAD_JITTER, ENDPOINT_ROUTES, ENDPOINT_SKILLS, ENDPOINT_QUEUE
+from esi_calls import circuit_breaker, worker_profile
+from scheduler.priorities import critical_character_ids, TIER_CRITICAL, TIER_NORMAL, TIER_BACKGROUND
+from scheduler.heartbeat import due_heartbeat_characters, HEARTBEAT_ENDPOINTS
+from esi_calls.esi_network import get_esi_session
 from esi_calls.wallet_service import sync_corp_wallet
 
 logger = logging.getLogger(__name__)
@@ -21,8 +25,28 @@ def dispatch_stale_characters():
     processed_ids = set() # Track characters we have already queued
     
     OFFLINE_THROTTLE_WINDOW = timedelta(minutes=15)
-    INACTIVE_SNAPSHOT_WINDOW = timedelta(hours=24) # Daily Heartbeat
-    
+
+    # Endpoints whose ESI route has an open circuit are held back (their cache rows stay
+    # expired, so they are picked up again once it closes). Half-open routes only get
+    # as many characters as the breaker will let probe.
+    blocked = circuit_breaker.blocked_routes()
+    probe_budget = {}
+    for endpoint, route in ENDPOINT_ROUTES.items():
+        if route in blocked:
+            probe_budget[endpoint] = circuit_breaker.HALF_OPEN_PROBES if blocked[route]['state'] == circuit_breaker.HALF_OPEN else 0
+    if probe_budget:
+        logger.warning(f"[Dispatcher] Circuit open, holding back: {', '.join(sorted(probe_budget))}")
+
+    # Pilots the FC is looking at right now jump the queue
+    critical_ids = critical_character_ids()
+    tier_counts = {TIER_CRITICAL: 0, TIER_NORMAL: 0, TIER_BACKGROUND: 0}
+
+    def dispatch(char_id, endpoints, force_refresh=False, tier=TIER_NORMAL):
+        if char_id in critical_ids:
+            tier = TIER_CRITICAL
+        queue_refresh(char_id, endpoints, force_refresh=force_refresh, tier=tier)
+        tier_counts[tier] += 1
+
     # --- STRATEGY 1: Safety Net (PRIORITY FIX) ---
     # We run this FIRST to catch broken characters before the cache logic sees them.
     
@@ -46,28 +70,30 @@ def dispatch_stale_characters():
         logger.warning(f"[Dispatcher] Safety Net: Found {count} broken/stale characters. Forcing FULL refresh.")
         
         for char_id in broken_chars:
-            refresh_character_task.delay(char_id, None, force_refresh=True)
+            dispatch(char_id, None, force_refresh=True)
             processed_ids.add(char_id)
             tasks_queued += 1
 
     # --- STRATEGY 2: Inactive "Heartbeat" (Keep Token Alive + Skill History) ---
-    # If a character is OFFLINE and hasn't been updated in 24 hours,
-    # we trigger a specific update for Skills/History.
+    # Once a day, in the character's own phase slot (hash of character_id, see scheduler/heartbeat.py),
+    # an OFFLINE character gets a specific update for Skills/History.
     # This implicitly refreshes the Auth Token, keeping it valid.
     
-    heartbeat_chars = EveCharacter.objects.filter(
-        is_online=False,
-        last_updated__lt=now - INACTIVE_SNAPSHOT_WINDOW
-    ).exclude(character_id__in=processed_ids).values_list('character_id', flat=True)
+    # The heartbeat bumps last_updated, so postpone it entirely rather than skip part of the snapshot
+    heartbeat_blocked = any(ep in probe_budget for ep in HEARTBEAT_ENDPOINTS)
 
-    if heartbeat_chars:
+    heartbeat_chars = due_heartbeat_characters(now).exclude(
+        character_id__in=processed_ids | critical_ids
+    ).values_list('character_id', flat=True)
+
+    if heartbeat_chars and not heartbeat_blocked:
         count = len(heartbeat_chars)
         logger.info(f"[Dispatcher] Heartbeat: Queueing daily snapshot for {count} inactive pilots.")
         
         for char_id in heartbeat_chars:
             # We ONLY pull persistent data. We SKIP location/ship to save ESI calls.
             # check_token() inside this task will refresh the auth token automatically.
-            refresh_character_task.delay(char_id, ['skills', 'queue', 'history', 'public_info'])
+            dispatch(char_id, HEARTBEAT_ENDPOINTS, tier=TIER_BACKGROUND)
             processed_ids.add(char_id)
             tasks_queued += 1
 
@@ -75,6 +101,7 @@ def dispatch_stale_characters():
     # Only process characters we haven't already fixed in Step 1 or 2
     expired_headers = EsiHeaderCache.objects.filter(expires__lte=now).select_related('character')
     updates_map = {}
+    wakeup_map = {} # Offline skill wake-ups (queue completions), background tier
 
     for header in expired_headers:
         char = header.character
@@ -86,20 +113,42 @@ def dispatch_stale_characters():
             
         endpoint = header.endpoint_name
         
-        if not char.is_online:
+        # Training keeps going while logged off: the 'skills' row expires at the next
+        # queue completion (see token_manager.schedule_skill_wakeup), so it may fire offline.
+        offline_wakeup = False
+
+        # Waitlisted / in-fleet pilots skip the offline rules: their ship, implants and
+        # skills matter even if the online flag is lagging behind
+        if not char.is_online and char_id not in critical_ids:
+            if endpoint == ENDPOINT_SKILLS:
+                # Without a working token the wake-up can only fail; they wait for a re-login
+                if not char.has_refresh_token or char.token_status == 'invalid':
+                    continue
+                offline_wakeup = True
+
             # If Offline, we only check the 'online' endpoint to see if they came back.
             # We do NOT check other endpoints (ship, wallet) until they wake up.
-            if endpoint != 'online':
+            elif endpoint != 'online':
                 # Apply throttle window to prevent spamming /online/ check too fast
                 # Note: The 'online' endpoint usually has a 60s cache, but we rely on
                 # EsiHeaderCache to tell us when that 60s is up.
                 continue
             
-            # Additional safety: Don't check /online/ more than every 15m for offline users
-            # (Unless the cache header explicitly says otherwise, but we enforce a minimum)
-            time_since_last = now - (char.last_updated or (now - timedelta(days=1)))
-            if time_since_last < OFFLINE_THROTTLE_WINDOW:
+            else:
+                # Additional safety: Don't check /online/ more than every 15m for offline users
+                # (Unless the cache header explicitly says otherwise, but we enforce a minimum)
+                time_since_last = now - (char.last_updated or (now - timedelta(days=1)))
+                if time_since_last < OFFLINE_THROTTLE_WINDOW:
+                    continue
+
+        if endpoint in probe_budget:
+            if probe_budget[endpoint] <= 0:
                 continue
+            probe_budget[endpoint] -= 1
+
+        if offline_wakeup:
+            wakeup_map[char_id] = [ENDPOINT_SKILLS, ENDPOINT_QUEUE]
+            continue
 
         if char_id not in updates_map:
             updates_map[char_id] = []
@@ -108,20 +157,72 @@ def dispatch_stale_characters():
     if updates_map:
         # logger.info(f"[Dispatcher] Found {len(updates_map)} characters with expired caches.")
         for char_id, endpoints in updates_map.items():
-            refresh_character_task.delay(char_id, endpoints, force_refresh=False)
+            # A due skill wake-up also re-reads the queue, which registers the next one
+            if ENDPOINT_SKILLS in endpoints and ENDPOINT_QUEUE not in endpoints:
+                endpoints.append(ENDPOINT_QUEUE)
+            dispatch(char_id, endpoints)
             tasks_queued += 1
 
+    for char_id, endpoints in wakeup_map.items():
+        if char_id in updates_map: continue
+        dispatch(char_id, endpoints, tier=TIER_BACKGROUND)
+        tasks_queued += 1
+
     if tasks_queued > 0:
-        logger.info(f"[Dispatcher] Cycle Complete. Total Tasks Queued: {tasks_queued}")
+        tiers = ', '.join(f"{tier}: {count}" for tier, count in tier_counts.items() if count)
+        logger.info(f"[Dispatcher] Cycle Complete. Total Tasks Queued: {tasks_queued} ({tiers})")
+
+def queue_refresh(char_id, target_endpoints=None, force_refresh=False, tier=TIER_NORMAL):
+    """
+    Queues a character refresh on the given priority tier.
+    """
+    task = {
+        TIER_CRITICAL: refresh_character_critical_task,
+        TIER_NORMAL: refresh_character_task,
+        TIER_BACKGROUND: refresh_character_background_task,
+    }[tier]
+    task.delay(char_id, target_endpoints, force_refresh=force_refresh)
 
 # ----------------------------------------------------------------------
-# TASK 2: THE WORKER
+# TASK 2: THE WORKERS (one task per priority tier)
 # ----------------------------------------------------------------------
-@shared_task(rate_limit='300/m')
-def refresh_character_task(char_id, target_endpoints=None, force_refresh=False):
+# Rate limits are per worker node; each task is routed to its own queue
+# (settings.CELERY_TASK_ROUTES), so tier concurrency is set by the worker consuming it.
+@shared_task(bind=True, rate_limit='600/m')
+def refresh_character_critical_task(self, char_id, target_endpoints=None, force_refresh=False):
+    """
+    Refreshes a waitlisted / in-fleet character.
+    """
+    _refresh_character(self, char_id, target_endpoints, force_refresh)
+
+@shared_task(bind=True, rate_limit='300/m')
+def refresh_character_task(self, char_id, target_endpoints=None, force_refresh=False):
     """
     Refreshes a single character.
     """
+    _refresh_character(self, char_id, target_endpoints, force_refresh)
+
+@shared_task(bind=True, rate_limit='120/m')
+def refresh_character_background_task(self, char_id, target_endpoints=None, force_refresh=False):
+    """
+    Heartbeat / bulk refresh. Only gets what the other tiers leave over.
+    """
+    _refresh_character(self, char_id, target_endpoints, force_refresh)
+
+# Re-queued work waits this long, so it lands on a worker that isn't going away
+SHUTDOWN_REQUEUE_DELAY = 5
+
+def _refresh_character(task, char_id, target_endpoints=None, force_refresh=False):
+    if worker_profile.shutting_down:
+        # Warm shutdown: let in-flight refreshes finish, hand the ones not started yet back
+        task.apply_async(args=(char_id, target_endpoints), kwargs={'force_refresh': force_refresh}, countdown=SHUTDOWN_REQUEUE_DELAY)
+        return
+
+    # Bounded DB connections under the gevent profile (no-op under prefork)
+    with worker_profile.db_stage():
+        _refresh_character_data(char_id, target_endpoints, force_refresh)
+
+def _refresh_character_data(char_id, target_endpoints=None, force_refresh=False):
     try:
         char = EveCharacter.objects.get(character_id=char_id)
         
@@ -147,6 +248,63 @@ def refresh_character_task(char_id, target_endpoints=None, force_refresh=False):
     except Exception as e:
         logger.error(f"[Worker] Crash on {char_id}: {e}")
 
+# ----------------------------------------------------------------------
+# TASK 3: PROACTIVE TOKEN REFRESHER
+# ----------------------------------------------------------------------
+# Cap per run so one beat tick can't monopolise a worker; leftovers are picked up next minute
+TOKEN_REFRESH_BATCH = 200
+
+@shared_task
+def refresh_expiring_tokens():
+    """
+    Renews access tokens 5-10 minutes before they expire (jittered per character),
+    so fleet polling / invites never have to wait on login.eveonline.com.
+    One pooled session is reused for the whole batch.
+    """
+    now = timezone.now()
+    horizon = now + PROACTIVE_LEAD_MIN + timedelta(seconds=PROACTIVE_LEAD_JITTER)
+
+    # Only characters a hot path is likely to touch: online pilots, FCs of running fleets, the SRP source.
+    # Everyone else is still renewed lazily by the dispatcher's heartbeat.
+    hot = (
+        Q(is_online=True) |
+        Q(user__commanded_fleets__is_active=True) |
+        Q(srp_config__is_active=True)
+    )
+
+    # Skip revoked tokens ('invalid') - they need a fresh SSO login, not more retries
+    candidates = EveCharacter.objects.filter(
+        pk__in=EveCharacter.objects.filter(hot).values('pk'),
+        has_refresh_token=True,
+        token_status__in=['valid', 'error'],
+        token_expires__lte=horizon
+    ).defer('access_token').order_by('token_expires')
+
+    due = []
+    for char in candidates.iterator():
+        if char.token_expires - get_refresh_lead(char.character_id) <= now:
+            due.append(char)
+            if len(due) >= TOKEN_REFRESH_BATCH: break
+
+    if not due:
+        return "No tokens due."
+
+    session = get_esi_session()
+    refreshed = 0
+    failed = 0
+    try:
+        for char in due:
+            if refresh_token_locked(char, session=session, wait=False):
+                refreshed += 1
+            else:
+                failed += 1
+    finally:
+        session.close()
+
+    if failed:
+        logger.warning(f"[Tokens] Proactive refresh: {refreshed} ok, {failed} failed/skipped.")
+    return f"Refreshed {refreshed}, failed {failed}."
+
 # --- NEW: SRP WALLET SYNC TASK ---
 @shared_task(bind=True, max_retries=3)
 def refresh_srp_wallet_task(self):
@@ -5,14 +5,17 @@ from channels.generic.websocket import AsyncWebsocketConsumer
 from asgiref.sync import sync_to_async, async_to_sync
 from django.utils import timezone
 from django.core.cache import cache
+from django.db import transaction
 
 # Local Imports
-from waitlist_data.models import Fleet, FleetActivity, WaitlistEntry, CharacterStats # Added CharacterStats
+from waitlist_data.models import Fleet, FleetActivity, WaitlistEntry
 from pilot_data.models import EveCharacter, EsiHeaderCache, ItemType
 from core.utils import ROLE_HIERARCHY
 from esi_calls.fleet_service import get_fleet_composition, process_fleet_data, resolve_unknown_names, ESI_BASE
 from esi_calls.token_manager import check_token
-import requests
+from esi_calls.token_cache import get_access_token
+from waitlist_data.stats import apply_stats_events
+from esi_calls.circuit_breaker import esi_request
 
 logger = logging.getLogger(__name__)
 
@@ -118,14 +121,15 @@ class FleetConsumer(AsyncWebsocketConsumer):
         try:
             fleet = Fleet.objects.get(id=self.fleet_id)
             if not fleet.commander: return {'error': 'No Commander'}
-            fc_char = fleet.commander.characters.filter(is_main=True).first()
-            if not fc_char: fc_char = fleet.commander.characters.first()
+            # Tokens deferred: check_token uses the indexed flag and get_access_token the process cache
+            fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first()
+            if not fc_char: fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').first()
             if not fc_char: return {'error': 'FC has no characters'}
             if not check_token(fc_char): return {'error': 'FC Token Invalid / Expired'}
             if not fleet.esi_fleet_id:
                 try:
-                    headers = {'Authorization': f'Bearer {fc_char.access_token}'}
-                    resp = requests.get(f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
+                    headers = {'Authorization': f'Bearer {get_access_token(fc_char)}'}
+                    resp = esi_request('GET', f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
                     if resp.status_code == 200:
                         data = resp.json()
                         fleet.esi_fleet_id = data['fleet_id']
@@ -215,87 +219,39 @@ class FleetConsumer(AsyncWebsocketConsumer):
                 
             return char, ship_id, ship_name
 
-        # --- Helper for Stats Update ---
-        def update_char_stats(character, event_type, ship_name, timestamp):
-            """
-            Optimized stats updater.
-            event_type: 'join', 'leave', 'reship'
-            """
-            stats, _ = CharacterStats.objects.get_or_create(character=character)
-            
-            if event_type == 'join':
-                # Start new session
-                # If there was a previous open session, close it first (safety)
-                if stats.active_session_start:
-                    diff = (timestamp - stats.active_session_start).total_seconds()
-                    if 0 < diff < 86400:
-                        stats.total_seconds += int(diff)
-                        h_name = stats.active_hull or "Unknown"
-                        stats.hull_stats[h_name] = stats.hull_stats.get(h_name, 0) + int(diff)
-                
-                stats.active_session_start = timestamp
-                stats.active_hull = ship_name
-                stats.save()
-
-            elif event_type == 'leave':
-                # Close session
-                if stats.active_session_start:
-                    diff = (timestamp - stats.active_session_start).total_seconds()
-                    if diff > 0:
-                        stats.total_seconds += int(diff)
-                        h_name = stats.active_hull or "Unknown"
-                        stats.hull_stats[h_name] = stats.hull_stats.get(h_name, 0) + int(diff)
-                    
-                    stats.active_session_start = None
-                    stats.active_hull = None
-                    stats.save()
-
-            elif event_type == 'reship':
-                # Close current leg, start new leg
-                if stats.active_session_start:
-                    diff = (timestamp - stats.active_session_start).total_seconds()
-                    if diff > 0:
-                        stats.total_seconds += int(diff)
-                        h_name = stats.active_hull or "Unknown"
-                        stats.hull_stats[h_name] = stats.hull_stats.get(h_name, 0) + int(diff)
-                
-                stats.active_session_start = timestamp
-                stats.active_hull = ship_name
-                stats.save()
-
         now = timezone.now()
 
+        # Events are collected first and applied set-based at the end:
+        # stats_events: [(character, 'join' | 'leave' | 'reship', ship_name)]
+        stats_events = []
+        joins = []
+
         # A. HANDLE JOINS
         for cid in joined_ids:
             char, sid, sname = get_char_and_ship(cid)
             if not char: continue
+            stats_events.append((char, 'join', sname))
+            joins.append((char, sid, sname))
+
+        # Waitlist entries and prior history for every joiner in two queries
+        joiner_pks = [char.pk for char, _, _ in joins]
+        entries_by_char = {}
+        for entry_id, char_pk in WaitlistEntry.objects.filter(fleet=fleet, character_id__in=joiner_pks).values_list('id', 'character_id'):
+            entries_by_char.setdefault(char_pk, []).append(entry_id)
+        with_history = set(
+            FleetActivity.objects.filter(fleet=fleet, character_id__in=[pk for pk in joiner_pks if pk not in entries_by_char])
+            .values_list('character_id', flat=True).distinct()
+        )
 
-            # Update Stats Model
-            update_char_stats(char, 'join', sname, now)
-
-            # Waitlist Logic
-            wl_entries = WaitlistEntry.objects.filter(fleet=fleet, character=char)
+        for char, sid, sname in joins:
             details = "Manual Join (In-Game)"
-            action = 'esi_join'
-
-            if wl_entries.exists():
+            if char.pk in entries_by_char:
                 details = "Joined Fleet (Waitlist Cleared)"
-                for entry in wl_entries:
-                    async_to_sync(self.channel_layer.group_send)(
-                        self.room_group_name,
-                        {
-                            'type': 'fleet_update',
-                            'action': 'remove',
-                            'entry_id': entry.id
-                        }
-                    )
-                    entry.delete()
-            else:
-                has_history = FleetActivity.objects.filter(fleet=fleet, character=char).exists()
-                if has_history: details = "Arrived in Fleet"
-            
+            elif char.pk in with_history:
+                details = "Arrived in Fleet"
+
             new_logs.append(FleetActivity(
-                fleet=fleet, character=char, action=action,
+                fleet=fleet, character=char, action='esi_join',
                 ship_name=sname, hull_id=sid, details=details
             ))
 
@@ -304,9 +260,7 @@ class FleetConsumer(AsyncWebsocketConsumer):
             for cid in left_ids:
                 char, sid, sname = get_char_and_ship(cid)
                 if not char: continue
-                
-                # Update Stats Model
-                update_char_stats(char, 'leave', sname, now)
+                stats_events.append((char, 'leave', sname))
                 
                 new_logs.append(FleetActivity(
                     fleet=fleet, character=char, action='left_fleet',
@@ -327,8 +281,7 @@ class FleetConsumer(AsyncWebsocketConsumer):
                     old_ship_name = "Unknown"
                     if old['ship_type_id'] in ship_map: old_ship_name = ship_map[old['ship_type_id']].type_name
                     
-                    # Update Stats Model
-                    update_char_stats(char, 'reship', sname, now)
+                    stats_events.append((char, 'reship', sname))
                     
                     details = f"Reshipped: {old_ship_name} -> {sname}"
                     new_logs.append(FleetActivity(
@@ -361,8 +314,25 @@ class FleetConsumer(AsyncWebsocketConsumer):
                         ship_name=sname, hull_id=sid, details=details
                     ))
 
-        if new_logs:
-            FleetActivity.objects.bulk_create(new_logs)
+        # D. APPLY: stats, cleared entries and logs in one transaction
+        cleared_ids = [entry_id for ids in entries_by_char.values() for entry_id in ids]
+        with transaction.atomic():
+            apply_stats_events(stats_events, now)
+            if cleared_ids:
+                WaitlistEntry.objects.filter(id__in=cleared_ids).delete()
+            if new_logs:
+                FleetActivity.objects.bulk_create(new_logs)
+
+        # One websocket message for every card the joins cleared
+        if cleared_ids:
+            async_to_sync(self.channel_layer.group_send)(self.room_group_name, {
+                'type': 'fleet_update',
+                'action': 'batch',
+                'updates': [
+                    {'type': 'fleet_update', 'action': 'remove', 'entry_id': entry_id}
+                    for entry_id in cleared_ids
+                ]
+            })
 
     async def fleet_update(self, event):
         await self.send(text_data=json.dumps(event))
\ No newline at end of file
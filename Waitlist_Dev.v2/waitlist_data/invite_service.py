@@ -0,0 +1,135 @@
+from collections import Counter
+from django.utils import timezone
+
+from waitlist_data.models import WaitlistEntry, FleetActivity
+from waitlist_data.views.helpers import get_category_map, get_entry_real_category, broadcast_batch_update
+from esi_calls.fleet_service import get_fleet_composition, bulk_invite_to_fleet
+
+INVITABLE_COLUMNS = ['logi', 'dps', 'sniper', 'other']
+
+def get_squad_targets(composition):
+    """
+    Maps waitlist columns to in-game squads by name (e.g. squads called "Logi 1", "DPS" or "Snipers").
+    Returns {column: [{'squad_id', 'wing_id', 'members'}...]} using the live member counts.
+    Squads are normally created from the fleet's structure template, so its names drive placement.
+    """
+    members_per_squad = Counter(m.get('squad_id') for m in composition.get('members', []))
+    targets = {col: [] for col in INVITABLE_COLUMNS}
+
+    for wing in composition.get('wings', []):
+        for squad in wing.get('squads', []):
+            name = (squad.get('name') or '').lower()
+            for col in INVITABLE_COLUMNS:
+                if col in name:
+                    targets[col].append({
+                        'squad_id': squad['id'],
+                        'wing_id': wing['id'],
+                        'members': members_per_squad.get(squad['id'], 0)
+                    })
+    return targets
+
+def _pick_squad(squads):
+    """
+    Least-filled squad wins, so a big form-up spreads across e.g. "DPS 1" and "DPS 2".
+    """
+    if not squads: return None
+    squad = min(squads, key=lambda s: s['members'])
+    squad['members'] += 1
+    return squad
+
+def bulk_invite_entries(fleet, fc_char, actor, entry_ids=None, column=None):
+    """
+    Invites approved entries (explicit ids and/or a whole column) in one pass.
+    Returns {'invited': int, 'failed': [{'entry_id', 'name', 'error'}]}.
+    """
+    qs = WaitlistEntry.objects.filter(fleet=fleet, status='approved').select_related(
+        'character',
+        'character__user',
+        'character__stats',
+        'fit',
+        'fit__ship_type',
+        'fit__category',
+        'hull',
+        'tier'
+    )
+    if entry_ids is not None:
+        qs = qs.filter(id__in=entry_ids)
+
+    category_map = get_category_map()
+    entries = []
+    seen_chars = set()
+    for entry in qs:
+        col = get_entry_real_category(entry, category_map)
+        if column and col != column: continue
+        # One invite per pilot, even if they are approved in two columns
+        if entry.character.character_id in seen_chars: continue
+        seen_chars.add(entry.character.character_id)
+        entry.bulk_column = col
+        entries.append(entry)
+
+    if not entries:
+        return {'invited': 0, 'failed': []}
+
+    # Squad placement from the live structure (optional - ESI auto-places without a squad)
+    targets = {}
+    composition, error = get_fleet_composition(fleet.esi_fleet_id, fc_char, use_cache=False)
+    if not error:
+        targets = get_squad_targets(composition)
+
+    invites = []
+    for entry in entries:
+        invite = {'character_id': entry.character.character_id}
+        squad = _pick_squad(targets.get(entry.bulk_column))
+        if squad:
+            invite['squad_id'] = squad['squad_id']
+        invites.append(invite)
+
+    results = bulk_invite_to_fleet(fleet.esi_fleet_id, fc_char, invites)
+
+    now = timezone.now()
+    invited = []
+    failed = []
+    for entry in entries:
+        success, msg = results.get(entry.character.character_id, (False, "No response"))
+        if success:
+            entry.status = 'invited'
+            entry.invited_at = now
+            invited.append(entry)
+        else:
+            failed.append({'entry_id': entry.id, 'name': entry.character.character_name, 'error': msg})
+
+    if invited:
+        WaitlistEntry.objects.bulk_update(invited, ['status', 'invited_at'])
+
+        logs = []
+        for entry in invited:
+            hull = entry.hull if entry.hull else entry.fit.ship_type if entry.fit else None
+            logs.append(FleetActivity(
+                fleet=fleet,
+                character=entry.character,
+                actor=actor,
+                action='invited',
+                ship_name=hull.type_name if hull else "",
+                hull_id=hull.type_id if hull else None,
+                details="ESI Invite Sent (Bulk)",
+                fit_eft=entry.raw_eft
+            ))
+        FleetActivity.objects.bulk_create(logs)
+
+        # Invited cards + their sibling cards (indicator lights) in a single message
+        invited_ids = [e.id for e in invited]
+        siblings = list(WaitlistEntry.objects.filter(
+            fleet=fleet,
+            character_id__in=[e.character_id for e in invited]
+        ).exclude(status__in=['rejected', 'left']).exclude(id__in=invited_ids).select_related(
+            'character',
+            'character__user',
+            'character__stats',
+            'fit',
+            'fit__ship_type',
+            'fit__category',
+            'hull'
+        ))
+        broadcast_batch_update(fleet.id, invited + siblings)
+
+    return {'invited': len(invited), 'failed': failed}
@@ -0,0 +1,516 @@
+import copy
+import json
+import random
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.eft_parser import EFTParser
+from esi_calls.fleet_service import process_fleet_data
+from pilot_data.models import (
+    EveCharacter, CharacterSkill, ItemGroup, ItemType, TypeAttribute, AttributeDefinition, FitAnalysisRule
+)
+from waitlist_data.fitting_service import SmartFitMatcher, FitComparator, ComparisonCache
+from waitlist_data.models import (
+    DoctrineCategory, DoctrineFit, FitModule, SkillGroup, SkillGroupMember, SkillTier, SkillRequirement,
+    Fleet, FleetActivity
+)
+from waitlist_data.skill_service import check_pilot_skills, SKILL_ATTRS
+from waitlist_data.stats import batch_calculate_pilot_stats
+
+# --- SYNTHETIC FIXTURE ---
+# Everything is created inside one transaction that is rolled back at the end, so the benchmark
+# can run against a dev database with a real SDE. Ids sit far above the real SDE ranges.
+BENCH_TYPE_BASE = 990_000_000
+BENCH_GROUP_BASE = 990_000
+BENCH_ATTR_BASE = 990_000
+BENCH_CHAR_BASE = 96_000_000
+BENCH_GUEST_BASE = 97_000_000
+BENCH_USERNAME = 'sim_user_engine_bench'
+
+SKILL_CATEGORY, SHIP_CATEGORY, MODULE_CATEGORY, DRONE_CATEGORY = 16, 6, 7, 18
+SLOT_ATTRS = {'high': 14, 'mid': 13, 'low': 12, 'rig': 1137}
+
+# Slots of a doctrine fit: (slot, module groups to draw from, modules per fit)
+FIT_LAYOUT = [('high', 12, 7), ('mid', 12, 6), ('low', 12, 6), ('rig', 6, 3), ('drone', 3, 2)]
+
+OPERATIONS = [
+    'eft_parse', 'fit_match', 'score_fit', 'compare_items',
+    'check_pilot_skills', 'batch_pilot_stats', 'process_fleet_data',
+]
+
+def _percentile(sorted_values, pct):
+    return sorted_values[max(0, int(round(pct / 100 * len(sorted_values))) - 1)]
+
+class QueryCounter:
+    """
+    execute_wrapper that only counts (no SQL capture, so it barely adds overhead).
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks the fitting, skill and stats engines on a synthetic SDE (rolled back afterwards).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--types', type=int, default=5000, help='Synthetic module types (Default: 5000)')
+        parser.add_argument('--hulls', type=int, default=40, help='Synthetic hulls (Default: 40)')
+        parser.add_argument('--skills', type=int, default=450, help='Synthetic skills (Default: 450)')
+        parser.add_argument('--doctrines', type=int, default=120, help='Doctrine fits, spread over the hulls (Default: 120)')
+        parser.add_argument('--pilots', type=int, default=100, help='Pilots with ~400 skills each (Default: 100)')
+        parser.add_argument('--pilot-skills', type=int, default=400, help='Skills per pilot (Default: 400)')
+        parser.add_argument('--activity', type=int, default=60, help='Fleet activity rows per pilot (Default: 60)')
+        parser.add_argument('--fleet-size', type=int, default=250, help='Members per fleet payload (Default: 250)')
+        parser.add_argument('--iterations', type=int, default=200, help='Timed runs per operation (Default: 200)')
+        parser.add_argument('--warmup', type=int, default=10, help='Untimed runs per operation (Default: 10)')
+        parser.add_argument('--only', type=str, default='', help=f"Comma-separated operations ({', '.join(OPERATIONS)})")
+        parser.add_argument('--seed', type=int, default=1, help='Random seed for the fixture and inputs (Default: 1)')
+        parser.add_argument('--json', type=str, default='', help='Write the results to this file')
+        parser.add_argument('--compare', type=str, default='', help='Baseline JSON (from --json) to compare against')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Percent slowdown flagged as a regression (Default: 10)')
+
+    def handle(self, *args, **options):
+        operations = [o.strip() for o in options['only'].split(',') if o.strip()] or OPERATIONS
+        unknown = set(operations) - set(OPERATIONS)
+        if unknown:
+            self.stdout.write(self.style.ERROR(f"Unknown operations: {', '.join(sorted(unknown))}"))
+            return
+
+        self.rng = random.Random(options['seed'])
+        results = []
+        with transaction.atomic():
+            start = time.perf_counter()
+            fixture = self.build_fixture(options)
+            self.stdout.write(self.style.HTTP_INFO(
+                f"Synthetic fixture: {fixture['type_count']} types, {len(fixture['fits'])} doctrine fits, "
+                f"{len(fixture['pilots'])} pilots x {options['pilot_skills']} skills, "
+                f"{fixture['activity_count']} activity rows ({time.perf_counter() - start:.1f}s)"
+            ))
+
+            for name in operations:
+                fn, inputs = getattr(self, f"prepare_{name}")(fixture, options)
+                results.append(self.measure(name, fn, inputs, options['iterations'], options['warmup']))
+                self.stdout.write(f"  {name} done")
+
+            transaction.set_rollback(True)
+
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'database': connection.vendor,
+                'options': {k: options[k] for k in (
+                    'types', 'hulls', 'skills', 'doctrines', 'pilots', 'pilot_skills',
+                    'activity', 'fleet_size', 'iterations', 'seed'
+                )},
+            },
+            'operations': results,
+        }
+        self.report(results)
+
+        if options['json']:
+            with open(options['json'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Results written to {options['json']}")
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            self.compare(results, baseline, options['threshold'])
+
+    # --- MEASUREMENT ---
+
+    def measure(self, name, fn, inputs, iterations, warmup):
+        """
+        Calls fn(*args) for args cycled from inputs; records wall time and query count per call.
+        """
+        for i in range(warmup):
+            fn(*inputs[i % len(inputs)])
+
+        timings = []
+        queries = []
+        for i in range(iterations):
+            args = inputs[i % len(inputs)]
+            counter = QueryCounter()
+            with connection.execute_wrapper(counter):
+                start = time.perf_counter()
+                fn(*args)
+                timings.append(time.perf_counter() - start)
+            queries.append(counter.count)
+
+        timings_ms = sorted(t * 1000 for t in timings)
+        total = sum(timings)
+        return {
+            'operation': name,
+            'iterations': iterations,
+            'mean_ms': round(statistics.mean(timings_ms), 3),
+            'p50_ms': round(_percentile(timings_ms, 50), 3),
+            'p95_ms': round(_percentile(timings_ms, 95), 3),
+            'min_ms': round(timings_ms[0], 3),
+            'ops_per_sec': round(iterations / total, 1) if total else 0,
+            'queries_per_op': round(statistics.mean(queries), 2),
+            'queries_max': max(queries),
+        }
+
+    # --- OPERATIONS ---
+    # Each prepare_* returns (callable, [args tuples]) with all input building done up front.
+
+    def prepare_eft_parse(self, fixture, options):
+        return lambda text: EFTParser(text).parse(), [(text,) for text in fixture['pilot_efts']]
+
+    def prepare_fit_match(self, fixture, options):
+        return lambda parser: SmartFitMatcher(parser).find_best_match(), [(p,) for p in fixture['parsers']]
+
+    def prepare_score_fit(self, fixture, options):
+        # Pure scoring: candidates and the comparison cache are loaded once, outside the timer
+        inputs = []
+        for parser, fit in zip(fixture['parsers'], fixture['parser_fits']):
+            fit = DoctrineFit.objects.prefetch_related('modules__item_type').get(pk=fit.pk)
+            doc_items = [m.item_type for m in fit.modules.all()]
+            cache = ComparisonCache(doc_items, [x['obj'] for x in parser.items])
+            inputs.append((SmartFitMatcher(parser), fit, cache))
+        return lambda matcher, fit, cache: matcher._score_fit(fit, cache), inputs
+
+    def prepare_compare_items(self, fixture, options):
+        # One op = every doctrine module of a fit against the pilot's module in the same group
+        inputs = []
+        for parser, fit in zip(fixture['parsers'], fixture['parser_fits']):
+            doc_items = [m.item_type for m in fit.modules.select_related('item_type')]
+            pilot_items = [x['obj'] for x in parser.items]
+            by_group = {}
+            for item in pilot_items:
+                by_group.setdefault(item.group_id, item)
+            pairs = [(d, by_group[d.group_id]) for d in doc_items if d.group_id in by_group]
+            inputs.append((pairs, ComparisonCache(doc_items, pilot_items)))
+
+        def compare_all(pairs, cache):
+            for doc_item, pilot_item in pairs:
+                FitComparator.compare_items(doc_item, pilot_item, cache)
+        return compare_all, inputs
+
+    def prepare_check_pilot_skills(self, fixture, options):
+        pilots = fixture['pilots']
+        inputs = [
+            (pilots[i % len(pilots)], parser, fit)
+            for i, (parser, fit) in enumerate(zip(fixture['parsers'], fixture['parser_fits']))
+        ]
+        return check_pilot_skills, inputs
+
+    def prepare_batch_pilot_stats(self, fixture, options):
+        ids = [p.character_id for p in fixture['pilots']]
+        return batch_calculate_pilot_stats, [(ids,)]
+
+    def prepare_process_fleet_data(self, fixture, options):
+        # process_fleet_data sorts the payload in place: give every call its own copy
+        payloads = [copy.deepcopy(fixture['fleet_payload']) for _ in range(options['iterations'] + options['warmup'])]
+        payload_iter = iter(payloads)
+        return lambda: process_fleet_data(next(payload_iter)), [()]
+
+    # --- FIXTURE ---
+
+    def build_fixture(self, options):
+        rng = self.rng
+        next_type = iter(range(BENCH_TYPE_BASE, BENCH_TYPE_BASE + 10_000_000))
+        next_group = iter(range(BENCH_GROUP_BASE, BENCH_GROUP_BASE + 100_000))
+
+        groups, types, attributes = [], [], []
+
+        # Skills (category 16), ~30 per group like the real skill tree
+        skill_groups = []
+        for g in range(max(1, options['skills'] // 30)):
+            skill_groups.append(ItemGroup(group_id=next(next_group), category_id=SKILL_CATEGORY, group_name=f"Bench Skills {g}"))
+        skills = [
+            ItemType(type_id=next(next_type), group=skill_groups[i % len(skill_groups)], type_name=f"Bench Skill {i}")
+            for i in range(options['skills'])
+        ]
+        groups += skill_groups
+        types += skills
+        skill_ids = [s.type_id for s in skills]
+
+        def add_skill_requirements(item, count):
+            for skill_attr in list(SKILL_ATTRS)[:count]:
+                attributes.append(TypeAttribute(item=item, attribute_id=skill_attr, value=rng.choice(skill_ids)))
+                attributes.append(TypeAttribute(item=item, attribute_id=SKILL_ATTRS[skill_attr], value=rng.randint(1, 5)))
+
+        # Hulls with slot layout and 3 skill requirements
+        hull_groups = [
+            ItemGroup(group_id=next(next_group), category_id=SHIP_CATEGORY, group_name=f"Bench Hull Class {g}")
+            for g in range(max(1, options['hulls'] // 8))
+        ]
+        hulls = [
+            ItemType(type_id=next(next_type), group=hull_groups[i % len(hull_groups)], type_name=f"Bench Hull {i}", mass=1e8)
+            for i in range(options['hulls'])
+        ]
+        groups += hull_groups
+        types += hulls
+        for hull in hulls:
+            add_skill_requirements(hull, 3)
+            for slot, attr_id in SLOT_ATTRS.items():
+                attributes.append(TypeAttribute(item=hull, attribute_id=attr_id, value=3 if slot == 'rig' else 8))
+
+        # Comparison attributes + per-group analysis rules
+        attr_defs = [
+            AttributeDefinition(attribute_id=BENCH_ATTR_BASE + i, name=f"benchAttr{i}", display_name=f"Bench Attribute {i}")
+            for i in range(24)
+        ]
+
+        # Module groups per slot; meta variants inside a group differ by attribute values
+        slot_groups = {}
+        rules = []
+        module_groups = []
+        for slot, group_count, _ in FIT_LAYOUT:
+            category = DRONE_CATEGORY if slot == 'drone' else MODULE_CATEGORY
+            slot_groups[slot] = []
+            for g in range(group_count):
+                group = ItemGroup(group_id=next(next_group), category_id=category, group_name=f"Bench {slot.title()} Group {g}")
+                slot_groups[slot].append(group)
+                module_groups.append(group)
+                for attr in rng.sample(attr_defs, 4):
+                    rules.append(FitAnalysisRule(
+                        group=group, attribute=attr, priority=rng.randint(0, 10),
+                        comparison_logic=rng.choice(['higher', 'higher', 'lower', 'match']),
+                        tolerance_percent=rng.choice([0.0, 0.0, 5.0, 10.0])
+                    ))
+        groups += module_groups
+
+        rules_by_group = {}
+        for rule in rules:
+            rules_by_group.setdefault(rule.group.group_id, []).append(rule)
+
+        modules_by_group = {}
+        per_group = max(2, options['types'] // len(module_groups))
+        for group in module_groups:
+            group_types = []
+            for meta in range(per_group):
+                item = ItemType(type_id=next(next_type), group=group, type_name=f"Bench Module {group.group_id}-{meta}", volume=5)
+                group_types.append(item)
+                add_skill_requirements(item, rng.randint(1, 2))
+                for rule in rules_by_group[group.group_id]:
+                    base = 100 + rule.attribute.attribute_id % 7 * 25
+                    attributes.append(TypeAttribute(item=item, attribute_id=rule.attribute.attribute_id, value=base * (1 + meta * 0.03)))
+            modules_by_group[group.group_id] = group_types
+            types += group_types
+
+        ItemGroup.objects.bulk_create(groups, batch_size=1000)
+        ItemType.objects.bulk_create(types, batch_size=1000)
+        AttributeDefinition.objects.bulk_create(attr_defs)
+        FitAnalysisRule.objects.bulk_create(rules, batch_size=1000)
+        TypeAttribute.objects.bulk_create(attributes, batch_size=2000)
+
+        # Doctrines: several fits per hull so the matcher has candidates to score
+        category = DoctrineCategory.objects.create(name="Bench Doctrines", slug=f"bench-doctrines-{rng.randint(0, 10**9)}")
+        fits, fit_modules, fit_layouts = [], [], []
+        for i in range(options['doctrines']):
+            hull = hulls[i % len(hulls)]
+            layout = []
+            for slot, _, count in FIT_LAYOUT:
+                for group in rng.sample(slot_groups[slot], min(count, len(slot_groups[slot]))):
+                    item = rng.choice(modules_by_group[group.group_id][-4:]) # doctrines use high meta
+                    layout.append((slot, item, 5 if slot == 'drone' else rng.choice([1, 1, 1, 2])))
+            fits.append(DoctrineFit(category=category, ship_type=hull, name=f"Bench Fit {i}", eft_format=self.to_eft(hull, f"Bench Fit {i}", layout)))
+            fit_layouts.append(layout)
+        DoctrineFit.objects.bulk_create(fits)
+        fits = list(DoctrineFit.objects.filter(category=category).order_by('id'))
+        for fit, layout in zip(fits, fit_layouts):
+            fit_modules += [FitModule(fit=fit, item_type=item, quantity=qty, slot=slot) for slot, item, qty in layout]
+        FitModule.objects.bulk_create(fit_modules, batch_size=1000)
+
+        # Skill requirements: hull minimums, a shared skill group and two tiers per fit
+        tiers = [
+            SkillTier.objects.create(name=f"Bench Elite {rng.randint(0, 10**9)}", order=1000),
+            SkillTier.objects.create(name=f"Bench Basic {rng.randint(0, 10**9)}", order=999),
+        ]
+        skill_group = SkillGroup.objects.create(name=f"Bench Support Skills {rng.randint(0, 10**9)}")
+        SkillGroupMember.objects.bulk_create([
+            SkillGroupMember(group=skill_group, skill=s, level=rng.randint(3, 5)) for s in rng.sample(skills, 10)
+        ])
+        requirements = []
+        for hull in hulls:
+            requirements += [SkillRequirement(hull=hull, skill=s, level=rng.randint(1, 4)) for s in rng.sample(skills, 2)]
+        for fit in fits:
+            requirements.append(SkillRequirement(doctrine_fit=fit, group=skill_group, tier=tiers[0]))
+            requirements += [SkillRequirement(doctrine_fit=fit, skill=s, level=5, tier=tiers[0]) for s in rng.sample(skills, 3)]
+            requirements += [SkillRequirement(doctrine_fit=fit, skill=s, level=4, tier=tiers[1]) for s in rng.sample(skills, 3)]
+        SkillRequirement.objects.bulk_create(requirements, batch_size=1000)
+
+        # Pilots with ~400 skills, mostly trained high
+        User.objects.filter(username=BENCH_USERNAME).delete()
+        user = User.objects.create(username=BENCH_USERNAME)
+        EveCharacter.objects.bulk_create([
+            EveCharacter(user=user, character_id=BENCH_CHAR_BASE + i, character_name=f"Bench Pilot {i}", corporation_name="Simulation Corp")
+            for i in range(options['pilots'])
+        ])
+        pilots = list(EveCharacter.objects.filter(user=user).order_by('character_id'))
+        pilot_skills = []
+        for pilot in pilots:
+            for skill_id in rng.sample(skill_ids, min(options['pilot_skills'], len(skill_ids))):
+                level = rng.choice([3, 4, 4, 5, 5, 5])
+                pilot_skills.append(CharacterSkill(character=pilot, skill_id=skill_id, active_skill_level=level, skillpoints_in_skill=level * 45255))
+        CharacterSkill.objects.bulk_create(pilot_skills, batch_size=2000)
+
+        activity_count = self.build_activity(user, pilots, hulls, options['activity'])
+
+        # Pilot x-ups: doctrine fits with meta swaps, missing modules, loaded charges and cargo
+        pilot_efts, parser_fits = [], []
+        for i in range(max(50, len(fits))):
+            fit, layout = fits[i % len(fits)], fit_layouts[i % len(fits)]
+            pilot_efts.append(self.to_eft(fit.ship_type, f"My {fit.name}", self.vary_layout(layout, modules_by_group)))
+            parser_fits.append(fit)
+
+        parsers = []
+        for text in pilot_efts:
+            parser = EFTParser(text)
+            parser.parse()
+            parsers.append(parser)
+
+        return {
+            'type_count': len(types),
+            'fits': fits,
+            'pilots': pilots,
+            'activity_count': activity_count,
+            'pilot_efts': pilot_efts,
+            'parsers': parsers,
+            'parser_fits': parser_fits,
+            'fleet_payload': self.build_fleet_payload(pilots, hulls, options['fleet_size']),
+        }
+
+    def vary_layout(self, layout, modules_by_group):
+        rng = self.rng
+        varied = []
+        for slot, item, qty in layout:
+            roll = rng.random()
+            if roll < 0.08:
+                continue # missing module
+            if roll < 0.45:
+                item = rng.choice(modules_by_group[item.group_id]) # meta swap (up or down)
+            varied.append((slot, item, qty))
+        if rng.random() < 0.5:
+            extra_group = rng.choice(list(modules_by_group))
+            varied.append(('cargo', rng.choice(modules_by_group[extra_group]), rng.randint(1, 3)))
+        return varied
+
+    def to_eft(self, hull, name, layout):
+        sections = {'low': [], 'mid': [], 'high': [], 'rig': [], 'drone': [], 'cargo': []}
+        for slot, item, qty in layout:
+            if slot in ('drone', 'cargo'):
+                sections[slot].append(f"{item.type_name} x{qty}")
+            else:
+                # Highs carry a loaded charge now and then ("Module, Charge")
+                suffix = ", Bench Charge L" if slot == 'high' and qty == 1 and item.type_id % 3 == 0 else ""
+                sections[slot] += [f"{item.type_name}{suffix}"] * qty
+        sections['rig'].append("[Empty Rig slot]")
+        lines = [f"[{hull.type_name}, {name}]"]
+        for slot in ('low', 'mid', 'high', 'rig', 'drone', 'cargo'):
+            lines += sections[slot] + [""]
+        return "\n".join(lines)
+
+    def build_activity(self, user, pilots, hulls, per_pilot):
+        """
+        Join / reship / leave sessions over the last 90 days. Timestamps are auto_now_add,
+        so they are set with a bulk_update after the insert.
+        """
+        rng = self.rng
+        fleet = Fleet.objects.create(name="Bench Fleet", commander=user, is_active=False)
+        now = timezone.now()
+        rows, stamps = [], []
+        for pilot in pilots:
+            t = now - timedelta(days=90)
+            first = len(rows)
+            while len(rows) - first < per_pilot:
+                hull = rng.choice(hulls)
+                t += timedelta(hours=rng.uniform(2, 48))
+                rows.append(FleetActivity(fleet=fleet, character=pilot, action='esi_join', ship_name=hull.type_name, hull_id=hull.type_id))
+                stamps.append(t)
+                for _ in range(rng.randint(0, 2)):
+                    hull = rng.choice(hulls)
+                    t += timedelta(minutes=rng.uniform(10, 90))
+                    rows.append(FleetActivity(fleet=fleet, character=pilot, action='ship_change', ship_name=hull.type_name, hull_id=hull.type_id))
+                    stamps.append(t)
+                t += timedelta(minutes=rng.uniform(20, 180))
+                rows.append(FleetActivity(fleet=fleet, character=pilot, action=rng.choice(['left_fleet', 'left_fleet', 'kicked']), ship_name=hull.type_name))
+                stamps.append(t)
+
+        FleetActivity.objects.bulk_create(rows, batch_size=2000)
+        saved = list(FleetActivity.objects.filter(fleet=fleet).order_by('id').only('id'))
+        for row, stamp in zip(saved, stamps):
+            row.timestamp = stamp
+        FleetActivity.objects.bulk_update(saved, ['timestamp'], batch_size=2000)
+        return len(saved)
+
+    def build_fleet_payload(self, pilots, hulls, size):
+        """
+        get_fleet_composition-shaped payload: 5 wings x 5 squads, a fleet boss,
+        wing/squad commanders, a mix of known pilots and guests.
+        """
+        rng = self.rng
+        wings = [
+            {'id': 1000 + w, 'name': f"Wing {w + 1}", 'squads': [{'id': 2000 + w * 10 + s, 'name': f"Squad {s + 1}"} for s in range(5)]}
+            for w in range(5)
+        ]
+        joined = (timezone.now() - timedelta(hours=1)).isoformat()
+        members = []
+        for i in range(size):
+            char_id = pilots[i].character_id if i < len(pilots) and i % 3 else BENCH_GUEST_BASE + i
+            wing = wings[i % 5]
+            squad = wing['squads'][(i // 5) % 5]
+            if i == 0:
+                role, wing_id, squad_id = 'fleet_commander', -1, -1
+            elif i <= 5:
+                role, wing_id, squad_id = 'wing_commander', wing['id'], -1
+            elif i <= 30:
+                role, wing_id, squad_id = 'squad_commander', wing['id'], squad['id']
+            else:
+                role, wing_id, squad_id = 'squad_member', wing['id'], squad['id']
+            members.append({
+                'character_id': char_id, 'ship_type_id': rng.choice(hulls).type_id, 'role': role,
+                'wing_id': wing_id, 'squad_id': squad_id, 'takes_fleet_warp': True,
+                'join_time': joined, 'solar_system_id': 30000142, 'station_id': None,
+            })
+        return {'members': members, 'wings': wings}
+
+    # --- OUTPUT ---
+
+    def report(self, results):
+        self.stdout.write("")
+        self.stdout.write(f"{'Operation':<20} {'Runs':>6} {'Mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'Min ms':>9} {'Ops/s':>9} {'Queries':>8}")
+        for r in results:
+            self.stdout.write(
+                f"{r['operation']:<20} {r['iterations']:>6} {r['mean_ms']:>9} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+                f"{r['min_ms']:>9} {r['ops_per_sec']:>9} {r['queries_per_op']:>8}"
+            )
+
+    def compare(self, results, baseline, threshold):
+        base = {r['operation']: r for r in baseline.get('operations', [])}
+        self.stdout.write("")
+        self.stdout.write("Compared to baseline (p50 ms / queries per op):")
+        regressions = 0
+        for r in results:
+            b = base.get(r['operation'])
+            if not b:
+                continue
+            change = (r['p50_ms'] - b['p50_ms']) / b['p50_ms'] * 100 if b['p50_ms'] else 0
+            # Query counts are deterministic for the same seed and sizes, but inputs cycle differently with other options
+            q_change = (r['queries_per_op'] - b['queries_per_op']) / b['queries_per_op'] * 100 if b['queries_per_op'] else r['queries_per_op'] * 100
+            line = (
+                f"  {r['operation']:<20} {b['p50_ms']:>9} -> {r['p50_ms']:<9} ({change:+.1f}%)   "
+                f"queries {b['queries_per_op']} -> {r['queries_per_op']}"
+            )
+            if change > threshold or q_change > threshold:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            elif change < -threshold or q_change < -threshold:
+                self.stdout.write(self.style.SUCCESS(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            self.stdout.write(self.style.ERROR(f"{regressions} regression(s) above threshold."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No regressions above threshold."))
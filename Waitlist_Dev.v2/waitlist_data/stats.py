@@ -1,6 +1,6 @@
 from collections import defaultdict
 from django.utils import timezone
-from .models import FleetActivity
+from .models import FleetActivity, CharacterStats
 
 def calculate_pilot_stats(character):
     """
@@ -101,4 +101,103 @@ def _get_empty_stats():
         'hull_breakdown': {},
         'active_session_start': None,
         'active_hull': None
-    }
\ No newline at end of file
+    }
+
+def _close_leg(stats, timestamp, max_seconds=None):
+    diff = (timestamp - stats.active_session_start).total_seconds()
+    if diff > 0 and (max_seconds is None or diff < max_seconds):
+        stats.total_seconds += int(diff)
+        h_name = stats.active_hull or "Unknown"
+        stats.hull_stats[h_name] = stats.hull_stats.get(h_name, 0) + int(diff)
+
+def apply_stats_event(stats, event_type, ship_name, timestamp):
+    """
+    Applies one fleet event to a CharacterStats row in memory.
+    event_type: 'join', 'leave', 'reship'. Returns True if the row changed.
+    """
+    if event_type == 'join':
+        # If there was a previous open session, close it first (safety)
+        if stats.active_session_start:
+            _close_leg(stats, timestamp, max_seconds=86400)
+        stats.active_session_start = timestamp
+        stats.active_hull = ship_name
+        return True
+
+    if event_type == 'leave':
+        if not stats.active_session_start:
+            return False
+        _close_leg(stats, timestamp)
+        stats.active_session_start = None
+        stats.active_hull = None
+        return True
+
+    if event_type == 'reship':
+        # Close current leg, start new leg
+        if stats.active_session_start:
+            _close_leg(stats, timestamp)
+        stats.active_session_start = timestamp
+        stats.active_hull = ship_name
+        return True
+    return False
+
+STATS_FIELDS = ['total_seconds', 'hull_stats', 'active_session_start', 'active_hull', 'last_updated']
+
+def apply_stats_events(events, timestamp):
+    """
+    Set-based CharacterStats update for a fleet audit tick.
+    events: [(EveCharacter, event_type, ship_name)]. One read, one bulk_create for
+    pilots without a stats row yet and one bulk_update for the rest.
+    """
+    if not events:
+        return
+
+    char_pks = {char.pk for char, _, _ in events}
+    existing = {s.character_id: s for s in CharacterStats.objects.filter(character_id__in=char_pks)}
+    created = {}
+    changed = set()
+
+    for char, event_type, ship_name in events:
+        stats = existing.get(char.pk) or created.get(char.pk)
+        if stats is None:
+            stats = created[char.pk] = CharacterStats(character=char, hull_stats={})
+        if apply_stats_event(stats, event_type, ship_name, timestamp):
+            changed.add(char.pk)
+
+    for stats in created.values():
+        stats.last_updated = timestamp
+    # A row created concurrently by another consumer wins; this tick's event for it is dropped
+    if created:
+        CharacterStats.objects.bulk_create(created.values(), ignore_conflicts=True)
+
+    updated = [s for pk, s in existing.items() if pk in changed]
+    for stats in updated:
+        stats.last_updated = timestamp
+    if updated:
+        CharacterStats.objects.bulk_update(updated, STATS_FIELDS)
+
+def close_fleet_sessions(fleet, timestamp):
+    """
+    Closes the open CharacterStats sessions of pilots still in `fleet` when it is closed
+    (the audit stops with the fleet, so no 'leave' would ever arrive for them).
+    Pilots whose latest join was into another fleet keep their session.
+    """
+    open_pks = set(
+        CharacterStats.objects.filter(
+            active_session_start__isnull=False,
+            character__fleet_history__fleet=fleet
+        ).values_list('character_id', flat=True)
+    )
+    if not open_pks:
+        return 0
+
+    # Latest in-fleet event per pilot decides which fleet they are in
+    latest_fleet = {}
+    for char_pk, fleet_id in FleetActivity.objects.filter(
+        character_id__in=open_pks, action__in=['esi_join', 'ship_change']
+    ).order_by('timestamp', 'id').values_list('character_id', 'fleet_id'):
+        latest_fleet[char_pk] = fleet_id
+
+    rows = CharacterStats.objects.filter(character_id__in=[pk for pk in open_pks if latest_fleet.get(pk) == fleet.id]).select_related('character')
+    events = [(stats.character, 'leave', stats.active_hull) for stats in rows]
+    apply_stats_events(events, timestamp)
+    return len(events)
@@ -0,0 +1,102 @@
+from celery import shared_task
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+import logging
+
+from pilot_data.models import EveCharacter
+from waitlist_data.models import Fleet
+from esi_calls.fleet_service import sync_fleet_structure
+from core.redis_client import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+# One structure sync per in-game fleet at a time
+STRUCTURE_LOCK_KEY = 'fleet_structure_sync:{esi_fleet_id}'
+STRUCTURE_LOCK_TIMEOUT = 300
+# Re-queues while another sync holds the fleet lock (5s apart), counted apart from failure retries
+STRUCTURE_LOCK_WAITS = 60
+STRUCTURE_LOCK_WAIT_DELAY = 5
+
+def _notify_user(user_id, payload):
+    """
+    Pushes to the personal notification socket (core.consumers.UserConsumer).
+    """
+    if not user_id: return
+    try:
+        async_to_sync(get_channel_layer().group_send)(
+            f"user_{user_id}",
+            {"type": "user_notification", "data": payload}
+        )
+    except Exception as e:
+        logger.warning(f"[StructureSync] Progress push failed: {e}")
+
+@shared_task(bind=True, max_retries=3, default_retry_delay=10)
+def sync_fleet_structure_task(self, fleet_db_id, fc_character_id, structure, user_id=None, lock_waits=0):
+    """
+    Applies a wing/squad layout to the in-game fleet in the background and streams
+    progress to the FC. A failed run is retried; every attempt re-reads the live
+    fleet and only applies what is still missing, so partial progress is kept.
+    """
+    from waitlist_data.views.helpers import _log_fleet_action
+
+    try:
+        fleet = Fleet.objects.get(id=fleet_db_id)
+        fc_char = EveCharacter.objects.defer('access_token', 'refresh_token').get(character_id=fc_character_id)
+    except (Fleet.DoesNotExist, EveCharacter.DoesNotExist):
+        return "Fleet or FC missing"
+
+    if not fleet.esi_fleet_id:
+        return "Fleet not linked to ESI"
+
+    def progress(status, done=0, total=0, message=""):
+        _notify_user(user_id, {
+            'type': 'structure_sync',
+            'fleet_id': fleet.id,
+            'status': status,
+            'done': done,
+            'total': total,
+            'message': message
+        })
+
+    lock = get_redis_connection().lock(
+        STRUCTURE_LOCK_KEY.format(esi_fleet_id=fleet.esi_fleet_id),
+        timeout=STRUCTURE_LOCK_TIMEOUT
+    )
+    if not lock.acquire(blocking=False):
+        # Another sync is mid-flight; run again once it is done so the newest layout wins
+        # Re-enqueued instead of self.retry() so waiting doesn't use up the failure retries
+        if lock_waits >= STRUCTURE_LOCK_WAITS:
+            progress('failed', message="Previous structure sync is still running. Please try again.")
+            return "Gave up waiting for the structure lock"
+        progress('queued', message="Waiting for previous structure sync...")
+        self.apply_async(
+            args=(fleet_db_id, fc_character_id, structure),
+            kwargs={'user_id': user_id, 'lock_waits': lock_waits + 1},
+            countdown=STRUCTURE_LOCK_WAIT_DELAY,
+            retries=self.request.retries
+        )
+        return "Queued behind a running structure sync"
+
+    try:
+        progress('running', message="Planning structure changes...")
+        success, logs = sync_fleet_structure(
+            fleet.esi_fleet_id, fc_char, structure,
+            on_progress=lambda done, total, msg: progress('running', done, total, msg)
+        )
+    finally:
+        try: lock.release()
+        except Exception: pass
+
+    if not success:
+        error = logs if isinstance(logs, str) else f"{sum(1 for l in logs if l.startswith('Failed'))} operations failed"
+        if self.request.retries < self.max_retries:
+            progress('retrying', message=f"{error}. Retrying...")
+            raise self.retry()
+        progress('failed', message=error)
+        _log_fleet_action(fleet, fc_char, 'esi_join', details=f"Structure sync failed: {error}")
+        return f"Failed: {error}"
+
+    progress('done', message=f"Structure synced ({len(logs)} changes)")
+    if logs:
+        _log_fleet_action(fleet, fc_char, 'esi_join', details=f"Structure synced ({len(logs)} changes)")
+    return f"Synced: {len(logs)} changes"
@@ -50,6 +50,7 @@ urlpatterns = [
     
     # Internal Actions
     path('fleet/action/<int:entry_id>/<str:action>/', actions.fc_action, name='fc_action'),
+    path('fleet/<uuid:token>/api/bulk_invite/', actions.api_bulk_invite, name='api_bulk_invite'),
     path('fleet/entry/<int:entry_id>/leave/', actions.leave_fleet, name='leave_fleet'),
     path('fleet/entry/<int:entry_id>/update/', actions.update_fit, name='update_fit'),
     path('fleet/entry/api/<int:entry_id>/', actions.api_entry_details, name='api_entry_details'),
@@ -1,3 +1,4 @@
+import json
 from django.shortcuts import get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
@@ -12,6 +13,7 @@ from waitlist_data.fitting_service import SmartFitMatcher
 from waitlist_data.skill_service import check_pilot_skills
 
 from esi_calls.fleet_service import invite_to_fleet
+from waitlist_data.invite_service import bulk_invite_entries, INVITABLE_COLUMNS
 from .helpers import _log_fleet_action, broadcast_update, _build_fit_analysis_response, trigger_sibling_updates
 from core.decorators import check_ban_status
 
@@ -229,7 +231,7 @@ def fc_action(request, entry_id, action):
         trigger_sibling_updates(fleet.id, entry.character.character_id, exclude_entry_id=entry.id)
         
     elif action == 'invite':
-        fc_char = fleet.commander.characters.filter(is_main=True).first() or fleet.commander.characters.first()
+        fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
         if not fleet.esi_fleet_id: return JsonResponse({'success': False, 'error': 'No ESI Fleet linked.'})
         success, msg = invite_to_fleet(fleet.esi_fleet_id, fc_char, entry.character.character_id)
         if success:
@@ -248,4 +250,39 @@ def fc_action(request, entry_id, action):
             trigger_sibling_updates(fleet.id, entry.character.character_id, exclude_entry_id=entry.id)
             return JsonResponse({'success': True})
         else: return JsonResponse({'success': False, 'error': f'Invite Failed: {msg}'})
-    return JsonResponse({'success': True})
\ No newline at end of file
+    return JsonResponse({'success': True})
+
+@login_required
+@require_POST
+def api_bulk_invite(request, token):
+    """
+    Invites many approved pilots at once.
+    Body: {"entry_ids": [...]} and/or {"column": "logi"|"dps"|"sniper"|"other"}.
+    """
+    if not is_fleet_command(request.user): return HttpResponse("Unauthorized", status=403)
+    fleet = get_object_or_404(Fleet, join_token=token, is_active=True)
+    if not fleet.esi_fleet_id: return JsonResponse({'success': False, 'error': 'No ESI Fleet linked.'})
+
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'})
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Expected a JSON object.'}, status=400)
+
+    entry_ids = data.get('entry_ids')
+    column = data.get('column')
+    if entry_ids is not None and not (
+        isinstance(entry_ids, list) and all(type(entry_id) is int for entry_id in entry_ids)
+    ):
+        return JsonResponse({'success': False, 'error': 'entry_ids must be a list of integers.'}, status=400)
+    if entry_ids is None and not column:
+        return JsonResponse({'success': False, 'error': 'Provide entry_ids or column.'})
+    if column and column not in INVITABLE_COLUMNS:
+        return JsonResponse({'success': False, 'error': f'Unknown column {column}.'})
+
+    fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
+    if not fc_char: return JsonResponse({'success': False, 'error': 'FC has no characters'})
+
+    result = bulk_invite_entries(fleet, fc_char, request.user, entry_ids=entry_ids, column=column)
+    return JsonResponse({'success': True, **result})
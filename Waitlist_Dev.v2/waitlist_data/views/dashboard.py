@@ -3,7 +3,6 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, HttpResponse
 from collections import defaultdict
 from django.db.models import OuterRef, Subquery # Added imports
-import requests 
 
 from core.permissions import (
     get_template_base, 
@@ -16,6 +15,8 @@ from waitlist_data.models import Fleet, WaitlistEntry, FleetActivity, DoctrineCa
 from waitlist_data.stats import batch_calculate_pilot_stats
 from esi_calls.fleet_service import get_fleet_composition, process_fleet_data, ESI_BASE
 from esi_calls.token_manager import check_token
+from esi_calls.token_cache import get_access_token
+from esi_calls.circuit_breaker import esi_request
 from .helpers import _resolve_column, get_category_map, get_entry_target_column, get_entry_real_category
 from core.decorators import check_ban_status
 
@@ -164,14 +165,14 @@ def fleet_history_view(request, token):
 def fleet_overview_api(request, token):
     fleet = get_object_or_404(Fleet, join_token=token)
     if not fleet.commander: return JsonResponse({'error': 'No commander'}, status=404)
-    fc_char = fleet.commander.characters.filter(is_main=True).first() or fleet.commander.characters.first()
+    fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
     if not fc_char: return JsonResponse({'error': 'FC has no characters'}, status=400)
     actual_fleet_id = fleet.esi_fleet_id
     if not actual_fleet_id:
         if check_token(fc_char):
-            headers = {'Authorization': f'Bearer {fc_char.access_token}'}
+            headers = {'Authorization': f'Bearer {get_access_token(fc_char)}'}
             try:
-                resp = requests.get(f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers)
+                resp = esi_request('GET', f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
                 if resp.status_code == 200:
                     data = resp.json()
                     actual_fleet_id = data['fleet_id']
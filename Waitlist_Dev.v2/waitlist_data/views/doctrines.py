@@ -13,6 +13,7 @@ from core.eft_parser import EFTParser
 from waitlist_data.models import DoctrineCategory, DoctrineFit, DoctrineTag, FitModule, SkillRequirement, SkillGroup, SkillGroupMember, SkillTier
 from pilot_data.models import ItemType
 from .helpers import _process_category_icons, _determine_slot
+from core.slot_layout import get_slot_kinds, fit_slot_totals
 
 # ... (doctrine_list, public_skill_requirements, doctrine_detail_api, manage_doctrines) ...
 
@@ -79,7 +80,7 @@ def public_skill_requirements(request):
 def doctrine_detail_api(request, fit_id):
     fit = get_object_or_404(DoctrineFit, id=fit_id)
     hull = fit.ship_type
-    raw_modules = fit.modules.select_related('item_type').prefetch_related('item_type__attributes').all()
+    raw_modules = list(fit.modules.select_related('item_type'))
     aggregated = {}
     for mod in raw_modules:
         key = (mod.slot, mod.item_type.type_id)
@@ -95,22 +96,12 @@ def doctrine_detail_api(request, fit_id):
         if data['slot'] in modules_by_slot:
             modules_by_slot[data['slot']].append(data)
 
-    high_total = int(hull.high_slots)
-    mid_total = int(hull.mid_slots)
-    low_total = int(hull.low_slots)
-    rig_total = int(hull.rig_slots)
-    
-    if hull.group_id == 963:
-        for mod in raw_modules:
-            attrs = {a.attribute_id: a.value for a in mod.item_type.attributes.all()}
-            if 14 in attrs: high_total += int(attrs[14])
-            if 13 in attrs: mid_total += int(attrs[13])
-            if 12 in attrs: low_total += int(attrs[12])
+    totals = fit_slot_totals(hull, [mod.item_type_id for mod in raw_modules])
 
     slot_config = [
-        ('High Slots', 'high', high_total), ('Mid Slots', 'mid', mid_total),
-        ('Low Slots', 'low', low_total), ('Rigs', 'rig', rig_total),
-        ('Subsystems', 'subsystem', 5 if hull.group_id == 963 else 0),
+        ('High Slots', 'high', totals['high']), ('Mid Slots', 'mid', totals['mid']),
+        ('Low Slots', 'low', totals['low']), ('Rigs', 'rig', totals['rig']),
+        ('Subsystems', 'subsystem', totals['subsystem']),
         ('Drone Bay', 'drone', 0), ('Cargo Hold', 'cargo', 0),
     ]
 
@@ -162,8 +153,9 @@ def manage_doctrines(request):
                     fit = DoctrineFit.objects.create(name=parser.fit_name, category=category, ship_type=parser.hull_obj, eft_format=parser.raw_text, description=description)
                 if tag_ids: fit.tags.set(tag_ids)
                 else: fit.tags.clear()
+                slot_kinds = get_slot_kinds([item['obj'].type_id for item in parser.items])
                 for item in parser.items:
-                    slot = _determine_slot(item['obj'])
+                    slot = _determine_slot(item['obj'], slot_kinds)
                     FitModule.objects.create(fit=fit, item_type=item['obj'], quantity=item['quantity'], slot=slot)
             return redirect('manage_doctrines')
     
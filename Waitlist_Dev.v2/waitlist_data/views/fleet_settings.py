@@ -1,5 +1,4 @@
 import json
-import requests
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
@@ -8,8 +7,12 @@ from django.utils import timezone
 
 from core.permissions import is_fleet_command, get_template_base, get_mgmt_context
 from waitlist_data.models import Fleet, FleetStructureTemplate
-from esi_calls.fleet_service import get_fleet_composition, sync_fleet_structure, update_fleet_settings, ESI_BASE
+from esi_calls.fleet_service import get_fleet_composition, update_fleet_settings, ESI_BASE
+from waitlist_data.tasks import sync_fleet_structure_task
+from waitlist_data.stats import close_fleet_sessions
 from esi_calls.token_manager import check_token
+from esi_calls.token_cache import get_access_token
+from esi_calls.circuit_breaker import esi_request
 
 @login_required
 @user_passes_test(is_fleet_command)
@@ -21,7 +24,7 @@ def fleet_settings(request, token):
     if not fleet.is_active:
         return redirect('fleet_history', token=token)
         
-    fc_char = fleet.commander.characters.filter(is_main=True).first() or fleet.commander.characters.first()
+    fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
     
     # PRE-FETCH CURRENT STRUCTURE
     initial_structure = "[]"
@@ -65,7 +68,7 @@ def api_update_fleet_settings(request, token):
         motd = data.get('motd')
         structure = data.get('structure') # List of Wings
         
-        fc_char = fleet.commander.characters.filter(is_main=True).first() or fleet.commander.characters.first()
+        fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
         
         if not fc_char: return JsonResponse({'success': False, 'error': 'No FC Character found'})
         
@@ -81,13 +84,12 @@ def api_update_fleet_settings(request, token):
             else:
                 return JsonResponse({'success': False, 'error': msg})
 
-        # 2. Update Structure
+        # 2. Update Structure (background task, progress is pushed to the FC's notification socket)
         if structure is not None:
-            success, logs = sync_fleet_structure(fleet.esi_fleet_id, fc_char, structure)
-            if success:
-                if logs: messages.append(f"Structure synced ({len(logs)} changes)")
-            else:
-                return JsonResponse({'success': False, 'error': f"Structure sync failed: {logs}"})
+            if not fleet.esi_fleet_id:
+                return JsonResponse({'success': False, 'error': 'Fleet not linked to ESI'})
+            sync_fleet_structure_task.delay(fleet.id, fc_char.character_id, structure, request.user.id)
+            messages.append("Structure sync started")
 
         return JsonResponse({'success': True, 'message': ", ".join(messages) or "No changes"})
             
@@ -107,7 +109,7 @@ def api_link_esi_fleet(request, token):
     if fleet.esi_fleet_id:
         return JsonResponse({'success': False, 'error': 'Fleet is already linked to ESI.'})
 
-    fc_char = fleet.commander.characters.filter(is_main=True).first() or fleet.commander.characters.first()
+    fc_char = fleet.commander.characters.defer('access_token', 'refresh_token').filter(is_main=True).first() or fleet.commander.characters.defer('access_token', 'refresh_token').first()
     if not fc_char: 
         return JsonResponse({'success': False, 'error': 'No FC Character found'})
 
@@ -115,8 +117,8 @@ def api_link_esi_fleet(request, token):
         return JsonResponse({'success': False, 'error': 'FC Token Expired/Invalid'})
 
     try:
-        headers = {'Authorization': f'Bearer {fc_char.access_token}'}
-        resp = requests.get(f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
+        headers = {'Authorization': f'Bearer {get_access_token(fc_char)}'}
+        resp = esi_request('GET', f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
         
         if resp.status_code == 200:
             data = resp.json()
@@ -145,6 +147,9 @@ def api_close_fleet(request, token):
     fleet.is_active = False
     fleet.end_time = timezone.now()
     fleet.save()
+
+    # Nobody stays "in fleet" (stats sessions, critical refresh tier) once it is closed
+    close_fleet_sessions(fleet, fleet.end_time)
     
     return JsonResponse({'success': True})
 
@@ -1,5 +1,4 @@
 import json
-import requests
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.http import JsonResponse
@@ -8,8 +7,11 @@ from django.views.decorators.http import require_POST
 from core.permissions import is_fleet_command, get_template_base, get_mgmt_context
 from pilot_data.models import EveCharacter
 from waitlist_data.models import Fleet, FleetStructureTemplate, StructureWing, StructureSquad
-from esi_calls.fleet_service import sync_fleet_structure, update_fleet_settings, ESI_BASE
+from esi_calls.fleet_service import update_fleet_settings, ESI_BASE
+from waitlist_data.tasks import sync_fleet_structure_task
 from esi_calls.token_manager import check_token
+from esi_calls.token_cache import get_access_token
+from esi_calls.circuit_breaker import esi_request
 from .helpers import _log_fleet_action
 
 @login_required
@@ -118,10 +120,10 @@ def api_create_fleet_with_structure(request):
 
         # 1. ESI Check (Skip if Offline)
         if not is_offline:
-            headers = {'Authorization': f'Bearer {fc_char.access_token}'}
+            headers = {'Authorization': f'Bearer {get_access_token(fc_char)}'}
             try:
                 if check_token(fc_char):
-                    resp = requests.get(f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
+                    resp = esi_request('GET', f"{ESI_BASE}/characters/{fc_char.character_id}/fleet/", headers=headers, timeout=5)
                     if resp.status_code == 200:
                         esi_fleet_id = resp.json()['fleet_id']
                     elif resp.status_code == 404:
@@ -144,10 +146,11 @@ def api_create_fleet_with_structure(request):
             motd=motd
         )
         
-        # 3. Apply Structure (Skip if Offline)
+        # 3. Apply Structure (Skip if Offline) - runs in the background so the form doesn't hang
         if not is_offline and esi_fleet_id:
-            success, struct_logs = sync_fleet_structure(esi_fleet_id, fc_char, structure)
-            logs.extend(struct_logs)
+            if structure:
+                sync_fleet_structure_task.delay(fleet.id, fc_char.character_id, structure, request.user.id)
+                logs.append("Structure sync started in background.")
             
             # 4. Apply MOTD
             if motd:
@@ -2,10 +2,11 @@ from django.template.loader import render_to_string
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from waitlist_data.models import FleetActivity, FitModule, DoctrineCategory, WaitlistEntry
-from pilot_data.models import ItemType, TypeEffect
+from pilot_data.models import ItemType
 from waitlist_data.stats import calculate_pilot_stats
 from core.eft_parser import EFTParser
 from waitlist_data.fitting_service import SmartFitMatcher
+from core.slot_layout import get_layouts, get_slot_kinds, fit_slot_totals
 
 def _log_fleet_action(fleet, character, action, actor=None, ship_type=None, details="", eft_text=None):
     hull_name = ""
@@ -50,22 +51,15 @@ def _process_category_icons(category):
     category.unique_ship_icons = unique_ships
     return unique_ships
 
-def _determine_slot(item_type):
+def _determine_slot(item_type, slot_kinds=None):
+    """
+    Slot an item is fitted to, from the precomputed layout table.
+    Pass `slot_kinds` (core.slot_layout.get_slot_kinds) when resolving a whole fit.
+    """
     if not item_type: return 'cargo'
-    effects = set(TypeEffect.objects.filter(item=item_type).values_list('effect_id', flat=True))
-    if 12 in effects: return 'high'
-    if 13 in effects: return 'mid'
-    if 11 in effects: return 'low'
-    if 2663 in effects: return 'rig'
-    try:
-        if item_type.group:
-            cat_id = item_type.group.category_id
-            if cat_id == 32: return 'subsystem'
-            if cat_id == 18 or cat_id == 87: return 'drone'
-            if cat_id == 8: return 'cargo'
-    except Exception:
-        pass
-    return 'cargo'
+    if slot_kinds is None:
+        slot_kinds = get_slot_kinds([item_type.type_id])
+    return slot_kinds.get(item_type.type_id, 'cargo')
 
 def _resolve_column(category_id, category_map):
     current_id = category_id
@@ -108,6 +102,24 @@ def get_entry_real_category(entry, category_map):
 def broadcast_update(fleet_id, action, entry, target_col=None):
     channel_layer = get_channel_layer()
     group_name = f'fleet_{fleet_id}'
+    payload = _build_update_payload(fleet_id, action, entry, target_col)
+    async_to_sync(channel_layer.group_send)(group_name, payload)
+
+def broadcast_batch_update(fleet_id, entries, action='move'):
+    """
+    Sends many card updates as ONE websocket message (action 'batch').
+    Used by bulk operations so clients re-render once instead of per pilot.
+    """
+    if not entries: return
+    category_map = get_category_map()
+    updates = [_build_update_payload(fleet_id, action, entry, category_map=category_map) for entry in entries]
+    async_to_sync(get_channel_layer().group_send)(f'fleet_{fleet_id}', {
+        'type': 'fleet_update',
+        'action': 'batch',
+        'updates': updates
+    })
+
+def _build_update_payload(fleet_id, action, entry, target_col=None, category_map=None):
     payload = {
         'type': 'fleet_update',
         'action': action,
@@ -126,7 +138,8 @@ def broadcast_update(fleet_id, action, entry, target_col=None):
         }
         
         # 2. Resolve Column
-        category_map = get_category_map()
+        if category_map is None:
+            category_map = get_category_map()
         if not target_col:
             target_col = get_entry_target_column(entry, category_map)
         
@@ -156,7 +169,7 @@ def broadcast_update(fleet_id, action, entry, target_col=None):
         payload['html'] = html
         payload['target_col'] = target_col
 
-    async_to_sync(channel_layer.group_send)(group_name, payload)
+    return payload
 
 def trigger_sibling_updates(fleet_id, character_id, exclude_entry_id=None):
     """
@@ -190,6 +203,11 @@ def _build_fit_analysis_response(raw_eft, fit_obj, hull_obj, character, is_fc):
         if not hull_obj and fit_obj: hull_obj = fit_obj.ship_type
         if not hull_obj: hull_obj = parser.hull_obj
 
+        # Every slot kind and slot count the fit needs, in one query
+        module_ids = [item['obj'].type_id for item in parser.items if item.get('obj')]
+        layouts = get_layouts(module_ids + ([hull_obj.type_id] if hull_obj else []))
+        slot_kinds = {type_id: layout.slot_kind for type_id, layout in layouts.items()}
+
         if fit_obj:
             matcher = SmartFitMatcher(parser)
             _, analysis = matcher._score_fit(fit_obj)
@@ -214,7 +232,7 @@ def _build_fit_analysis_response(raw_eft, fit_obj, hull_obj, character, is_fc):
             aggregated = {}
             for item in parser.items:
                 item_obj = item['obj']
-                slot_key = _determine_slot(item_obj)
+                slot_key = _determine_slot(item_obj, slot_kinds)
                 
                 key = (slot_key, item_obj.type_id)
                 if key not in aggregated:
@@ -235,26 +253,12 @@ def _build_fit_analysis_response(raw_eft, fit_obj, hull_obj, character, is_fc):
             if s not in slots_map: s = 'cargo'
             slots_map[s].append(data)
 
-        if hull_obj:
-            high_total = int(hull_obj.high_slots)
-            mid_total = int(hull_obj.mid_slots)
-            low_total = int(hull_obj.low_slots)
-            rig_total = int(hull_obj.rig_slots)
-            
-            if hull_obj.group_id == 963:
-                for item in parser.items:
-                    if item.get('obj'):
-                        attrs = {a.attribute_id: a.value for a in item['obj'].attributes.all()}
-                        if 14 in attrs: high_total += int(attrs[14])
-                        if 13 in attrs: mid_total += int(attrs[13])
-                        if 12 in attrs: low_total += int(attrs[12])
-        else:
-            high_total = mid_total = low_total = rig_total = 0
+        totals = fit_slot_totals(hull_obj, module_ids, layouts)
 
         slot_config = [
-            ('High Slots', 'high', high_total), ('Mid Slots', 'mid', mid_total),
-            ('Low Slots', 'low', low_total), ('Rigs', 'rig', rig_total),
-            ('Subsystems', 'subsystem', 5 if hull_obj and hull_obj.group_id == 963 else 0),
+            ('High Slots', 'high', totals['high']), ('Mid Slots', 'mid', totals['mid']),
+            ('Low Slots', 'low', totals['low']), ('Rigs', 'rig', totals['rig']),
+            ('Subsystems', 'subsystem', totals['subsystem']),
             ('Drone Bay', 'drone', 0), ('Cargo Hold', 'cargo', 0),
         ]
 
@@ -1,10 +1,23 @@
 import os
+import sys
 from celery import Celery
 
 # --- FIX START: GEVENT MONKEY PATCH ---
 # This checks if we are running with the gevent pool and patches early.
 # This prevents database connection closing issues in async contexts.
-if os.environ.get('The_pool_impl_name') == 'gevent':
+# Triggered by ESI_WORKER_POOL=gevent (see esi_calls/worker_profile.py) or `-P gevent` / `--pool=gevent`.
+def _wants_gevent():
+    if os.environ.get('ESI_WORKER_POOL') == 'gevent' or os.environ.get('The_pool_impl_name') == 'gevent':
+        return True
+    argv = sys.argv
+    for i, arg in enumerate(argv):
+        if arg in ('-P', '--pool') and i + 1 < len(argv) and argv[i + 1] == 'gevent':
+            return True
+        if arg in ('-Pgevent', '--pool=gevent'):
+            return True
+    return False
+
+if _wants_gevent():
     from gevent import monkey
     monkey.patch_all()
 # --- FIX END ---
@@ -122,6 +122,14 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 EVE_CLIENT_ID = os.getenv('EVE_CLIENT_ID')
 EVE_CALLBACK_URL = os.getenv('EVE_CALLBACK_URL', 'http://localhost:8000/auth/sso/callback/')
 
+# --- ESI / SSO ENDPOINTS ---
+# ESI_MOCK_URL points every ESI and SSO call at a local mock (python manage.py run_mock_esi),
+# for load tests of the dispatcher, workers and fleet poller without touching CCP's servers.
+ESI_MOCK_URL = os.getenv('ESI_MOCK_URL', '').rstrip('/')
+ESI_ROOT_URL = ESI_MOCK_URL or 'https://esi.evetech.net'
+ESI_BASE_URL = f"{ESI_ROOT_URL}/latest"
+EVE_SSO_URL = ESI_MOCK_URL or 'https://login.eveonline.com'
+
 # --- SCOPE CONFIGURATION ---
 
 # 1. Base Scopes (Required for all pilots)
@@ -173,6 +181,26 @@ CHANNEL_LAYERS = {
     },
 }
 
+# --- CACHE (Redis Config) ---
+# Shared by every Daphne / Celery process, so locks, throttles and snapshots held in
+# django.core.cache dedupe across processes. core.tiered_cache adds a per-process LRU on top.
+# USE_LOCAL_CACHE=True falls back to a per-process LocMemCache (dev without Redis).
+if os.getenv('USE_LOCAL_CACHE', 'False') == 'True':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('CACHE_URL', CELERY_BROKER_URL),
+            'KEY_PREFIX': 'waitlist',
+            'TIMEOUT': 300,
+        }
+    }
+
 # 4. Beat Schedule (Replaces APScheduler)
 from celery.schedules import crontab
 
@@ -186,6 +214,10 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'scheduler.tasks.refresh_srp_wallet_task',
         'schedule': crontab(minute=0), # Runs at the start of every hour
     },
+    'refresh-expiring-tokens-every-minute': {
+        'task': 'scheduler.tasks.refresh_expiring_tokens',
+        'schedule': crontab(minute='*'),
+    },
     'check-expired-bans-every-minute': {
         'task': 'core.tasks.check_expired_bans',
         'schedule': crontab(minute='*'),
@@ -196,6 +228,41 @@ CELERY_BEAT_SCHEDULE = {
 # This limits the worker to only grabbing 1 task at a time, preventing it from hoarding tasks if ESI is slow.
 CELERY_WORKER_PREFETCH_MULTIPLIER = 1
 
+# 6. Refresh Priority Queues (see scheduler/priorities.py)
+# A plain `celery -A waitlist_project worker` consumes every queue below, as before.
+# To give each tier its own concurrency, run one worker per queue, e.g.:
+#   celery -A waitlist_project worker -Q esi_critical -c 8 -n critical@%h
+#   celery -A waitlist_project worker -Q celery,esi_normal -c 4 -n normal@%h
+#   celery -A waitlist_project worker -Q esi_background -c 2 -n background@%h
+from kombu import Queue
+
+CELERY_TASK_DEFAULT_QUEUE = 'celery'
+CELERY_TASK_QUEUES = (
+    Queue('celery'),
+    Queue('esi_critical'),
+    Queue('esi_normal'),
+    Queue('esi_background'),
+)
+CELERY_TASK_ROUTES = {
+    'scheduler.tasks.refresh_character_critical_task': {'queue': 'esi_critical'},
+    'scheduler.tasks.refresh_character_task': {'queue': 'esi_normal'},
+    'scheduler.tasks.refresh_character_background_task': {'queue': 'esi_background'},
+}
+
+# 7. High-Concurrency ESI Worker (see esi_calls/worker_profile.py)
+#   ESI_WORKER_POOL=gevent celery -A waitlist_project worker -P gevent -c 200 -Q esi_critical,esi_normal,esi_background
+# Keep-alive connections to ESI per process (shared requests.Session)
+ESI_HTTP_POOL_SIZE = int(os.getenv('ESI_HTTP_POOL_SIZE', '50'))
+# DB connections a gevent worker may hold at once; greenlets give theirs up while waiting on ESI
+ESI_DB_CONCURRENCY = int(os.getenv('ESI_DB_CONCURRENCY', '10'))
+
+# --- BENCHMARKING ---
+# BENCHMARK_QUERY_HEADERS=True adds per-request DB query counts / timings as response headers
+# (core/middleware.py), collected by `python manage.py benchmark_load`. Leave off in production.
+BENCHMARK_QUERY_HEADERS = os.getenv('BENCHMARK_QUERY_HEADERS', 'False') == 'True'
+if BENCHMARK_QUERY_HEADERS:
+    MIDDLEWARE.insert(0, 'core.middleware.QueryCountMiddleware')
+
 # --- AUTHENTICATION SETTINGS ---
 LOGIN_URL = 'access_denied'      # Redirect here instead of 'sso_login'
 LOGIN_REDIRECT_URL = 'profile'   
@@ -12,6 +12,7 @@ urlpatterns = [
     path('api/mgmt/srp/set_source/', views_srp.api_set_srp_source, name='api_set_srp_source'),
     path('api/mgmt/srp/sync/', views_srp.api_sync_srp, name='api_sync_srp'),
     path('api/mgmt/srp/update_category/', views_srp.api_update_transaction_category, name='api_update_transaction_category'),
+    path('api/mgmt/srp/bulk_category/', views_srp.api_bulk_update_category, name='api_bulk_update_category'),
     
     # --- SRP DASHBOARD ---
     path('srp/dashboard/', views_srp.srp_dashboard, name='srp_dashboard'),